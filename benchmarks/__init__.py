@@ -0,0 +1,4 @@
+"""
+Benchmarks reproductibles du moteur de recherche CineSphere
+Catalogues synthétiques, latence, débit, mémoire et rappel des index FAISS
+"""
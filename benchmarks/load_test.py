@@ -0,0 +1,331 @@
+"""
+Générateur de charge pour l'API CineSphere
+Boucle fermée (N utilisateurs enchaînant les requêtes) ou boucle ouverte
+(arrivées de Poisson à débit fixe), sur un mélange réaliste de requêtes tirées
+des requêtes d'évaluation et des paires d'entraînement.
+
+Usage:
+    python -m benchmarks.load_test --concurrency 8 --duration 30
+    python -m benchmarks.load_test --mode poisson --rate 50 --duration 60
+    python -m benchmarks.load_test --spawn-server --stub --concurrency 16
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import datetime
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+import config
+from eval_queries import TEST_QUERIES
+from training.pair_store import shard_paths
+
+
+RESULTS_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'results')
+
+
+class QueryMix:
+    """Tire des requêtes dans les requêtes d'évaluation et les paires d'entraînement"""
+
+    def __init__(self, eval_weight=0.3, max_training_queries=5000, seed=42):
+        """
+        Args:
+            eval_weight: Probabilité de tirer une requête d'évaluation plutôt qu'une requête d'entraînement
+            max_training_queries: Nombre maximum de requêtes d'entraînement chargées
+            seed: Graine du tirage
+        """
+        self.eval_queries = [query for query, _ in TEST_QUERIES]
+        self.training_queries = []
+
+        queries = self._training_queries()
+        if len(queries):
+            rng = np.random.default_rng(seed)
+            if len(queries) > max_training_queries:
+                queries = rng.choice(queries, max_training_queries, replace=False)
+            self.training_queries = list(queries)
+
+        self.eval_weight = eval_weight if self.training_queries else 1.0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _training_queries():
+        """Requêtes d'entraînement uniques (shards Parquet, ou ancien CSV à défaut)"""
+        shards = shard_paths(config.TRAINING_DATA_DIR, 'train')
+        if shards:
+            queries = pd.concat([pd.read_parquet(p, columns=['query']) for p in shards])['query']
+            return queries.dropna().astype(str).unique()
+
+        train_path = config.TRAINING_DATA_PATH.replace('.csv', '_train.csv')
+        if os.path.exists(train_path):
+            return pd.read_csv(train_path, usecols=['query'])['query'].dropna().astype(str).unique()
+        return []
+
+    def sample(self):
+        with self._lock:
+            if self._rng.random() < self.eval_weight:
+                return self._rng.choice(self.eval_queries)
+            return self._rng.choice(self.training_queries)
+
+
+class LoadGenerator:
+    """Envoie les requêtes et collecte latences et erreurs par endpoint"""
+
+    def __init__(self, base_url, query_mix, op_weights, top_k=10, timeout=30.0, seed=42):
+        """
+        Args:
+            base_url: URL de l'API (ex: http://localhost:5001)
+            query_mix: QueryMix fournissant les requêtes
+            op_weights: Poids des opérations {'search', 'page', 'health'}
+            top_k: top_k des recherches
+            timeout: Timeout HTTP par requête (s)
+        """
+        self.base_url = base_url.rstrip('/')
+        self.query_mix = query_mix
+        self.ops = list(op_weights)
+        self.weights = [op_weights[op] for op in self.ops]
+        self.top_k = top_k
+        self.timeout = timeout
+        self._rng = random.Random(seed)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.samples = []
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    def _record(self, endpoint, latency_ms, status, service_ms=None):
+        with self._lock:
+            self.samples.append((endpoint, latency_ms, status, service_ms if service_ms is not None else latency_ms))
+
+    def _request(self, endpoint, method, path, scheduled=None, **kwargs):
+        """Exécute une requête; la latence part de l'instant d'arrivée prévu en boucle ouverte"""
+        sent = time.perf_counter()
+        origin = scheduled if scheduled is not None else sent
+        try:
+            response = self._session().request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+            status = response.status_code
+            payload = response.json() if status == 200 and endpoint != 'health' else None
+        except (requests.RequestException, ValueError):
+            status, payload = 'exception', None
+
+        done = time.perf_counter()
+        self._record(endpoint, (done - origin) * 1000, status, (done - sent) * 1000)
+        return payload
+
+    def run_one(self, scheduled=None):
+        """Exécute une opération tirée selon les poids"""
+        with self._lock:
+            op = self._rng.choices(self.ops, weights=self.weights)[0]
+
+        if op == 'health':
+            self._request('health', 'GET', '/api/health', scheduled=scheduled)
+            return
+
+        body = {'query': self.query_mix.sample(), 'top_k': self.top_k}
+        payload = self._request('search', 'POST', '/api/search', scheduled=scheduled, json=body)
+
+        if op == 'page' and payload and payload.get('next_cursor'):
+            self._request('search_page', 'POST', '/api/search',
+                          json={'cursor': payload['next_cursor'], 'page_size': self.top_k})
+
+    def closed_loop(self, concurrency, duration, think_ms=0.0):
+        """N utilisateurs enchaînant les requêtes (avec temps de réflexion optionnel)"""
+        deadline = time.perf_counter() + duration
+
+        def user():
+            while time.perf_counter() < deadline:
+                self.run_one()
+                if think_ms:
+                    time.sleep(think_ms / 1000)
+
+        threads = [threading.Thread(target=user, daemon=True) for _ in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def poisson_loop(self, rate, duration, max_inflight=256, seed=42):
+        """
+        Arrivées de Poisson à débit moyen rate (req/s), indépendantes des réponses
+        La latence inclut l'attente quand le serveur prend du retard (pas d'omission coordonnée)
+        """
+        rng = random.Random(seed)
+        start = time.perf_counter()
+        next_arrival = start
+
+        with ThreadPoolExecutor(max_workers=max_inflight) as pool:
+            while True:
+                next_arrival += rng.expovariate(rate)
+                if next_arrival - start > duration:
+                    break
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self.run_one, next_arrival)
+
+
+def summarize(samples, wall_seconds):
+    """Percentiles, débit et taux d'erreur par endpoint"""
+    report = {}
+    endpoints = sorted({s[0] for s in samples})
+
+    for endpoint in endpoints + ['all']:
+        rows = [s for s in samples if endpoint == 'all' or s[0] == endpoint]
+        latencies = np.array([r[1] for r in rows])
+        service = np.array([r[3] for r in rows])
+        errors = sum(1 for r in rows if r[2] != 200)
+        report[endpoint] = {
+            'requests': len(rows),
+            'errors': errors,
+            'error_rate': round(errors / len(rows), 4),
+            'throughput_rps': round(len(rows) / wall_seconds, 2),
+            'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+            'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+            'max_ms': round(float(latencies.max()), 2),
+            'service_p50_ms': round(float(np.percentile(service, 50)), 2),
+            'service_p99_ms': round(float(np.percentile(service, 99)), 2),
+            'status_codes': {str(code): sum(1 for r in rows if r[2] == code) for code in {r[2] for r in rows}}
+        }
+
+    return report
+
+
+def wait_for_server(base_url, timeout=300):
+    """Attend que /api/health réponde "ready" (préchauffage terminé)"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            response = requests.get(base_url + '/api/health', timeout=2)
+            if response.status_code == 200:
+                return response.json()
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    raise TimeoutError(f"Serveur injoignable après {timeout} s: {base_url}")
+
+
+def spawn_server(stub):
+    """Lance src.app dans un groupe de processus dédié (arrêté proprement en fin de test)"""
+    env = dict(os.environ, STUB_ENCODER='1' if stub else os.environ.get('STUB_ENCODER', '0'))
+    return subprocess.Popen(
+        [sys.executable, '-m', 'src.app'], cwd=ROOT_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+    )
+
+
+def parse_mix(text):
+    weights = {}
+    for part in text.split(','):
+        op, weight = part.split('=')
+        if op not in ('search', 'page', 'health'):
+            raise argparse.ArgumentTypeError(f"Opération inconnue: {op}")
+        weights[op] = float(weight)
+    return weights
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge de l'API CineSphere")
+    parser.add_argument('--url', default='http://localhost:5001')
+    parser.add_argument('--mode', choices=['closed', 'poisson'], default='closed')
+    parser.add_argument('--concurrency', type=int, default=8, help="Utilisateurs simultanés (boucle fermée)")
+    parser.add_argument('--think-ms', type=float, default=0.0, help="Temps de réflexion entre requêtes")
+    parser.add_argument('--rate', type=float, default=20.0, help="Débit moyen d'arrivée (boucle ouverte, req/s)")
+    parser.add_argument('--max-inflight', type=int, default=256)
+    parser.add_argument('--duration', type=float, default=30.0, help="Durée du test (s)")
+    parser.add_argument('--warmup', type=float, default=5.0, help="Durée de chauffe non mesurée (s)")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('search=0.85,page=0.05,health=0.10'),
+                        help="Poids des opérations, ex: search=0.85,page=0.05,health=0.10")
+    parser.add_argument('--eval-weight', type=float, default=0.3,
+                        help="Part des requêtes d'évaluation dans le mélange")
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--spawn-server', action='store_true', help="Lance src.app pour la durée du test")
+    parser.add_argument('--stub', action='store_true',
+                        help="Avec --spawn-server: encodeur de substitution (coût du serveur seul)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args(argv)
+    if args.stub and not args.spawn_server:
+        parser.error("--stub n'a d'effet qu'avec --spawn-server (lancez le serveur existant avec STUB_ENCODER=1)")
+    return args
+
+
+def main(argv=None):
+    """Point d'entrée du test de charge"""
+    args = parse_args(argv)
+
+    server = spawn_server(args.stub) if args.spawn_server else None
+    try:
+        health = wait_for_server(args.url)
+        print(f"Serveur: {health.get('movies_loaded')} films, modèle {health.get('model_type')}")
+
+        query_mix = QueryMix(eval_weight=args.eval_weight, seed=args.seed)
+        print(f"Requêtes: {len(query_mix.eval_queries)} d'évaluation, "
+              f"{len(query_mix.training_queries)} d'entraînement")
+
+        def run(generator, duration):
+            if args.mode == 'closed':
+                generator.closed_loop(args.concurrency, duration, args.think_ms)
+            else:
+                generator.poisson_loop(args.rate, duration, args.max_inflight, args.seed)
+
+        if args.warmup > 0:
+            run(LoadGenerator(args.url, query_mix, args.mix, args.top_k, seed=args.seed), args.warmup)
+
+        generator = LoadGenerator(args.url, query_mix, args.mix, args.top_k, seed=args.seed)
+        print(f"Charge {args.mode} pendant {args.duration:.0f} s...")
+        start = time.perf_counter()
+        run(generator, args.duration)
+        wall = time.perf_counter() - start
+    finally:
+        if server is not None:
+            os.killpg(server.pid, signal.SIGTERM)
+            server.wait()
+
+    if not generator.samples:
+        print("Aucune requête exécutée")
+        sys.exit(1)
+
+    summary = summarize(generator.samples, wall)
+
+    print(f"\n{'endpoint':<12} {'req':>7} {'rps':>8} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for endpoint, s in summary.items():
+        print(f"{endpoint:<12} {s['requests']:>7} {s['throughput_rps']:>8.1f} {s['error_rate']:>6.1%} "
+              f"{s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f} {s['max_ms']:>8.1f}")
+
+    report = {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'config': {k: v for k, v in vars(args).items()},
+        'server': health,
+        'wall_seconds': round(wall, 2),
+        'endpoints': summary
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"load_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nRapport sauvegardé: {output}")
+
+
+if __name__ == "__main__":
+    main()
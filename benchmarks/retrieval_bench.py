@@ -0,0 +1,348 @@
+"""
+Benchmark reproductible de la recherche vectorielle
+Pour chaque taille de catalogue et type d'index: temps de construction, mémoire,
+latence p50/p95/p99, débit à plusieurs niveaux de concurrence et recall@k
+par rapport à une recherche exacte IndexFlatL2. Résultats en JSON.
+
+Usage:
+    python -m benchmarks.retrieval_bench --sizes 10000 100000 --index-types flat hnsw ivf
+    python -m benchmarks.retrieval_bench --baseline benchmarks/results/reference.json
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import faiss
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+from movie_retriever import MovieRetriever, INDEX_TYPES, create_index, train_index
+
+from benchmarks.synthetic import EMBEDDING_DIM, PrecomputedEncoder, SyntheticCatalog
+
+
+RESULTS_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'results')
+
+
+def rss_mb():
+    """Mémoire résidente actuelle du processus (Mo)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def index_bytes(index):
+    """
+    Taille sérialisée d'un index FAISS, comptée au fil de l'écriture: contrairement à
+    faiss.serialize_index, aucune copie de l'index n'est faite en mémoire
+    """
+    written = [0]
+
+    def count(chunk):
+        written[0] += len(chunk)
+        return len(chunk)
+
+    writer = faiss.PyCallbackIOWriter(count)
+    if isinstance(index, faiss.IndexBinary):
+        faiss.write_index_binary(index, writer)
+    else:
+        faiss.write_index(index, writer)
+    del writer
+    return written[0]
+
+
+def latency_summary(latencies_ms):
+    """Percentiles d'une liste de latences en millisecondes"""
+    values = np.asarray(latencies_ms)
+    return {
+        'p50_ms': round(float(np.percentile(values, 50)), 4),
+        'p95_ms': round(float(np.percentile(values, 95)), 4),
+        'p99_ms': round(float(np.percentile(values, 99)), 4),
+        'mean_ms': round(float(values.mean()), 4)
+    }
+
+
+def exact_ground_truth(catalog, queries, k, chunk_size):
+    """
+    Top-k exact (IndexFlatL2) calculé par blocs: la mémoire reste bornée par chunk_size
+
+    Returns:
+        Matrice (n_queries, k) des identifiants des plus proches voisins
+    """
+    best_d = np.full((len(queries), k), np.inf, dtype='float32')
+    best_i = np.full((len(queries), k), -1, dtype='int64')
+
+    for start, vectors in catalog.iter_chunks(chunk_size):
+        flat = faiss.IndexFlatL2(catalog.dimension)
+        flat.add(vectors)
+        d, i = flat.search(queries, min(k, len(vectors)))
+        i = np.where(i >= 0, i + start, -1)
+
+        all_d = np.hstack([best_d, d])
+        all_i = np.hstack([best_i, i])
+        order = np.argsort(all_d, axis=1, kind='stable')[:, :k]
+        best_d = np.take_along_axis(all_d, order, axis=1)
+        best_i = np.take_along_axis(all_i, order, axis=1)
+
+    return best_i
+
+
+def build(catalog, index_type, chunk_size):
+    """
+    Construit un index par blocs et mesure temps et mémoire
+    index_mb est la taille de l'index lui-même; rss_delta_mb (croissance de la mémoire résidente)
+    est indicatif seulement, l'allocateur réutilisant la mémoire libérée par les tailles précédentes
+    """
+    rss_before = rss_mb()
+    start = time.perf_counter()
+
+    index = create_index(catalog.dimension, index_type, n_vectors=catalog.n_vectors)
+    if not index.is_trained:
+        train_index(index, catalog.chunk(0, min(catalog.n_vectors, 100000)))
+    train_seconds = time.perf_counter() - start
+
+    for _, vectors in catalog.iter_chunks(chunk_size):
+        index.add(vectors)
+
+    return index, {
+        'build_seconds': round(time.perf_counter() - start, 3),
+        'train_seconds': round(train_seconds, 3),
+        'index_mb': round(index_bytes(index) / 1024**2, 2),
+        'rss_delta_mb': round(rss_mb() - rss_before, 1)
+    }
+
+
+def recall_at_k(found, truth, k):
+    """Recall@k moyen: fraction des k vrais voisins retrouvés"""
+    hits = [len(set(f[:k]) & set(t[:k])) for f, t in zip(found, truth)]
+    return round(float(np.mean(hits)) / k, 4)
+
+
+def bench_faiss(index, queries, k, concurrencies):
+    """Chemin 'faiss': latence requête par requête, batch et débit concurrent"""
+    latencies = []
+    found = []
+    for q in queries:
+        start = time.perf_counter()
+        _, ids = index.search(q[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(ids[0])
+
+    start = time.perf_counter()
+    index.search(queries, k)
+    batch_seconds = time.perf_counter() - start
+
+    def one(q):
+        index.search(q[None, :], k)
+
+    throughput = {}
+    for concurrency in concurrencies:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            start = time.perf_counter()
+            list(pool.map(one, queries))
+            throughput[str(concurrency)] = round(len(queries) / (time.perf_counter() - start), 1)
+
+    return {
+        'latency': latency_summary(latencies),
+        'batch_qps': round(len(queries) / batch_seconds, 1),
+        'qps_by_concurrency': throughput
+    }, np.asarray(found)
+
+
+def bench_retriever(catalog, index, queries, k, concurrencies):
+    """Chemin 'retriever': MovieRetriever.search complet (scoring hybride, filtre adaptatif)"""
+    retriever = MovieRetriever(model=PrecomputedEncoder(queries))
+    retriever.set_movies(catalog.movies_df())
+    retriever.index = index
+
+    texts = [f"q{i}" for i in range(len(queries))]
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        retriever.search(text, top_k=k, adaptive=True)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    def one(text):
+        retriever.search(text, top_k=k, adaptive=True)
+
+    throughput = {}
+    for concurrency in concurrencies:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            start = time.perf_counter()
+            list(pool.map(one, texts))
+            throughput[str(concurrency)] = round(len(texts) / (time.perf_counter() - start), 1)
+
+    return {
+        'latency': latency_summary(latencies),
+        'qps_by_concurrency': throughput
+    }
+
+
+def environment():
+    """Informations de reproductibilité"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'faiss': getattr(faiss, '__version__', None),
+        'faiss_omp_threads': faiss.omp_get_max_threads(),
+        'numpy': np.__version__
+    }
+
+
+def compare_to_baseline(report, baseline, tolerance):
+    """
+    Compare un rapport à une référence
+
+    Returns:
+        Liste de messages de régression (vide si aucune)
+    """
+    reference = {(r['n_vectors'], r['index_type']): r for r in baseline['results']}
+    regressions = []
+
+    for r in report['results']:
+        ref = reference.get((r['n_vectors'], r['index_type']))
+        if ref is None:
+            continue
+        label = f"{r['index_type']}@{r['n_vectors']}"
+
+        for path in ('faiss', 'retriever'):
+            if path in r and path in ref:
+                new_p95 = r[path]['latency']['p95_ms']
+                old_p95 = ref[path]['latency']['p95_ms']
+                if new_p95 > old_p95 * (1 + tolerance):
+                    regressions.append(f"{label} {path} p95: {old_p95:.3f} -> {new_p95:.3f} ms")
+
+        if r['recall_at_k'] < ref['recall_at_k'] - 0.01:
+            regressions.append(f"{label} recall@k: {ref['recall_at_k']:.4f} -> {r['recall_at_k']:.4f}")
+
+        if 'index_mb' in ref['build'] and r['build']['index_mb'] > ref['build']['index_mb'] * (1 + tolerance):
+            regressions.append(f"{label} index: {ref['build']['index_mb']:.1f} -> {r['build']['index_mb']:.1f} Mo")
+
+        if r['build']['build_seconds'] > ref['build']['build_seconds'] * (1 + tolerance):
+            regressions.append(
+                f"{label} build: {ref['build']['build_seconds']:.1f} -> {r['build']['build_seconds']:.1f} s"
+            )
+
+    return regressions
+
+
+def run(args):
+    """Exécute la matrice de benchmarks et retourne le rapport"""
+    report = {'environment': environment(), 'config': vars(args), 'results': []}
+
+    for n_vectors in args.sizes:
+        print(f"\nCatalogue synthétique: {n_vectors:,} vecteurs x {args.dim} dims")
+        catalog = SyntheticCatalog(n_vectors, dimension=args.dim, seed=args.seed)
+        queries = catalog.queries(args.queries)
+
+        start = time.perf_counter()
+        truth = exact_ground_truth(catalog, queries, args.k, args.chunk_size)
+        print(f"   Vérité terrain exacte: {time.perf_counter() - start:.1f} s")
+
+        for index_type in args.index_types:
+            index, build_stats = build(catalog, index_type, args.chunk_size)
+            faiss_stats, found = bench_faiss(index, queries, args.k, args.concurrency)
+
+            result = {
+                'n_vectors': n_vectors,
+                'dimension': args.dim,
+                'index_type': index_type,
+                'k': args.k,
+                'n_queries': len(queries),
+                'build': build_stats,
+                'recall_at_k': recall_at_k(found, truth, args.k),
+                'faiss': faiss_stats
+            }
+
+            if n_vectors <= args.retriever_max_size:
+                result['retriever'] = bench_retriever(catalog, index, queries, args.k, args.concurrency)
+
+            report['results'].append(result)
+            print(f"   {index_type:>6}: build {build_stats['build_seconds']:.1f} s, "
+                  f"index {build_stats['index_mb']:.1f} Mo, recall@{args.k} {result['recall_at_k']:.3f}, "
+                  f"p50 {faiss_stats['latency']['p50_ms']:.3f} ms, "
+                  f"p99 {faiss_stats['latency']['p99_ms']:.3f} ms")
+
+            del index
+
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de la recherche vectorielle CineSphere")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000],
+                        help="Tailles de catalogue (ex: 10000 100000 1000000 5000000)")
+    parser.add_argument('--index-types', nargs='+', default=['flat', 'hnsw', 'ivf'], choices=INDEX_TYPES)
+    parser.add_argument('--dim', type=int, default=EMBEDDING_DIM)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--chunk-size', type=int, default=100000,
+                        help="Taille des blocs de génération/ajout (borne la mémoire)")
+    parser.add_argument('--retriever-max-size', type=int, default=1000000,
+                        help="Taille maximale pour le chemin MovieRetriever.search (métadonnées en mémoire)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help="Fichier JSON de sortie")
+    parser.add_argument('--baseline', default=None, help="Rapport JSON de référence à comparer")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="Dégradation relative tolérée par rapport à la référence")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Point d'entrée du benchmark"""
+    args = parse_args(argv)
+
+    print("\n" + "="*70)
+    print("BENCHMARK DE LA RECHERCHE VECTORIELLE")
+    print("="*70)
+
+    report = run(args)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"retrieval_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nRapport sauvegardé: {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} régression(s) par rapport à {args.baseline}:")
+            for message in regressions:
+                print(f"   - {message}")
+            sys.exit(1)
+        print(f"\nAucune régression par rapport à {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
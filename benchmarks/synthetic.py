@@ -0,0 +1,122 @@
+"""
+Génération de catalogues synthétiques pour les benchmarks
+Vecteurs normalisés regroupés en clusters (proches de la structure des embeddings MiniLM),
+produits par blocs déterministes pour ne jamais matérialiser un catalogue de plusieurs millions
+"""
+
+import numpy as np
+import pandas as pd
+
+
+EMBEDDING_DIM = 384
+
+GENRES = [
+    'Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 'Drama',
+    'Family', 'Fantasy', 'Horror', 'Romance', 'Science Fiction', 'Thriller'
+]
+
+
+class SyntheticCatalog:
+    """Catalogue synthétique reproductible: vecteurs, requêtes et métadonnées"""
+
+    def __init__(self, n_vectors, dimension=EMBEDDING_DIM, n_clusters=None, noise=0.35, seed=42):
+        """
+        Args:
+            n_vectors: Nombre de films du catalogue
+            dimension: Dimension des embeddings (384 pour MiniLM)
+            n_clusters: Nombre de clusters (défaut: ~sqrt(n_vectors))
+            noise: Écart-type du bruit autour des centres
+            seed: Graine de génération
+        """
+        self.n_vectors = n_vectors
+        self.dimension = dimension
+        self.noise = noise
+        self.seed = seed
+        self.n_clusters = n_clusters or max(8, int(np.sqrt(n_vectors)))
+
+        rng = np.random.default_rng(seed)
+        centers = rng.standard_normal((self.n_clusters, dimension)).astype('float32')
+        self.centers = centers / np.linalg.norm(centers, axis=1, keepdims=True)
+
+    def chunk(self, start, stop):
+        """
+        Vecteurs [start, stop) du catalogue, identiques d'un appel à l'autre
+
+        Returns:
+            Matrice float32 normalisée (stop - start, dimension)
+        """
+        rng = np.random.default_rng([self.seed, start, stop])
+        assignments = rng.integers(0, self.n_clusters, size=stop - start)
+        vectors = self.centers[assignments] + self.noise / np.sqrt(self.dimension) * rng.standard_normal(
+            (stop - start, self.dimension)
+        ).astype('float32')
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors.astype('float32')
+
+    def iter_chunks(self, chunk_size=100000):
+        """Itère sur le catalogue par blocs (start, vecteurs)"""
+        for start in range(0, self.n_vectors, chunk_size):
+            stop = min(start + chunk_size, self.n_vectors)
+            yield start, self.chunk(start, stop)
+
+    def vectors(self):
+        """Catalogue complet en mémoire (réservé aux petites tailles)"""
+        return np.vstack([v for _, v in self.iter_chunks()])
+
+    def queries(self, n_queries, query_noise=0.5, chunk_size=100000):
+        """
+        Requêtes synthétiques: films du catalogue perturbés
+
+        Args:
+            n_queries: Nombre de requêtes
+            query_noise: Bruit ajouté au film source (plus grand = requête plus vague)
+
+        Returns:
+            Matrice float32 normalisée (n_queries, dimension)
+        """
+        rng = np.random.default_rng([self.seed, 1])
+        sources = np.sort(rng.choice(self.n_vectors, size=n_queries, replace=n_queries > self.n_vectors))
+
+        base = np.empty((n_queries, self.dimension), dtype='float32')
+        for chunk_start in range(0, self.n_vectors, chunk_size):
+            chunk_stop = min(chunk_start + chunk_size, self.n_vectors)
+            mask = (sources >= chunk_start) & (sources < chunk_stop)
+            if mask.any():
+                base[mask] = self.chunk(chunk_start, chunk_stop)[sources[mask] - chunk_start]
+
+        queries = base + query_noise / np.sqrt(self.dimension) * rng.standard_normal(
+            base.shape
+        ).astype('float32')
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        return rng.permutation(queries).astype('float32')
+
+    def movies_df(self):
+        """Métadonnées synthétiques au format de movies.csv"""
+        rng = np.random.default_rng([self.seed, 2])
+        n = self.n_vectors
+        genre_ids = rng.integers(0, len(GENRES), size=(n, 2))
+        return pd.DataFrame({
+            'id': np.arange(n),
+            'title': [f"Movie {i}" for i in range(n)],
+            'plot': 'Synthetic plot used for benchmarking.',
+            'genres': [f"{GENRES[a]}, {GENRES[b]}" for a, b in genre_ids],
+            'keywords': 'benchmark, synthetic',
+            'year': rng.integers(1950, 2025, size=n),
+            'rating': np.round(rng.uniform(1, 9.5, size=n), 1),
+            'popularity': np.round(rng.exponential(15, size=n), 3),
+            'poster_path': None
+        })
+
+
+class PrecomputedEncoder:
+    """
+    Encodeur de substitution: la requête "q<i>" renvoie le i-ème vecteur précalculé
+    Permet de mesurer le chemin MovieRetriever.search sans le coût du modèle
+    """
+
+    def __init__(self, query_vectors):
+        self.query_vectors = query_vectors
+
+    def encode(self, texts, **kwargs):
+        rows = [int(text[1:]) for text in texts]
+        return self.query_vectors[rows]
@@ -9,6 +9,9 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
 from src.movie_retriever import MovieRetriever
+from src.index_builder import StreamingIndexBuilder
+from src.artifacts import load_artifact, publish_index, read_manifest
+from src.query_parser import QueryParser
 from src import config
 
 
@@ -17,17 +20,25 @@ class CineSphere:
     
     def __init__(self):
         print("Initialisation de CineSphere...")
-        self.retriever = MovieRetriever(use_trained=True)
-        self.retriever.load_movies(config.MOVIES_CSV)
+        manifest = read_manifest(config.ARTIFACTS_DIR, config.INDEX_VERSION or None)
+        self.retriever = MovieRetriever(model_path=manifest['model'] if manifest else None, use_trained=True)
         
-        if os.path.exists(config.FAISS_INDEX_FILE):
-            self.retriever.load_index(config.FAISS_INDEX_FILE, config.EMBEDDINGS_FILE)
-        else:
+        if manifest is None and not os.path.exists(config.FAISS_INDEX_FILE):
             print("\nIndex FAISS introuvable. Génération en cours...")
-            embeddings = self.retriever.generate_embeddings()
-            self.retriever.embeddings = embeddings
-            self.retriever.build_index(embeddings)
-            self.retriever.save_index(config.FAISS_INDEX_FILE, config.EMBEDDINGS_FILE)
+            builder = StreamingIndexBuilder(self.retriever, chunk_size=config.BUILD_CHUNK_SIZE,
+                                            queue_depth=config.BUILD_QUEUE_DEPTH,
+                                            train_size=config.BUILD_TRAIN_SIZE)
+            manifest = publish_index(builder, config.MOVIES_CSV, config.ARTIFACTS_DIR)
+        
+        self.retriever.load_movies(config.MOVIES_CSV)
+        if manifest is not None:
+            load_artifact(self.retriever, config.ARTIFACTS_DIR, version=manifest['version'],
+                          csv_path=config.MOVIES_CSV)
+        else:
+            self.retriever.load_index(config.FAISS_INDEX_FILE, config.EMBEDDINGS_FILE)
+        
+        if config.QUERY_PARSER:
+            self.retriever.set_query_parser(QueryParser())
         
         print("Prêt!\n")
     
@@ -45,7 +56,8 @@ class CineSphere:
         for i, movie in enumerate(results, 1):
             print(f"{i}. {movie['title']} ({movie['year']})")
             print(f"   Genres: {movie['genres']}")
-            print(f"   Note: {movie['rating']:.1f}/10")
+            if movie['rating'] is not None:
+                print(f"   Note: {movie['rating']:.1f}/10")
             print(f"   Score de pertinence: {movie['final_score']:.1%}")
             
             if movie['plot'] and len(str(movie['plot'])) > 10:
@@ -3,116 +3,395 @@ API Flask pour le moteur de recherche sémantique CineSphere
 Expose un endpoint REST pour la recherche de films
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
+import orjson
+import atexit
+import functools
+import logging
 import os
 import sys
-import math
+import time
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from movie_retriever import MovieRetriever
+from movie_retriever import MovieRetriever, RESULT_FIELDS
+from reranker import CrossEncoderReranker
+from pagination import CursorStore
+from sharding import attach_shards, read_shard_manifest
+from shard_server import attach_remote_shards
+from multi_vector import attach_multi_vector
+from artifacts import ArtifactMismatch, load_artifact, read_manifest
+from query_parser import QueryParser
+from embedding_cache import EmbeddingCache
+from warmup import Warmup, warmup_queries
+from query_log import QueryLog
+from stub_encoder import StubEncoder
+from logger import REQUEST_LOGGER, configure_logging, get_logger, log_event
+import metrics
 import config
 
 app = Flask(__name__)
 CORS(app)
 
-print("\n" + "="*70)
-print("INITIALISATION DE CINESPHERE API")
-print("="*70 + "\n")
+configure_logging(config.LOG_LEVEL, config.LOG_SAMPLE_RATE)
+log = get_logger('api')
+request_log = logging.getLogger(REQUEST_LOGGER)
 
-retriever = MovieRetriever(use_trained=True)
-retriever.load_movies(config.MOVIES_CSV)
+log.info("Initialisation de CineSphere API")
 
-if os.path.exists(config.FAISS_INDEX_FILE) and os.path.exists(config.EMBEDDINGS_FILE):
-    print("\nChargement de l'index du modèle fine-tuné...")
-    retriever.load_index(config.FAISS_INDEX_FILE, config.EMBEDDINGS_FILE)
-    print("Index chargé avec succès")
+if config.STUB_ENCODER:
+    log.warning("Encodeur de substitution actif: résultats non pertinents (tests de charge uniquement)")
+
+stub_model = StubEncoder() if config.STUB_ENCODER else None
+index_manifest = read_manifest(config.ARTIFACTS_DIR, config.INDEX_VERSION or None)
+
+if index_manifest is not None:
+    # L'encodeur de requêtes est celui qui a construit l'index (vérifié par empreinte)
+    retriever = MovieRetriever(model_path=index_manifest['model'], model=stub_model)
+    retriever.load_movies(config.MOVIES_CSV)
+    try:
+        load_artifact(retriever, config.ARTIFACTS_DIR, version=index_manifest['version'],
+                      csv_path=config.MOVIES_CSV)
+    except ArtifactMismatch as e:
+        log_event(log, logging.ERROR, "Index incohérent, démarrage annulé", error=str(e))
+        sys.exit(1)
+    fingerprint = index_manifest['model_fingerprint'] or ''
+    model_status = "base" if fingerprint.startswith('hub:') else "fine-tuned"
+    log_event(log, logging.INFO, "Index chargé", version=index_manifest['version'],
+              model=index_manifest['model'], index_type=index_manifest['index_type'],
+              storage=index_manifest['storage'])
+elif config.INDEX_VERSION:
+    log_event(log, logging.ERROR, "Version d'index introuvable", version=config.INDEX_VERSION,
+              artifacts_dir=config.ARTIFACTS_DIR)
+    sys.exit(1)
+elif os.path.exists(config.FAISS_INDEX_FILE) and os.path.exists(config.EMBEDDINGS_FILE):
+    # Index construit avant les versions: pas de manifeste, seuls les nombres de lignes sont vérifiés
+    log.warning("Aucune version d'index publiée, chargement de l'index historique "
+                "(exécutez 'python -m src.index_builder' pour publier une version)")
+    retriever = MovieRetriever(use_trained=True, model=stub_model)
+    retriever.load_movies(config.MOVIES_CSV)
+    try:
+        retriever.load_index(config.FAISS_INDEX_FILE, config.EMBEDDINGS_FILE)
+    except ValueError as e:
+        log_event(log, logging.ERROR, "Index incohérent, démarrage annulé", error=str(e))
+        sys.exit(1)
     model_status = "fine-tuned"
 else:
-    print("\nIndex fine-tuné introuvable")
-    print("Veuillez exécuter 'python -m src.movie_retriever' d'abord")
-    print("Utilisation du modèle de base en fallback...")
+    log.error("Aucun index disponible (exécutez 'python -m src.index_builder' d'abord)")
+    sys.exit(1)
+
+if config.USE_SHARDS or config.SHARD_SERVERS:
+    if read_shard_manifest(config.SHARDS_DIR) is None:
+        log.error("Aucun shard publié (exécutez 'python -m src.sharding' d'abord)")
+        sys.exit(1)
+    if config.SHARD_SERVERS:
+        # Agrégateur: les shards sont servis par d'autres processus (python -m src.shard_server)
+        shard_manifest = attach_remote_shards(retriever, config.SHARDS_DIR, config.SHARD_SERVERS)
+    else:
+        shard_manifest = attach_shards(retriever, config.SHARDS_DIR)
+    log_event(log, logging.INFO, "Index partitionné chargé", version=shard_manifest['version'],
+              strategy=shard_manifest['strategy'], shards=len(shard_manifest['shards']),
+              remote=bool(config.SHARD_SERVERS))
+elif config.USE_MULTI_VECTOR:
+    if not os.path.exists(config.MULTI_VECTOR_DIR):
+        log.error("Aucune représentation multi-vecteurs (exécutez 'python -m src.multi_vector' d'abord)")
+        sys.exit(1)
+    try:
+        fields_index = attach_multi_vector(retriever, config.MULTI_VECTOR_DIR, csv_path=config.MOVIES_CSV)
+    except ArtifactMismatch as e:
+        log_event(log, logging.ERROR, "Représentation multi-vecteurs incohérente, démarrage annulé", error=str(e))
+        sys.exit(1)
+    log_event(log, logging.INFO, "Index multi-vecteurs chargé", weights=fields_index.weights)
+
+if config.STUB_ENCODER:
+    retriever.model = StubEncoder(retriever.index.d)
+    model_status = "stub"
+
+if config.USE_RERANKER:
+    log_event(log, logging.INFO, "Activation du reranking cross-encoder",
+              top_n=config.RERANK_TOP_N, budget_ms=config.RERANK_BUDGET_MS)
+    retriever.set_reranker(
+        CrossEncoderReranker(config.RERANKER_MODEL),
+        top_n=config.RERANK_TOP_N,
+        budget_ms=config.RERANK_BUDGET_MS
+    )
+
+if config.QUERY_PARSER:
+    retriever.set_query_parser(QueryParser())
+
+if config.EMBEDDING_CACHE_SIZE > 0:
+    retriever.set_embedding_cache(EmbeddingCache(max_entries=config.EMBEDDING_CACHE_SIZE))
+
+cursor_store = CursorStore(max_entries=config.CURSOR_CACHE_SIZE, ttl_seconds=config.CURSOR_TTL_SECONDS)
+
+metrics.register_retriever(retriever)
+metrics.register_cache('cursor', cursor_store)
+if retriever.embedding_cache is not None:
+    metrics.register_cache('embedding', retriever.embedding_cache)
+
+query_log = None
+if config.QUERY_LOG:
+    query_log = QueryLog(
+        config.QUERY_LOG_DIR,
+        batch_size=config.QUERY_LOG_BATCH_SIZE,
+        flush_seconds=config.QUERY_LOG_FLUSH_SECONDS,
+        max_bytes=config.QUERY_LOG_MAX_MB * 1024**2,
+        rotate_seconds=config.QUERY_LOG_ROTATE_SECONDS,
+        max_files=config.QUERY_LOG_MAX_FILES
+    )
+    atexit.register(query_log.close)
+
+log_event(log, logging.INFO, "Serveur prêt", model_type=model_status,
+          movies_loaded=len(retriever.movies_df), index_vectors=retriever.index.ntotal,
+          index_version=index_manifest['version'] if index_manifest else None)
+
+# Préchauffage en arrière-plan: /api/health répond "warming" (503) jusqu'à la fin
+if config.WARMUP:
+    warmup = Warmup(retriever, functools.partial(warmup_queries, config.WARMUP_QUERIES, config.WARMUP_QUERY_LOG,
+                                                 config.WARMUP_QUERIES_FILE),
+                    max_depth=config.SEARCH_MAX_DEPTH)
+    warmup.start()
+else:
+    warmup = Warmup(retriever, [])
+    warmup.report = {'status': 'disabled'}
+    warmup.done.set()
+metrics.WARMUP_SECONDS.set_function(lambda: warmup.report.get('duration_s', 0.0) if warmup.ready else 0.0)
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    endpoint = request.endpoint or 'unknown'
+    if endpoint != 'prometheus_metrics':
+        metrics.REQUEST_SECONDS.labels(endpoint=endpoint).observe(time.perf_counter() - g.request_start)
+        metrics.REQUESTS_TOTAL.labels(endpoint=endpoint, status=response.status_code).inc()
+    return response
+
+
+def parse_fields(fields):
+    """
+    Valide la projection de champs demandée par le client
     
-    retriever = MovieRetriever(use_trained=False)
-    retriever.load_movies(config.MOVIES_CSV)
+    Args:
+        fields: Liste ou chaîne séparée par des virgules (None: tous les champs)
     
-    base_index = config.FAISS_INDEX_FILE.replace('_trained', '')
-    base_embeddings = config.EMBEDDINGS_FILE.replace('_trained', '')
+    Returns:
+        Tuple de noms de champs ou None
     
-    if os.path.exists(base_index):
-        retriever.load_index(base_index, base_embeddings)
-        model_status = "base"
-    else:
-        print("Aucun index disponible. Veuillez générer un index d'abord.")
-        sys.exit(1)
+    Raises:
+        ValueError: si un champ est inconnu
+    """
+    if not fields:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    
+    fields = tuple(f.strip() for f in fields if f.strip())
+    unknown = [f for f in fields if f not in RESULT_FIELDS]
+    if unknown:
+        raise ValueError(f"Champs inconnus: {', '.join(unknown)}")
+    return fields
+
+
+def parse_page_size(value, name):
+    """
+    Valide une taille de page (top_k, page_size)
+    
+    Args:
+        value: Entier ou chaîne de chiffres
+        name: Nom du paramètre (message d'erreur)
+    
+    Returns:
+        Entier entre 1 et SEARCH_MAX_DEPTH
+    
+    Raises:
+        ValueError: si la valeur n'est pas un entier strictement positif
+    """
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise ValueError(f"{name} doit être un entier strictement positif")
+    return min(value, config.SEARCH_MAX_DEPTH)
+
+
+def parse_text(value, name):
+    """
+    Valide un paramètre texte (query, cursor)
+    
+    Args:
+        value: Valeur reçue dans le corps JSON
+        name: Nom du paramètre (message d'erreur)
+    
+    Returns:
+        La chaîne, ou None si le paramètre est absent ou vide
+    
+    Raises:
+        ValueError: si la valeur n'est pas une chaîne
+    """
+    if value is None or value == '':
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"{name} doit être une chaîne de caractères")
+    return value if value.strip() else None
+
 
-print("\n" + "="*70)
-print(f"Serveur prêt - Modèle: {model_status.upper()}")
-print("="*70 + "\n")
+def json_response(payload, status=200):
+    """Sérialise avec orjson (les résultats du retriever sont déjà JSON-compatibles)"""
+    return Response(orjson.dumps(payload), status=status, mimetype='application/json')
 
 
 @app.route('/api/search', methods=['POST'])
 def search():
     """
-    Endpoint de recherche sémantique
+    Endpoint de recherche sémantique avec pagination par curseur
     
     Body JSON:
         query (str): Requête en langage naturel
-        top_k (int): Nombre de résultats (défaut: 10)
+        top_k (int): Nombre de résultats de la première page (défaut: 10)
+        cursor (str): Curseur renvoyé par un appel précédent (remplace query)
+        page_size (int): Nombre de résultats des pages suivantes (défaut: top_k)
+        fields (str|list): Projection, ex. "title,year,poster_path" (défaut: tous)
     
     Returns:
-        JSON avec liste de films pertinents
+        JSON avec liste de films pertinents et next_cursor (null si plus de résultats)
     """
-    data = request.json
-    query = data.get('query', '')
-    top_k = data.get('top_k', 10)
-    
-    if not query:
-        return jsonify({'error': 'Requête manquante'}), 400
-    
-    print(f"Recherche: '{query}'")
-    
-    results = retriever.search(query, top_k=top_k, adaptive=True)
-    
-    cleaned_results = []
-    for result in results:
-        cleaned = {}
-        for key, value in result.items():
-            if hasattr(value, 'item'):
-                cleaned[key] = value.item()
-            elif isinstance(value, float):
-                if math.isnan(value) or math.isinf(value):
-                    cleaned[key] = None
-                else:
-                    cleaned[key] = float(value)
-            elif isinstance(value, (int, str)):
-                cleaned[key] = value
-            elif value is None or (isinstance(value, float) and value != value):
-                cleaned[key] = None
-            else:
-                cleaned[key] = str(value) if value else None
-        cleaned_results.append(cleaned)
-    
-    print(f"Retourné: {len(cleaned_results)} résultats")
-    if cleaned_results:
-        print(f"Top résultat: {cleaned_results[0]['title']} (score: {cleaned_results[0]['final_score']:.3f})")
-    
-    return jsonify({'results': cleaned_results})
+    timings = {}
+    start = time.perf_counter()
+    
+    data = request.json or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Le corps doit être un objet JSON'}), 400
+    
+    try:
+        query = parse_text(data.get('query'), 'query')
+        cursor = parse_text(data.get('cursor'), 'cursor')
+        top_k = parse_page_size(data.get('top_k', 10), 'top_k')
+        page_size = parse_page_size(data.get('page_size', top_k), 'page_size')
+        fields = parse_fields(data.get('fields') or request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    timings['parse'] = time.perf_counter() - start
+    
+    missing_shards = []
+    filters = None
+    flags = {}
+    if cursor:
+        try:
+            token, offset = CursorStore.decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        entry = cursor_store.get(token)
+        if entry is None:
+            return jsonify({'error': 'Curseur expiré, relancez la recherche'}), 410
+        
+        query, ranked = entry
+        
+        page_start = time.perf_counter()
+        results = retriever.results_from_ranked(ranked[offset:offset + page_size])
+        next_offset = offset + page_size
+        flags['cache_hit'] = True
+        timings['page_fetch'] = time.perf_counter() - page_start
+    else:
+        if not query:
+            return jsonify({'error': 'Requête manquante'}), 400
+        
+        offset = 0
+        parsed = retriever.parse_query(query)
+        results, ranked, next_offset = retriever.search_deep(
+            query, top_k=top_k, max_depth=config.SEARCH_MAX_DEPTH, adaptive=True, timings=timings, parsed=parsed,
+            flags=flags
+        )
+        flags['cache_hit'] = flags.get('embedding_cached', False)
+        filters = parsed.filters if parsed is not None else None
+        token = cursor_store.create(query, ranked)
+        missing_shards = retriever.index.missing_shards() if hasattr(retriever.index, 'missing_shards') else []
+    
+    next_cursor = CursorStore.encode_cursor(token, next_offset) if next_offset < len(ranked) else None
+    
+    top_result = (results[0]['title'], results[0]['final_score']) if results else None
+    n_results = len(results)
+    result_ids = [r['id'] for r in results]
+    
+    project_start = time.perf_counter()
+    if fields:
+        results = [{f: r[f] for f in fields} for r in results]
+    timings['project'] = time.perf_counter() - project_start
+    
+    serialize_start = time.perf_counter()
+    payload = {'results': results, 'next_cursor': next_cursor}
+    if missing_shards:
+        # Shards en échec ou hors délai: résultats partiels signalés au client
+        payload['missing_shards'] = missing_shards
+    if filters:
+        # Contraintes extraites de la requête (genre, année, note), appliquées comme filtres
+        payload['filters'] = filters
+    response = json_response(payload)
+    timings['serialize'] = time.perf_counter() - serialize_start
+    
+    metrics.observe_stages(timings)
+    metrics.RESULTS_RETURNED.observe(n_results)
+    stages_ms = {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
+    total_ms = round((time.perf_counter() - start) * 1000, 3)
+    log_event(
+        request_log, logging.INFO, 'search',
+        query=query,
+        offset=offset,
+        filters=filters or None,
+        results=n_results,
+        top_title=top_result[0] if top_result else None,
+        top_score=round(top_result[1], 4) if top_result else None,
+        stages_ms=stages_ms,
+        total_ms=total_ms
+    )
+    
+    if query_log is not None:
+        # Simple put_nowait: l'écriture (lots gzip) se fait dans le thread du journal
+        query_log.record({
+            'ts': round(time.time(), 3),
+            'query': query,
+            'offset': offset,
+            'params': {'top_k': top_k, 'page_size': page_size, 'fields': list(fields) if fields else None},
+            'filters': filters,
+            'ids': result_ids,
+            'cache_hit': flags.get('cache_hit', False),
+            'missing_shards': missing_shards or None,
+            'stages_ms': stages_ms,
+            'total_ms': total_ms
+        })
+    
+    return response
 
 
 @app.route('/api/health', methods=['GET'])
 def health():
-    """Endpoint de santé pour vérifier l'état du serveur"""
+    """Endpoint de santé: "ready" une fois le préchauffage terminé, "warming" (503) avant"""
+    ready = warmup.ready
     return jsonify({
-        'status': 'ok',
+        'status': 'ready' if ready else 'warming',
+        'warmup': warmup.report,
         'movies_loaded': len(retriever.movies_df),
         'model_type': model_status,
+        'index_version': index_manifest['version'] if index_manifest else None,
+        'reranker': retriever.reranker.model_name if retriever.reranker else None,
         'message': f'Modèle {model_status} actif'
-    })
+    }), 200 if ready else 503
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Expose les métriques au format Prometheus"""
+    body, content_type = metrics.render()
+    return Response(body, mimetype=content_type)
 
 
 if __name__ == '__main__':
-    print("\nDémarrage du serveur Flask sur http://localhost:5001")
-    print("Ouvrez frontend/index.html dans votre navigateur\n")
+    log.info("Démarrage du serveur Flask sur http://localhost:5001 "
+             "(ouvrez frontend/index.html dans votre navigateur)")
     app.run(debug=True, port=5001, host='0.0.0.0')
\ No newline at end of file
@@ -0,0 +1,325 @@
+"""
+Artefacts d'index versionnés
+Chaque construction de l'index produit une version complète et immuable:
+    index/v0003/index.bin
+    index/v0003/index_quantization.json
+    index/v0003/embeddings.npy
+    index/v0003/manifest.json    (modèle, catalogue, dimensions, paramètres, durées)
+    index/manifest.json          (copie du manifeste de la version courante)
+
+La version est construite dans v0003.tmp puis renommée: un processus qui charge
+l'index ne voit jamais de fichiers à moitié écrits. Au chargement, le manifeste est
+vérifié contre le catalogue et le modèle réellement chargés (empreintes, nombre de
+vecteurs, dimension): une incohérence arrête le démarrage au lieu de servir les
+films d'autres lignes.
+
+Usage:
+    python -m src.artifacts                 # versions publiées
+    python -m src.artifacts --verify        # vérifie la version courante
+    python -m src.artifacts --use 2         # redevient la version courante (retour arrière)
+"""
+
+import argparse
+import datetime
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import config
+
+
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_FORMAT = 1
+INDEX_FILE = 'index.bin'
+EMBEDDINGS_FILE = 'embeddings.npy'
+
+# Sous-dossier des checkpoints d'entraînement (training/checkpoint.py): exclu de l'empreinte du modèle
+CHECKPOINTS_DIR = 'checkpoints'
+
+
+class ArtifactMismatch(ValueError):
+    """L'artefact ne correspond pas au catalogue ou au modèle chargés"""
+
+
+def _hash_file(digest, path, block_size=1024**2):
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+
+
+def catalog_hash(csv_path):
+    """Empreinte SHA-256 du fichier catalogue"""
+    digest = hashlib.sha256()
+    _hash_file(digest, csv_path)
+    return digest.hexdigest()
+
+
+def model_fingerprint(model_path):
+    """
+    Empreinte d'un modèle SentenceTransformer
+
+    Args:
+        model_path: Dossier du modèle, ou nom d'un modèle du hub
+
+    Returns:
+        SHA-256 des fichiers du dossier (noms et contenus, checkpoints exclus),
+        'hub:<nom>' pour un modèle du hub, None si le modèle est inconnu (encodeur fourni)
+    """
+    if model_path is None:
+        return None
+    if not os.path.isdir(model_path):
+        return f"hub:{model_path}"
+
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(model_path):
+        dirs[:] = sorted(d for d in dirs if d != CHECKPOINTS_DIR)
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, model_path).encode('utf-8'))
+            _hash_file(digest, path)
+    return digest.hexdigest()
+
+
+def version_dir(artifacts_dir, version):
+    return os.path.join(artifacts_dir, f"v{version:04d}")
+
+
+def list_versions(artifacts_dir):
+    """Versions publiées (complètes), croissantes"""
+    versions = []
+    for path in glob.glob(os.path.join(artifacts_dir, 'v[0-9][0-9][0-9][0-9]')):
+        if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+            versions.append(int(os.path.basename(path)[1:]))
+    return sorted(versions)
+
+
+def read_manifest(artifacts_dir, version=None):
+    """
+    Manifeste de la version demandée (défaut: version courante)
+
+    Returns:
+        Dictionnaire du manifeste, None si aucune version n'a été publiée
+    """
+    path = os.path.join(artifacts_dir, MANIFEST_FILE)
+    if version:
+        path = os.path.join(version_dir(artifacts_dir, version), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def set_current(artifacts_dir, version):
+    """Rend courante une version publiée (copie atomique de son manifeste)"""
+    source = os.path.join(version_dir(artifacts_dir, version), MANIFEST_FILE)
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"Version d'index inconnue: v{version:04d}")
+    current_tmp = os.path.join(artifacts_dir, f"{MANIFEST_FILE}.tmp")
+    shutil.copyfile(source, current_tmp)
+    os.replace(current_tmp, os.path.join(artifacts_dir, MANIFEST_FILE))
+
+
+def index_files(artifacts_dir, version=None):
+    """
+    Fichiers d'index et d'embeddings à utiliser
+
+    Returns:
+        Tuple (index_path, embeddings_path) de la version demandée ou courante; à défaut de
+        version publiée, les fichiers historiques (config.FAISS_INDEX_FILE, config.EMBEDDINGS_FILE)
+    """
+    manifest = read_manifest(artifacts_dir, version)
+    if manifest is None:
+        if version:
+            raise FileNotFoundError(f"Version d'index inconnue: v{version:04d}")
+        return config.FAISS_INDEX_FILE, config.EMBEDDINGS_FILE
+    path = version_dir(artifacts_dir, manifest['version'])
+    return os.path.join(path, INDEX_FILE), os.path.join(path, EMBEDDINGS_FILE)
+
+
+def reusable_embeddings(artifacts_dir, csv_path, model_path):
+    """
+    Embeddings de la version courante, s'ils ont été calculés sur ce catalogue avec ce modèle
+
+    Args:
+        artifacts_dir: Dossier racine des versions
+        csv_path: Catalogue (movies.csv)
+        model_path: Modèle qui encoderait le catalogue
+
+    Returns:
+        Chemin du fichier d'embeddings, None s'il faut les recalculer (aucune version publiée,
+        autre catalogue ou autre modèle)
+    """
+    manifest = read_manifest(artifacts_dir)
+    if manifest is None or manifest['catalog_hash'] != catalog_hash(csv_path):
+        return None
+    fingerprint = model_fingerprint(model_path)
+    if fingerprint is None or fingerprint != manifest['model_fingerprint']:
+        return None
+    _, embeddings_path = index_files(artifacts_dir, manifest['version'])
+    return embeddings_path if os.path.exists(embeddings_path) else None
+
+
+def publish_index(builder, csv_path, artifacts_dir, index_type='flat', dim=None, reduction='pca',
+                  storage='float'):
+    """
+    Construit l'index d'un catalogue dans une nouvelle version et la rend courante
+
+    Args:
+        builder: StreamingIndexBuilder (son retriever fournit l'encodeur)
+        csv_path: Catalogue (movies.csv)
+        artifacts_dir: Dossier racine des versions
+        index_type, dim, reduction, storage: voir MovieRetriever.build_index
+
+    Returns:
+        Manifeste de la version publiée
+    """
+    versions = list_versions(artifacts_dir)
+    version = versions[-1] + 1 if versions else 1
+    target = version_dir(artifacts_dir, version)
+    tmp_dir = f"{target}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    try:
+        # Empreinte prise avant la construction: un catalogue modifié pendant la lecture
+        # sera détecté au chargement
+        catalog = catalog_hash(csv_path)
+        report = builder.build(csv_path, os.path.join(tmp_dir, INDEX_FILE), os.path.join(tmp_dir, EMBEDDINGS_FILE),
+                               index_type=index_type, dim=dim, reduction=reduction, storage=storage)
+        retriever = builder.retriever
+        manifest = {
+            'format': MANIFEST_FORMAT,
+            'version': version,
+            'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'model': str(retriever.model_path) if retriever.model_path else None,
+            'model_fingerprint': model_fingerprint(retriever.model_path),
+            'catalog': os.path.basename(csv_path),
+            'catalog_hash': catalog,
+            'n_vectors': int(retriever.index.ntotal),
+            'dimension': report['dimension'],
+            'index_type': index_type,
+            'dim': dim or None,
+            'reduction': reduction,
+            'storage': storage,
+            'build': report
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    # Publication: la version complète apparaît d'un coup, puis devient courante
+    os.replace(tmp_dir, target)
+    set_current(artifacts_dir, version)
+    return manifest
+
+
+def verify_artifact(manifest, retriever, csv_path=None, check_model=True):
+    """
+    Compare un manifeste au catalogue, à l'index et au modèle chargés
+
+    Args:
+        manifest: Manifeste de la version chargée
+        retriever: MovieRetriever avec catalogue et index chargés
+        csv_path: Fichier du catalogue chargé (None: empreinte non vérifiée)
+        check_model: Vérifie l'empreinte du modèle (ignoré si l'encodeur a été fourni tel quel,
+            au chargement comme à la construction)
+
+    Raises:
+        ArtifactMismatch: Première incohérence trouvée
+    """
+    version = f"v{manifest['version']:04d}"
+    if retriever.index.ntotal != manifest['n_vectors']:
+        raise ArtifactMismatch(f"{version}: {retriever.index.ntotal} vecteurs dans l'index, "
+                               f"{manifest['n_vectors']} dans le manifeste (fichiers modifiés)")
+    if len(retriever.movies_df) != manifest['n_vectors']:
+        raise ArtifactMismatch(f"{version}: construite pour {manifest['n_vectors']} films, "
+                               f"le catalogue en contient {len(retriever.movies_df)}")
+    if csv_path is not None and catalog_hash(csv_path) != manifest['catalog_hash']:
+        raise ArtifactMismatch(f"{version}: construite sur un autre catalogue que {csv_path}")
+    if retriever.embeddings.shape[1] != manifest['dimension']:
+        raise ArtifactMismatch(f"{version}: embeddings de dimension {retriever.embeddings.shape[1]}, "
+                               f"{manifest['dimension']} attendue")
+
+    if not check_model or manifest['model_fingerprint'] is None:
+        return
+    fingerprint = model_fingerprint(retriever.model_path)
+    if fingerprint is not None and fingerprint != manifest['model_fingerprint']:
+        raise ArtifactMismatch(f"{version}: construite avec le modèle {manifest['model']}, "
+                               f"le modèle chargé ({retriever.model_path}) est différent")
+
+
+def load_artifact(retriever, artifacts_dir, version=None, csv_path=None, check_model=True):
+    """
+    Charge et vérifie une version de l'index
+
+    Args:
+        retriever: MovieRetriever dont le catalogue est chargé
+        artifacts_dir: Dossier racine des versions
+        version: Numéro de version (None: version courante)
+        csv_path, check_model: voir verify_artifact
+
+    Returns:
+        Manifeste de la version chargée
+
+    Raises:
+        FileNotFoundError: Aucune version publiée, ou version inconnue
+        ArtifactMismatch: L'index ne correspond pas au catalogue ou au modèle
+    """
+    manifest = read_manifest(artifacts_dir, version)
+    if manifest is None:
+        raise FileNotFoundError(f"Aucune version d'index dans {artifacts_dir}"
+                                + (f" (v{version:04d})" if version else ""))
+    index_path, embeddings_path = index_files(artifacts_dir, manifest['version'])
+    try:
+        retriever.load_index(index_path, embeddings_path)
+    except ValueError as e:
+        raise ArtifactMismatch(f"v{manifest['version']:04d}: {e}") from e
+    verify_artifact(manifest, retriever, csv_path=csv_path, check_model=check_model)
+    return manifest
+
+
+def main(argv=None):
+    """Liste, vérifie ou change la version courante de l'index"""
+    parser = argparse.ArgumentParser(description="Versions publiées de l'index FAISS")
+    parser.add_argument('--dir', default=config.ARTIFACTS_DIR, help="Dossier des versions")
+    parser.add_argument('--verify', action='store_true', help="Charge et vérifie la version (défaut: courante)")
+    parser.add_argument('--version', type=int, default=None, help="Version à vérifier")
+    parser.add_argument('--use', type=int, default=None, help="Rend courante une version publiée")
+    args = parser.parse_args(argv)
+
+    if args.use:
+        set_current(args.dir, args.use)
+        print(f"Version courante: v{args.use:04d}")
+
+    current = read_manifest(args.dir)
+    versions = list_versions(args.dir)
+    if not versions:
+        print(f"Aucune version publiée dans {args.dir} (exécutez 'python -m src.index_builder')")
+        return
+
+    print(f"\n{'version':<9} {'créée':<20} {'films':>8} {'dim':>5} {'index':<7} {'stockage':<8} {'durée s':>8}")
+    for version in versions:
+        manifest = read_manifest(args.dir, version)
+        marker = '*' if current and current['version'] == version else ' '
+        print(f"{marker}v{version:04d}   {manifest['created_at']:<20} {manifest['n_vectors']:>8} "
+              f"{manifest['dimension']:>5} {manifest['index_type']:<7} {manifest['storage']:<8} "
+              f"{manifest['build']['wall_s']:>8}")
+
+    if args.verify:
+        from movie_retriever import MovieRetriever
+
+        manifest = read_manifest(args.dir, args.version)
+        retriever = MovieRetriever(model_path=manifest['model'])
+        retriever.load_movies(config.MOVIES_CSV)
+        load_artifact(retriever, args.dir, version=args.version, csv_path=config.MOVIES_CSV)
+        print(f"\nv{manifest['version']:04d} cohérente avec {config.MOVIES_CSV} et {manifest['model']}")
+
+
+if __name__ == "__main__":
+    main()
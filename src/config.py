@@ -22,6 +22,88 @@ MODELS_DIR = os.path.join(BASE_DIR, "models")
 MOVIES_CSV = os.path.join(DATA_DIR, "raw", "movies.csv")
 EMBEDDINGS_FILE = os.path.join(DATA_DIR, "processed", "embeddings_trained.npy")
 FAISS_INDEX_FILE = os.path.join(DATA_DIR, "processed", "faiss_index_trained.bin")
+ARTIFACTS_DIR = os.getenv('ARTIFACTS_DIR', os.path.join(DATA_DIR, "processed", "index"))
+INDEX_VERSION = int(os.getenv('INDEX_VERSION', '0'))
 TRAINING_DATA_PATH = os.path.join(DATA_DIR, "processed", "training_pairs.csv")
 
-FINE_TUNED_MODEL_PATH = os.path.join(MODELS_DIR, "fine_tuned", "movie_finder_v1")
\ No newline at end of file
+FINE_TUNED_MODEL_PATH = os.path.join(MODELS_DIR, "fine_tuned", "movie_finder_v1")
+
+RERANKER_MODEL = os.getenv('RERANKER_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+USE_RERANKER = os.getenv('USE_RERANKER', '0') == '1'
+RERANK_TOP_N = int(os.getenv('RERANK_TOP_N', '20'))
+RERANK_BUDGET_MS = float(os.getenv('RERANK_BUDGET_MS', '150'))
+
+SEARCH_MAX_DEPTH = int(os.getenv('SEARCH_MAX_DEPTH', '200'))
+CURSOR_CACHE_SIZE = int(os.getenv('CURSOR_CACHE_SIZE', '1000'))
+CURSOR_TTL_SECONDS = int(os.getenv('CURSOR_TTL_SECONDS', '600'))
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.1'))
+
+INDEX_TYPE = os.getenv('INDEX_TYPE', 'flat')
+INDEX_DIM = int(os.getenv('INDEX_DIM', '0'))
+INDEX_REDUCTION = os.getenv('INDEX_REDUCTION', 'pca')
+INDEX_STORAGE = os.getenv('INDEX_STORAGE', 'float')
+RESCORE_FACTOR = int(os.getenv('RESCORE_FACTOR', '8'))
+
+BUILD_CHUNK_SIZE = int(os.getenv('BUILD_CHUNK_SIZE', '2000'))
+BUILD_QUEUE_DEPTH = int(os.getenv('BUILD_QUEUE_DEPTH', '2'))
+BUILD_TRAIN_SIZE = int(os.getenv('BUILD_TRAIN_SIZE', '20000'))
+
+SHARDS_DIR = os.path.join(DATA_DIR, "processed", "shards")
+USE_SHARDS = os.getenv('USE_SHARDS', '0') == '1'
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '4'))
+SHARD_STRATEGY = os.getenv('SHARD_STRATEGY', 'hash')
+SHARD_SEARCH_THREADS = int(os.getenv('SHARD_SEARCH_THREADS', '0'))
+SHARD_SERVERS = os.getenv('SHARD_SERVERS', '')
+SHARD_TIMEOUT_MS = float(os.getenv('SHARD_TIMEOUT_MS', '200'))
+SHARD_ALLOW_PARTIAL = os.getenv('SHARD_ALLOW_PARTIAL', '1') == '1'
+# Requêtes par message accepté par un serveur de shard (borne la mémoire allouée par requête)
+SHARD_MAX_BATCH = int(os.getenv('SHARD_MAX_BATCH', '1024'))
+
+MULTI_VECTOR_DIR = os.path.join(DATA_DIR, "processed", "multi_vector")
+USE_MULTI_VECTOR = os.getenv('USE_MULTI_VECTOR', '0') == '1'
+FIELD_WEIGHTS = os.getenv('FIELD_WEIGHTS', 'title:0.25,keywords:0.35,plot:0.4')
+PLOT_CHUNK_WORDS = int(os.getenv('PLOT_CHUNK_WORDS', '64'))
+PLOT_MAX_CHUNKS = int(os.getenv('PLOT_MAX_CHUNKS', '8'))
+
+QUERY_PARSER = os.getenv('QUERY_PARSER', '1') == '1'
+QUERY_FILTER_OVERFETCH = int(os.getenv('QUERY_FILTER_OVERFETCH', '10'))
+
+QUERY_LOG = os.getenv('QUERY_LOG', '1') == '1'
+QUERY_LOG_DIR = os.getenv('QUERY_LOG_DIR', os.path.join(DATA_DIR, "processed", "query_log"))
+QUERY_LOG_BATCH_SIZE = int(os.getenv('QUERY_LOG_BATCH_SIZE', '256'))
+QUERY_LOG_FLUSH_SECONDS = float(os.getenv('QUERY_LOG_FLUSH_SECONDS', '2'))
+QUERY_LOG_MAX_MB = int(os.getenv('QUERY_LOG_MAX_MB', '64'))
+QUERY_LOG_ROTATE_SECONDS = int(os.getenv('QUERY_LOG_ROTATE_SECONDS', '3600'))
+QUERY_LOG_MAX_FILES = int(os.getenv('QUERY_LOG_MAX_FILES', '168'))
+
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '10000'))
+
+WARMUP = os.getenv('WARMUP', '1') == '1'
+WARMUP_QUERIES = int(os.getenv('WARMUP_QUERIES', '200'))
+WARMUP_QUERY_LOG = os.getenv('WARMUP_QUERY_LOG', QUERY_LOG_DIR if QUERY_LOG else '')
+WARMUP_QUERIES_FILE = os.getenv('WARMUP_QUERIES_FILE', '')
+
+DEDUP_MODE = os.getenv('DEDUP_MODE', 'tag')
+DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.7'))
+DEDUP_NUM_PERM = int(os.getenv('DEDUP_NUM_PERM', '64'))
+DEDUP_BANDS = int(os.getenv('DEDUP_BANDS', '16'))
+DEDUP_SHINGLE_SIZE = int(os.getenv('DEDUP_SHINGLE_SIZE', '3'))
+DEDUP_EMBEDDING_THRESHOLD = float(os.getenv('DEDUP_EMBEDDING_THRESHOLD', '0.97'))
+DEDUP_DIVERSIFY = os.getenv('DEDUP_DIVERSIFY', '1') == '1'
+
+STUB_ENCODER = os.getenv('STUB_ENCODER', '0') == '1'
+
+TRAINING_DATA_DIR = os.path.join(DATA_DIR, "processed", "training_pairs")
+
+TRAIN_NUM_WORKERS = int(os.getenv('TRAIN_NUM_WORKERS', '2'))
+TRAIN_PREFETCH_FACTOR = int(os.getenv('TRAIN_PREFETCH_FACTOR', '4'))
+TRAIN_TOKEN_CACHE = os.getenv('TRAIN_TOKEN_CACHE', '1') == '1'
+TRAIN_MINI_BATCH_SIZE = int(os.getenv('TRAIN_MINI_BATCH_SIZE', '32'))
+TRAIN_CHECKPOINT_STEPS = int(os.getenv('TRAIN_CHECKPOINT_STEPS', '500'))
+TRAIN_CHECKPOINT_LIMIT = int(os.getenv('TRAIN_CHECKPOINT_LIMIT', '2'))
+TRAIN_MATRYOSHKA_DIMS = [int(d) for d in os.getenv('TRAIN_MATRYOSHKA_DIMS', '').split(',') if d]
+
+VAL_SUBSET_SIZE = int(os.getenv('VAL_SUBSET_SIZE', '2000'))
+VAL_BATCH_SIZE = int(os.getenv('VAL_BATCH_SIZE', '256'))
@@ -12,6 +12,7 @@ import sys
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 import config
+from dedup import deduplicate
 
 
 class TMDbFetcher:
@@ -101,6 +102,7 @@ class TMDbFetcher:
     def save_to_csv(self, movies, filename):
         """
         Sauvegarde les films dans un fichier CSV
+        Les doublons exacts (id) sont retirés, les quasi-doublons regroupés (voir src/dedup.py)
         
         Args:
             movies: Liste de dictionnaires de films
@@ -113,6 +115,14 @@ class TMDbFetcher:
         df = df[df['plot'].str.len() > 20]
         df = df.drop_duplicates(subset=['id'])
         
+        if config.DEDUP_MODE != 'off':
+            df, report = deduplicate(
+                df, mode=config.DEDUP_MODE, threshold=config.DEDUP_THRESHOLD, num_perm=config.DEDUP_NUM_PERM,
+                bands=config.DEDUP_BANDS, shingle_size=config.DEDUP_SHINGLE_SIZE
+            )
+            print(f"\n{report['duplicates']} quasi-doublons regroupés en {report['groups']} groupes "
+                  f"(mode {config.DEDUP_MODE}, {report['seconds']}s)")
+        
         os.makedirs(os.path.dirname(filename), exist_ok=True)
         df.to_csv(filename, index=False)
         
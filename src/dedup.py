@@ -0,0 +1,361 @@
+"""
+Détection des quasi-doublons du catalogue (remakes, ressorties, doublons localisés)
+Chaque film est réduit à l'ensemble de ses shingles (k-grammes de mots du résumé et
+mots-clés), puis à une signature MinHash de num_perm valeurs dont la proportion de
+valeurs égales estime la similarité de Jaccard entre deux films. Le LSH découpe les
+signatures en bandes: deux films partageant une bande sont candidats, et chaque
+candidat n'est comparé qu'au premier film de son compartiment. Le coût est linéaire
+en nombre de films, sans comparaison de toutes les paires.
+
+En option, les voisins proches dans l'espace des embeddings (index FAISS) rejoignent
+le même groupe: résumés reformulés ou traduits, que les shingles ne relient pas.
+
+Chaque groupe est représenté par son film le plus populaire (colonne dup_group: son id).
+Mode 'tag': tous les films sont gardés et la recherche diversifie par groupe; mode
+'collapse': seul le film représentant est gardé.
+
+Usage:
+    python -m src.dedup --dry-run
+    python -m src.dedup --mode collapse --embeddings
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import config
+
+
+DEDUP_MODES = ('off', 'tag', 'collapse')
+
+# Nombre premier de Mersenne 2^31 - 1: (a * x + b) tient dans un uint64 pour x, a, b < 2^31
+PRIME = np.uint64((1 << 31) - 1)
+
+_TOKEN_REGEX = re.compile(r"\w+")
+
+
+def shingle_hashes(plot, keywords, shingle_size=3):
+    """
+    Shingles d'un film, hachés
+
+    Args:
+        plot: Résumé (k-grammes de mots)
+        keywords: Mots-clés séparés par des virgules (un shingle par mot-clé)
+        shingle_size: Mots par k-gramme du résumé
+
+    Returns:
+        Tableau uint64 des hachages distincts (vide si le film n'a ni résumé ni mots-clés)
+    """
+    parts = []
+    if isinstance(plot, str):
+        words = np.fromiter((zlib.crc32(w.encode('utf-8')) for w in _TOKEN_REGEX.findall(plot.lower())),
+                            dtype=np.uint64)
+        size = min(shingle_size, len(words))
+        if size:
+            # Hachage polynomial des k-grammes, calculé sur tout le résumé à la fois
+            hashes = words[:len(words) - size + 1].copy()
+            for offset in range(1, size):
+                hashes = hashes * np.uint64(1000003) + words[offset:len(words) - size + 1 + offset]
+            parts.append(hashes)
+    if isinstance(keywords, str):
+        parts.append(np.array([zlib.crc32(("k:" + k.strip().lower()).encode('utf-8'))
+                               for k in keywords.split(',') if k.strip()], dtype=np.uint64))
+    if not parts:
+        return np.empty(0, dtype=np.uint64)
+    return np.unique(np.concatenate(parts))
+
+
+class MinHasher:
+    """Signatures MinHash par permutations universelles (a * x + b) mod PRIME"""
+
+    def __init__(self, num_perm=64, seed=42):
+        """
+        Args:
+            num_perm: Valeurs par signature (précision de l'estimation de Jaccard)
+            seed: Graine des permutations (les mêmes pour tout le catalogue)
+        """
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, int(PRIME), size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(PRIME), size=num_perm, dtype=np.uint64)
+
+    def signatures(self, documents):
+        """
+        Args:
+            documents: Liste de tableaux de hachages (shingle_hashes)
+
+        Returns:
+            Tuple (signatures (n, num_perm) uint32, masque des films avec au moins un shingle)
+        """
+        lengths = np.array([len(d) for d in documents], dtype=np.int64)
+        valid = lengths > 0
+        signatures = np.full((len(documents), self.num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+        if not valid.any():
+            return signatures, valid
+
+        # Tous les shingles du lot à la suite: un minimum par film et par permutation (reduceat)
+        flat = np.concatenate([d for d in documents if len(d)]) % PRIME
+        offsets = np.concatenate(([0], np.cumsum(lengths[valid])[:-1]))
+        rows = np.flatnonzero(valid)
+        for p in range(self.num_perm):
+            hashed = (self.a[p] * flat + self.b[p]) % PRIME
+            signatures[rows, p] = np.minimum.reduceat(hashed, offsets)
+        return signatures, valid
+
+
+class DisjointSet:
+    """Union-find sur les positions du catalogue"""
+
+    def __init__(self, n):
+        self.parent = np.arange(n)
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i, j):
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i != root_j:
+            self.parent[max(root_i, root_j)] = min(root_i, root_j)
+            return True
+        return False
+
+    def roots(self):
+        return np.array([self.find(i) for i in range(len(self.parent))])
+
+
+def lsh_pairs(signatures, valid, bands=16, threshold=0.7):
+    """
+    Paires de quasi-doublons par LSH en bandes
+
+    Args:
+        signatures: Signatures MinHash (n, num_perm)
+        valid: Films à considérer
+        bands: Nombre de bandes (num_perm doit en être un multiple)
+        threshold: Jaccard estimée minimale (proportion de valeurs de signature égales)
+
+    Returns:
+        Itérateur de paires (i, j) de positions
+    """
+    n, num_perm = signatures.shape
+    if num_perm % bands:
+        raise ValueError(f"num_perm ({num_perm}) doit être un multiple de bands ({bands})")
+    rows_per_band = num_perm // bands
+    positions = np.flatnonzero(valid)
+    if len(positions) < 2:
+        return
+
+    for band in range(bands):
+        block = np.ascontiguousarray(signatures[positions, band * rows_per_band:(band + 1) * rows_per_band])
+        keys = block.view(np.dtype((np.void, block.dtype.itemsize * rows_per_band))).ravel()
+        _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        if counts.max() < 2:
+            continue
+
+        order = np.argsort(inverse, kind='stable')
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        for bucket in np.flatnonzero(counts > 1):
+            members = positions[order[starts[bucket]:starts[bucket] + counts[bucket]]]
+            leader = members[0]
+            # Comparaison au premier film du compartiment seulement: linéaire même pour
+            # un compartiment très peuplé (résumé générique partagé)
+            agreement = (signatures[members[1:]] == signatures[leader]).mean(axis=1)
+            for other in members[1:][agreement >= threshold]:
+                yield int(leader), int(other)
+
+
+def embedding_pairs(embeddings, threshold=0.97, neighbours=5, batch_size=10000):
+    """
+    Paires de films dont les embeddings sont quasi identiques (similarité cosinus)
+
+    Args:
+        embeddings: Embeddings du catalogue (n, dimension), dans l'ordre des lignes
+        threshold: Similarité cosinus minimale
+        neighbours: Voisins examinés par film
+        batch_size: Films recherchés par lot
+
+    Returns:
+        Itérateur de paires (i, j) de positions
+    """
+    from movie_retriever import create_index, train_index
+
+    n = len(embeddings)
+    index = create_index(embeddings.shape[1], 'flat' if n <= 50000 else 'ivf', n_vectors=n)
+    normalized = []
+    for start in range(0, n, batch_size):
+        batch = np.asarray(embeddings[start:start + batch_size], dtype='float32')
+        norms = np.linalg.norm(batch, axis=1, keepdims=True)
+        normalized.append(np.ascontiguousarray(batch / np.maximum(norms, 1e-12)))
+    normalized = np.concatenate(normalized)
+    train_index(index, normalized)
+    index.add(normalized)
+
+    # Vecteurs normalisés: ||u - v||² = 2 - 2 cos(u, v)
+    max_distance = 2.0 - 2.0 * threshold
+    for start in range(0, n, batch_size):
+        distances, indices = index.search(normalized[start:start + batch_size], neighbours + 1)
+        for offset, (row_distances, row_indices) in enumerate(zip(distances, indices)):
+            i = start + offset
+            for distance, j in zip(row_distances, row_indices):
+                if j >= 0 and j != i and distance <= max_distance:
+                    yield i, int(j)
+
+
+def find_near_duplicates(movies_df, threshold=0.7, num_perm=64, bands=16, shingle_size=3, embeddings=None,
+                         embedding_threshold=0.97, chunk_size=10000, seed=42):
+    """
+    Groupes de quasi-doublons du catalogue
+
+    Args:
+        movies_df: Catalogue (colonnes plot et keywords)
+        threshold: Jaccard estimée minimale entre shingles
+        num_perm, bands: Taille des signatures MinHash et nombre de bandes LSH
+        shingle_size: Mots par shingle du résumé
+        embeddings: Embeddings du catalogue, dans l'ordre des lignes (None: MinHash seul)
+        embedding_threshold: Similarité cosinus minimale entre embeddings
+        chunk_size: Films hachés par lot (borne la mémoire des shingles)
+        seed: Graine des permutations MinHash
+
+    Returns:
+        Tableau de la position du premier film de chaque groupe, par film
+    """
+    hasher = MinHasher(num_perm=num_perm, seed=seed)
+    plots = movies_df['plot'].tolist()
+    keywords = movies_df['keywords'].tolist() if 'keywords' in movies_df else [None] * len(movies_df)
+
+    signatures = np.empty((len(movies_df), num_perm), dtype=np.uint32)
+    valid = np.empty(len(movies_df), dtype=bool)
+    for start in range(0, len(movies_df), chunk_size):
+        documents = [shingle_hashes(p, k, shingle_size)
+                     for p, k in zip(plots[start:start + chunk_size], keywords[start:start + chunk_size])]
+        signatures[start:start + len(documents)], valid[start:start + len(documents)] = hasher.signatures(documents)
+
+    groups = DisjointSet(len(movies_df))
+    for i, j in lsh_pairs(signatures, valid, bands=bands, threshold=threshold):
+        groups.union(i, j)
+    if embeddings is not None:
+        if len(embeddings) != len(movies_df):
+            raise ValueError(f"{len(embeddings)} embeddings pour {len(movies_df)} films")
+        for i, j in embedding_pairs(embeddings, threshold=embedding_threshold):
+            groups.union(i, j)
+    return groups.roots()
+
+
+def deduplicate(movies_df, mode='tag', **kwargs):
+    """
+    Regroupe les quasi-doublons du catalogue
+
+    Args:
+        movies_df: Catalogue
+        mode: 'tag' (colonne dup_group: id du film représentant, vide pour un film unique)
+            ou 'collapse' (seuls les films représentants sont gardés)
+        **kwargs: Paramètres de find_near_duplicates
+
+    Returns:
+        Tuple (catalogue, rapport)
+    """
+    if mode not in DEDUP_MODES[1:]:
+        raise ValueError(f"Mode inconnu: {mode} (attendu: tag, collapse)")
+    start = time.perf_counter()
+    movies_df = movies_df.reset_index(drop=True)
+    roots = find_near_duplicates(movies_df, **kwargs)
+
+    # Représentant: le film le plus populaire du groupe (l'original plutôt que la ressortie)
+    popularity = pd.to_numeric(movies_df['popularity'], errors='coerce').fillna(0.0)
+    frame = pd.DataFrame({'root': roots, 'popularity': popularity.to_numpy()})
+    canonical = frame.groupby('root')['popularity'].idxmax()
+    sizes = frame.groupby('root').size()
+    representative = canonical.reindex(roots).to_numpy()
+    grouped = sizes.reindex(roots).to_numpy() > 1
+
+    movies_df = movies_df.copy()
+    movies_df['dup_group'] = pd.array(np.where(grouped, movies_df['id'].to_numpy()[representative], None),
+                                      dtype='Int64')
+    report = {
+        'movies': len(movies_df),
+        'groups': int((sizes > 1).sum()),
+        'duplicates': int(grouped.sum() - (sizes > 1).sum()),
+        'largest_group': int(sizes.max()) if len(sizes) else 0,
+        'seconds': round(time.perf_counter() - start, 2)
+    }
+    if mode == 'collapse':
+        movies_df = collapse_groups(movies_df)
+    return movies_df, report
+
+
+def collapse_groups(movies_df):
+    """Garde les films uniques et les représentants de chaque groupe (colonne dup_group)"""
+    keep = movies_df['dup_group'].isna() | movies_df['dup_group'].eq(movies_df['id']).fillna(False)
+    return movies_df[keep.to_numpy(dtype=bool)].reset_index(drop=True)
+
+
+def main(argv=None):
+    """Regroupe les quasi-doublons de movies.csv et réécrit le catalogue"""
+    parser = argparse.ArgumentParser(description="Quasi-doublons du catalogue (MinHash/LSH)")
+    parser.add_argument('--mode', choices=DEDUP_MODES[1:], default='tag')
+    parser.add_argument('--threshold', type=float, default=config.DEDUP_THRESHOLD, help="Jaccard minimale")
+    parser.add_argument('--num-perm', type=int, default=config.DEDUP_NUM_PERM)
+    parser.add_argument('--bands', type=int, default=config.DEDUP_BANDS)
+    parser.add_argument('--embeddings', action='store_true',
+                        help="Regroupe aussi les embeddings quasi identiques (index courant)")
+    parser.add_argument('--embedding-threshold', type=float, default=config.DEDUP_EMBEDDING_THRESHOLD)
+    parser.add_argument('--dry-run', action='store_true', help="Rapport seulement, movies.csv inchangé")
+    parser.add_argument('--output', default=os.path.join(config.BASE_DIR, 'docs'),
+                        help="Dossier du rapport des groupes")
+    args = parser.parse_args(argv)
+
+    movies_df = pd.read_csv(config.MOVIES_CSV)
+    embeddings = None
+    if args.embeddings:
+        from artifacts import index_files
+
+        _, embeddings_path = index_files(config.ARTIFACTS_DIR)
+        embeddings = np.load(embeddings_path, mmap_mode='r') if os.path.exists(embeddings_path) else None
+        if embeddings is None or len(embeddings) != len(movies_df):
+            print(f"Erreur: embeddings absents ou d'un autre catalogue ({embeddings_path})")
+            print("Exécutez d'abord: python -m src.index_builder")
+            sys.exit(1)
+
+    print(f"Recherche des quasi-doublons parmi {len(movies_df)} films...")
+    tagged, report = deduplicate(
+        movies_df.drop(columns=['dup_group'], errors='ignore'), mode='tag', threshold=args.threshold,
+        num_perm=args.num_perm, bands=args.bands, shingle_size=config.DEDUP_SHINGLE_SIZE,
+        embeddings=embeddings, embedding_threshold=args.embedding_threshold
+    )
+    print(f"{report['groups']} groupes, {report['duplicates']} doublons "
+          f"(plus grand groupe: {report['largest_group']} films) en {report['seconds']}s")
+
+    groups = tagged[tagged['dup_group'].notna()].sort_values(['dup_group', 'popularity'], ascending=[True, False])
+    if len(groups):
+        print("\nExemples:")
+        for group, members in list(groups.groupby('dup_group', sort=False))[:10]:
+            years = pd.to_numeric(members['year'], errors='coerce')
+            print("  " + " | ".join(f"{t} ({int(y)})" if pd.notna(y) else t for t, y in zip(members['title'], years)))
+    os.makedirs(args.output, exist_ok=True)
+    groups[['dup_group', 'id', 'title', 'year', 'popularity']].to_csv(
+        os.path.join(args.output, 'dedup_groups.csv'), index=False)
+
+    if args.dry_run:
+        return
+    if args.mode == 'collapse':
+        tagged = collapse_groups(tagged)
+
+    tmp_path = config.MOVIES_CSV + '.tmp'
+    tagged.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, config.MOVIES_CSV)
+    print(f"\n{len(tagged)} films écrits dans {config.MOVIES_CSV}")
+    print("Catalogue modifié: reconstruisez l'index (python -m src.index_builder)")
+
+
+if __name__ == "__main__":
+    main()
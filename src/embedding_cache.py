@@ -0,0 +1,58 @@
+"""
+Cache des embeddings de requêtes
+Les requêtes populaires reviennent souvent à l'identique: leur vecteur est conservé
+pour ne pas repasser par l'encodeur. Pré-rempli au démarrage par src/warmup.py
+"""
+
+from collections import OrderedDict
+import threading
+
+
+class EmbeddingCache:
+    """Cache LRU texte encodé -> embedding (1, dimension) en lecture seule"""
+
+    def __init__(self, max_entries=10000):
+        """
+        Args:
+            max_entries: Nombre maximum d'embeddings conservés
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text):
+        """
+        Returns:
+            Embedding du texte ou None s'il n'est pas en cache
+        """
+        with self._lock:
+            embedding = self._entries.get(text)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(text)
+            self.hits += 1
+            return embedding
+
+    def put(self, text, embedding):
+        embedding.flags.writeable = False
+        with self._lock:
+            self._entries[text] = embedding
+            self._entries.move_to_end(text)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def cache_info(self):
+        """Statistiques du cache d'embeddings"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0
+        }
@@ -0,0 +1,30 @@
+"""
+Requêtes d'évaluation étiquetées
+Module de données sans dépendance: partagé par training.evaluate et par le
+générateur de charge (benchmarks.load_test) sans charger modèle ni index
+"""
+
+
+# Requêtes de test avec le titre attendu (correspondance partielle, insensible à la casse)
+TEST_QUERIES = [
+    ("romantic movie on a sinking cruise ship", "Titanic"),
+    ("toys that come to life and question existence", "Toy Story"),
+    ("sad space movie about isolation", "Solaris"),
+    ("AI falls in love with lonely writer", "Her"),
+    ("time loop comedy repeat same day", "Groundhog Day"),
+    ("underground fight club soap maker", "Fight Club"),
+    ("wizard school for children", "Harry Potter"),
+    ("dreams within dreams heist", "Inception"),
+    ("gladiator seeking revenge in rome", "Gladiator"),
+    ("robot cleans earth falls in love", "WALL-E"),
+    ("clownfish father searches for son", "Finding Nemo"),
+    ("animated movie about emotions inside girl's head", "Inside Out"),
+    ("mafia family succession drama", "The Godfather"),
+    ("superhero loses powers becomes human", "Spider-Man"),
+    ("video game characters escape arcade", "Wreck-It Ralph"),
+    ("monster scares children for energy", "Monsters"),
+    ("chef rat controls human cooking", "Ratatouille"),
+    ("princess with ice powers", "Frozen"),
+    ("talking car race", "Cars"),
+    ("family of superheroes", "The Incredibles")
+]
@@ -0,0 +1,338 @@
+"""
+Construction de l'index par flux: CSV -> textes -> embeddings -> index
+Quatre étapes reliées par des files bornées, chacune dans son thread:
+    lecture    pd.read_csv par morceaux de chunk_size films
+    textes     create_movie_text sur chaque morceau
+    encodage   model.encode par batches (le calcul torch libère le GIL)
+    index      ajout incrémental à l'index FAISS, embeddings écrits au fil de l'eau
+Les étapes se recouvrent (lecture et textes du morceau suivant pendant l'encodage) et la
+mémoire de pointe dépend de chunk_size et de la profondeur des files, pas du catalogue.
+Les index qui s'entraînent (IVF, PQ, int8, PCA, seuils binaires) le font sur les
+train_size premiers vecteurs, gardés en mémoire jusqu'à l'entraînement.
+
+Le résultat est publié comme nouvelle version de l'index (voir src/artifacts.py).
+
+Usage:
+    python -m src.index_builder --chunk-size 2000
+"""
+
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import config
+from movie_retriever import MovieRetriever, INDEX_TYPES, REDUCTIONS, STORAGE_MODES
+from artifacts import publish_index
+
+
+STAGES = ('read', 'text', 'encode', 'index')
+
+_DONE = object()
+
+
+class PipelineAborted(Exception):
+    """Une autre étape a échoué: l'étape courante s'arrête sans traiter la suite"""
+
+
+def npy_header(shape, dtype='float32', size=128):
+    """
+    En-tête .npy (format 1.0) de taille fixe, réécrit une fois le nombre de lignes connu
+
+    Returns:
+        Octets de l'en-tête (size octets, padding compris)
+    """
+    header = repr({'descr': np.dtype(dtype).str, 'fortran_order': False, 'shape': tuple(shape)})
+    prefix = b'\x93NUMPY\x01\x00'
+    body_size = size - len(prefix) - 2
+    body = header.encode('latin1').ljust(body_size - 1) + b'\n'
+    if len(body) != body_size:
+        raise ValueError(f"En-tête .npy trop long pour {size} octets: {shape}")
+    return prefix + body_size.to_bytes(2, 'little') + body
+
+
+class StageStats:
+    """Temps actif, temps d'attente et films traités d'une étape"""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.busy = 0.0
+        self.waiting = 0.0
+
+    def summary(self, wall):
+        return {
+            'stage': self.name,
+            'rows': self.rows,
+            'busy_s': round(self.busy, 3),
+            'waiting_s': round(self.waiting, 3),
+            'rows_per_s': round(self.rows / self.busy, 1) if self.busy > 0 else None,
+            'utilization': round(self.busy / wall, 3) if wall > 0 else None
+        }
+
+
+class StreamingIndexBuilder:
+    """Pipeline de construction de l'index à mémoire bornée"""
+
+    def __init__(self, retriever, chunk_size=2000, batch_size=64, queue_depth=2, train_size=20000,
+                 progress_seconds=5.0):
+        """
+        Args:
+            retriever: MovieRetriever fournissant l'encodeur et create_movie_text
+            chunk_size: Films par morceau (fixe la mémoire de pointe)
+            batch_size: Taille des batches d'encodage
+            queue_depth: Morceaux en attente au plus entre deux étapes
+            train_size: Vecteurs d'entraînement des index qui en ont besoin
+            progress_seconds: Intervalle des lignes de progression
+        """
+        self.retriever = retriever
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.queue_depth = queue_depth
+        self.train_size = train_size
+        self.progress_seconds = progress_seconds
+        self.stats = {name: StageStats(name) for name in STAGES}
+        self._abort = threading.Event()
+        self._errors = []
+
+    def _get(self, q, stats):
+        start = time.perf_counter()
+        while True:
+            try:
+                item = q.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if self._abort.is_set():
+                    raise PipelineAborted()
+        stats.waiting += time.perf_counter() - start
+        return item
+
+    def _put(self, q, item, stats):
+        start = time.perf_counter()
+        while True:
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                if self._abort.is_set():
+                    raise PipelineAborted()
+        stats.waiting += time.perf_counter() - start
+
+    def _stage(self, name, source, target, work):
+        """
+        Boucle d'une étape: source -> work -> target, _DONE propagé en fin de flux
+        source est une file (étape intermédiaire) ou un itérable (lecture: produire
+        l'élément suivant est le travail de l'étape, compté comme temps actif)
+        """
+        stats = self.stats[name]
+        from_queue = isinstance(source, queue.Queue)
+        iterator = None if from_queue else iter(source)
+        try:
+            while True:
+                if from_queue:
+                    item = self._get(source, stats)
+                    start = time.perf_counter()
+                else:
+                    start = time.perf_counter()
+                    item = next(iterator, _DONE)
+                if item is _DONE:
+                    break
+                result = work(item)
+                stats.busy += time.perf_counter() - start
+                stats.rows += len(result)
+                self._put(target, result, stats)
+            self._put(target, _DONE, stats)
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            self._errors.append((name, e))
+            self._abort.set()
+
+    def _read_stage(self, csv_path, target):
+        self._stage('read', pd.read_csv(csv_path, chunksize=self.chunk_size), target, lambda chunk: chunk)
+
+    def _text_stage(self, source, target):
+        create = self.retriever.create_movie_text
+        self._stage('text', source, target, lambda chunk: chunk.apply(create, axis=1).tolist())
+
+    def _encode_stage(self, source, target):
+        model = self.retriever.model
+        self._stage('encode', source, target, lambda texts: np.ascontiguousarray(
+            model.encode(texts, batch_size=self.batch_size, show_progress_bar=False), dtype='float32'))
+
+    def estimate_rows(self, csv_path):
+        """Nombre de films estimé d'après la taille du fichier et un premier morceau (pour l'ETA)"""
+        sample = pd.read_csv(csv_path, nrows=min(self.chunk_size, 1000))
+        if len(sample) == 0:
+            return 0
+        sample_bytes = len(sample.to_csv(index=False).encode('utf-8'))
+        return int(os.path.getsize(csv_path) * len(sample) / max(sample_bytes, 1))
+
+    def build(self, csv_path, index_path, embeddings_path, index_type='flat', dim=None, reduction='pca',
+              storage='float'):
+        """
+        Construit et sauvegarde l'index et les embeddings d'un catalogue CSV
+
+        Args:
+            csv_path: Catalogue (movies.csv)
+            index_path: Fichier de l'index FAISS
+            embeddings_path: Fichier .npy des embeddings float (rescoring, shards, évaluation)
+            index_type, dim, reduction, storage: voir MovieRetriever.build_index
+
+        Returns:
+            Rapport: films indexés, durée, débit et résumé par étape
+        """
+        start = time.perf_counter()
+        expected = self.estimate_rows(csv_path)
+        needs_training = (index_type in ('ivf', 'ivfpq') or storage != 'float' or bool(dim))
+
+        texts_in, texts_out, encoded = (queue.Queue(maxsize=self.queue_depth) for _ in range(3))
+        threads = [
+            threading.Thread(target=self._read_stage, args=(csv_path, texts_in), name='build-read', daemon=True),
+            threading.Thread(target=self._text_stage, args=(texts_in, texts_out), name='build-text', daemon=True),
+            threading.Thread(target=self._encode_stage, args=(texts_out, encoded), name='build-encode',
+                             daemon=True)
+        ]
+        for thread in threads:
+            thread.start()
+
+        os.makedirs(os.path.dirname(embeddings_path), exist_ok=True)
+        tmp_embeddings = embeddings_path + '.tmp'
+        stats = self.stats['index']
+        pending = []
+        written = 0
+        dimension = None
+        last_report = time.perf_counter()
+
+        def add(embeddings):
+            self.retriever.add_to_index(embeddings)
+            f.write(embeddings.tobytes())
+
+        try:
+            with open(tmp_embeddings, 'wb') as f:
+                f.write(b'\0' * 128)
+                while True:
+                    embeddings = self._get(encoded, stats)
+                    if embeddings is _DONE:
+                        break
+                    step = time.perf_counter()
+                    dimension = embeddings.shape[1]
+
+                    if self.retriever.index is None:
+                        pending.append(embeddings)
+                        buffered = sum(len(e) for e in pending)
+                        if not needs_training or buffered >= self.train_size:
+                            sample = np.concatenate(pending)
+                            self.retriever.init_index(sample[:self.train_size], index_type=index_type, dim=dim,
+                                                      reduction=reduction, storage=storage,
+                                                      n_vectors=max(expected, len(sample)))
+                            add(sample)
+                            pending = []
+                    else:
+                        add(embeddings)
+
+                    written += len(embeddings)
+                    stats.rows += len(embeddings)
+                    stats.busy += time.perf_counter() - step
+
+                    if time.perf_counter() - last_report >= self.progress_seconds:
+                        last_report = time.perf_counter()
+                        self.print_progress(written, expected, last_report - start)
+
+                if pending:
+                    # Catalogue plus petit que train_size: entraînement sur tout ce qui a été lu
+                    step = time.perf_counter()
+                    sample = np.concatenate(pending)
+                    self.retriever.init_index(sample, index_type=index_type, dim=dim, reduction=reduction,
+                                              storage=storage, n_vectors=len(sample))
+                    add(sample)
+                    stats.busy += time.perf_counter() - step
+
+                if written == 0 and not self._errors:
+                    raise ValueError(f"Catalogue vide: {csv_path}")
+                if not self._errors:
+                    f.seek(0)
+                    f.write(npy_header((written, dimension)))
+        except BaseException as e:
+            self._errors.append(('index', e))
+            self._abort.set()
+        finally:
+            for thread in threads:
+                thread.join()
+
+        if self._errors:
+            if os.path.exists(tmp_embeddings):
+                os.remove(tmp_embeddings)
+            stage, error = self._errors[0]
+            raise RuntimeError(f"Échec de l'étape {stage}: {error!r}") from error
+
+        self.retriever.save_index(index_path)
+        os.replace(tmp_embeddings, embeddings_path)
+
+        wall = time.perf_counter() - start
+        report = {
+            'movies': written,
+            'dimension': int(dimension),
+            'wall_s': round(wall, 2),
+            'movies_per_s': round(written / wall, 1) if wall > 0 else None,
+            'stages': [self.stats[name].summary(wall) for name in STAGES]
+        }
+        self.print_summary(report)
+        return report
+
+    def print_progress(self, done, expected, elapsed):
+        rate = done / elapsed if elapsed > 0 else 0.0
+        if expected > done and rate > 0:
+            eta = (expected - done) / rate
+            print(f"  {done}/~{expected} films ({done / expected:.0%}), {rate:.0f} films/s, ETA {eta:.0f}s")
+        else:
+            print(f"  {done} films, {rate:.0f} films/s")
+
+    def print_summary(self, report):
+        print(f"\n{report['movies']} films indexés en {report['wall_s']}s ({report['movies_per_s']} films/s)")
+        print(f"\n{'étape':<8} {'films/s':>10} {'actif s':>9} {'attente s':>10} {'occupation':>11}")
+        for s in report['stages']:
+            rate = f"{s['rows_per_s']:.0f}" if s['rows_per_s'] else '-'
+            print(f"{s['stage']:<8} {rate:>10} {s['busy_s']:>9.2f} {s['waiting_s']:>10.2f} "
+                  f"{s['utilization'] or 0:>10.0%}")
+        bottleneck = max(report['stages'], key=lambda s: s['busy_s'])
+        print(f"Étape limitante: {bottleneck['stage']}")
+
+
+def main(argv=None):
+    """Construit l'index du catalogue par flux avec le modèle fine-tuné et le publie dans une nouvelle version"""
+    parser = argparse.ArgumentParser(description="Construction de l'index FAISS par flux")
+    parser.add_argument('--chunk-size', type=int, default=config.BUILD_CHUNK_SIZE,
+                        help="Films par morceau (fixe la mémoire de pointe)")
+    parser.add_argument('--batch-size', type=int, default=64, help="Taille des batches d'encodage")
+    parser.add_argument('--queue-depth', type=int, default=config.BUILD_QUEUE_DEPTH,
+                        help="Morceaux en attente entre deux étapes")
+    parser.add_argument('--train-size', type=int, default=config.BUILD_TRAIN_SIZE,
+                        help="Vecteurs d'entraînement (IVF, PQ, int8, PCA, binaire)")
+    parser.add_argument('--index-type', choices=INDEX_TYPES, default=config.INDEX_TYPE)
+    parser.add_argument('--dim', type=int, default=config.INDEX_DIM)
+    parser.add_argument('--reduction', choices=REDUCTIONS, default=config.INDEX_REDUCTION)
+    parser.add_argument('--storage', choices=STORAGE_MODES, default=config.INDEX_STORAGE)
+    parser.add_argument('--dir', default=config.ARTIFACTS_DIR, help="Dossier des versions de l'index")
+    args = parser.parse_args(argv)
+
+    print("\n" + "="*70)
+    print("CONSTRUCTION DE L'INDEX PAR FLUX")
+    print("="*70 + "\n")
+
+    retriever = MovieRetriever(use_trained=True)
+    builder = StreamingIndexBuilder(retriever, chunk_size=args.chunk_size, batch_size=args.batch_size,
+                                    queue_depth=args.queue_depth, train_size=args.train_size)
+    manifest = publish_index(builder, config.MOVIES_CSV, args.dir, index_type=args.index_type, dim=args.dim,
+                             reduction=args.reduction, storage=args.storage)
+    print(f"\nVersion v{manifest['version']:04d} publiée dans {args.dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Journalisation structurée (JSON lines) pour l'API CineSphere
+Les écritures passent par une file et un thread dédié: le chemin des requêtes
+ne fait jamais d'I/O synchrone sur stderr
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+
+
+REQUEST_LOGGER = 'cinesphere.request'
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formate chaque enregistrement en un objet JSON sur une ligne"""
+
+    def format(self, record):
+        payload = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        payload.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Ne conserve qu'une fraction des logs INFO/DEBUG; WARNING et plus passent toujours"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        return self.rate >= 1.0 or random.random() < self.rate
+
+
+def configure_logging(level='INFO', sample_rate=1.0):
+    """
+    Configure les loggers 'cinesphere' (startup) et 'cinesphere.request' (échantillonné)
+
+    Args:
+        level: Niveau minimum (nom ou entier)
+        sample_rate: Fraction des logs de requêtes INFO/DEBUG conservés
+    """
+    global _listener
+
+    root = logging.getLogger('cinesphere')
+    if _listener is not None:
+        return root
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.propagate = False
+
+    logging.getLogger(REQUEST_LOGGER).addFilter(SamplingFilter(sample_rate))
+
+    return root
+
+
+def get_logger(name=None):
+    """Retourne un logger de la hiérarchie 'cinesphere'"""
+    return logging.getLogger(f"cinesphere.{name}" if name else 'cinesphere')
+
+
+def log_event(logger, level, msg, **fields):
+    """Émet un log structuré avec des champs additionnels"""
+    if logger.isEnabledFor(level):
+        logger.log(level, msg, extra={'fields': fields})
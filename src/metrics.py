@@ -0,0 +1,103 @@
+"""
+Métriques Prometheus de l'API CineSphere
+Histogrammes de latence par étape, ratios de cache et taille de l'index
+"""
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5
+)
+
+SEARCH_STAGE_SECONDS = Histogram(
+    'cinesphere_search_stage_seconds',
+    "Durée de chaque étape d'une recherche",
+    ['stage'],
+    buckets=LATENCY_BUCKETS
+)
+
+REQUEST_SECONDS = Histogram(
+    'cinesphere_request_seconds',
+    'Durée totale de traitement des requêtes HTTP',
+    ['endpoint'],
+    buckets=LATENCY_BUCKETS
+)
+
+REQUESTS_TOTAL = Counter(
+    'cinesphere_requests_total',
+    'Nombre de requêtes HTTP par endpoint et code de statut',
+    ['endpoint', 'status']
+)
+
+RESULTS_RETURNED = Histogram(
+    'cinesphere_results_returned',
+    'Nombre de résultats renvoyés par recherche',
+    buckets=(0, 1, 3, 5, 10, 20, 50, 100, 200)
+)
+
+CACHE_HIT_RATIO = Gauge(
+    'cinesphere_cache_hit_ratio',
+    'Ratio de succès des caches',
+    ['cache']
+)
+
+CACHE_ENTRIES = Gauge(
+    'cinesphere_cache_entries',
+    "Nombre d'entrées des caches",
+    ['cache']
+)
+
+INDEX_VECTORS = Gauge(
+    'cinesphere_index_vectors',
+    "Nombre de vecteurs dans l'index FAISS"
+)
+
+WARMUP_SECONDS = Gauge(
+    'cinesphere_warmup_seconds',
+    'Durée du préchauffage au démarrage (0 tant qu\'il n\'est pas terminé)'
+)
+
+SHARD_ERRORS = Gauge(
+    'cinesphere_shard_errors',
+    'Recherches pour lesquelles un shard a échoué ou dépassé son délai',
+    ['shard']
+)
+
+MOVIES_LOADED = Gauge(
+    'cinesphere_movies_loaded',
+    'Nombre de films dans le catalogue chargé'
+)
+
+
+def observe_stages(timings):
+    """Enregistre un dictionnaire {étape: secondes} dans l'histogramme des étapes"""
+    for stage, seconds in timings.items():
+        SEARCH_STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+
+def register_cache(name, cache):
+    """
+    Expose un cache possédant une méthode cache_info() (hit_ratio, size)
+
+    Args:
+        name: Libellé du cache dans les métriques
+        cache: Objet exposant cache_info()
+    """
+    CACHE_HIT_RATIO.labels(cache=name).set_function(lambda: cache.cache_info()['hit_ratio'])
+    CACHE_ENTRIES.labels(cache=name).set_function(lambda: cache.cache_info()['size'])
+
+
+def register_retriever(retriever):
+    """Expose la taille de l'index et du catalogue d'un MovieRetriever"""
+    INDEX_VECTORS.set_function(lambda: retriever.index.ntotal if retriever.index is not None else 0)
+    MOVIES_LOADED.set_function(lambda: len(retriever.movies_df) if retriever.movies_df is not None else 0)
+    if retriever.reranker is not None:
+        register_cache('rerank', retriever.reranker)
+    for name in getattr(retriever.index, 'errors', {}):
+        SHARD_ERRORS.labels(shard=name).set_function(lambda name=name: retriever.index.errors[name])
+
+
+def render():
+    """Retourne (corps, content-type) du format d'exposition Prometheus"""
+    return generate_latest(), CONTENT_TYPE_LATEST
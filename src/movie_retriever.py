@@ -7,24 +7,214 @@ import pandas as pd
 import numpy as np
 import faiss
 from sentence_transformers import SentenceTransformer
+import json
 import os
 import sys
+import time
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 import config
 
 
+RESULT_FIELDS = (
+    'id', 'title', 'year', 'genres', 'plot', 'keywords', 'rating', 'popularity',
+    'similarity_score', 'final_score', 'rerank_score', 'poster_path', 'dup_group'
+)
+
+
+def _text_column(series):
+    """Colonne texte en liste Python: str ou None (NaN résolu une fois au chargement)"""
+    return [str(v) if pd.notna(v) and str(v) != '' else None for v in series]
+
+
+def _float_column(series):
+    """Colonne numérique en liste Python: float ou None"""
+    values = pd.to_numeric(series, errors='coerce').astype('float64')
+    return [float(v) if np.isfinite(v) else None for v in values]
+
+
+def _id_column(series):
+    """Identifiants TMDB en int Python ou None"""
+    values = pd.to_numeric(series, errors='coerce')
+    return [int(v) if pd.notna(v) else None for v in values]
+
+
+def _year_column(series):
+    """Années lues en float par pandas (1997.0) normalisées en '1997' ou None"""
+    values = pd.to_numeric(series, errors='coerce')
+    return [str(int(v)) if pd.notna(v) else None for v in values]
+
+
+INDEX_TYPES = ('flat', 'hnsw', 'ivf', 'ivfpq')
+
+
+def quantization_path(index_path):
+    """Fichier des paramètres de quantification sauvegardé à côté de l'index"""
+    return f"{os.path.splitext(index_path)[0]}_quantization.json"
+
+
+def create_index(dimension, index_type='flat', n_vectors=None):
+    """
+    Crée un index FAISS vide du type demandé
+    
+    Args:
+        dimension: Dimension des embeddings
+        index_type: 'flat' (exact), 'hnsw' (graphe), 'ivf' (listes inversées)
+            ou 'ivfpq' (listes inversées + product quantization)
+        n_vectors: Taille prévue du catalogue (dimensionne les listes IVF)
+    
+    Returns:
+        Index FAISS (à entraîner avec train_index si is_trained est False)
+    """
+    if index_type == 'flat':
+        return faiss.IndexFlatL2(dimension)
+    
+    if index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimension, 32)
+        index.hnsw.efConstruction = 80
+        index.hnsw.efSearch = 64
+        return index
+    
+    if index_type in ('ivf', 'ivfpq'):
+        n_vectors = n_vectors or 10000
+        nlist = int(max(1, min(4 * np.sqrt(n_vectors), n_vectors / 39)))
+        quantizer = faiss.IndexFlatL2(dimension)
+        if index_type == 'ivf':
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        else:
+            m = next(m for m in (48, 32, 24, 16, 12, 8, 4, 2, 1) if dimension % m == 0)
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, m, 8)
+        index.nprobe = min(16, nlist)
+        return index
+    
+    raise ValueError(f"Type d'index inconnu: {index_type} (attendu: {', '.join(INDEX_TYPES)})")
+
+
+def train_index(index, embeddings, max_train=100000, seed=42):
+    """Entraîne un index qui le nécessite (IVF, PQ) sur un échantillon des embeddings"""
+    if index.is_trained:
+        return
+    
+    if len(embeddings) > max_train:
+        rng = np.random.default_rng(seed)
+        sample = embeddings[np.sort(rng.choice(len(embeddings), max_train, replace=False))]
+    else:
+        sample = embeddings
+    if isinstance(index, faiss.IndexBinary):
+        index.train(np.ascontiguousarray(sample, dtype='uint8'))
+    else:
+        index.train(np.ascontiguousarray(sample, dtype='float32'))
+
+
+
+REDUCTIONS = ('pca', 'truncate')
+
+
+def create_reduction(dimension, dim, reduction='pca'):
+    """
+    Transformation qui réduit les embeddings avant l'index
+    
+    Args:
+        dimension: Dimension des embeddings du modèle
+        dim: Dimension cible
+        reduction: 'pca' (projection apprise sur le catalogue) ou 'truncate'
+            (garde les dim premières composantes, pour un modèle entraîné en Matryoshka)
+    
+    Returns:
+        VectorTransform FAISS (à placer devant l'index avec IndexPreTransform)
+    """
+    if reduction == 'pca':
+        return faiss.PCAMatrix(dimension, dim)
+    if reduction == 'truncate':
+        return faiss.RemapDimensionsTransform(dimension, dim, False)
+    raise ValueError(f"Réduction inconnue: {reduction} (attendu: {', '.join(REDUCTIONS)})")
+
+
+STORAGE_MODES = ('float', 'int8', 'binary')
+
+
+def create_quantized_index(dimension, index_type='flat', storage='int8', n_vectors=None):
+    """
+    Crée un index FAISS compressé
+    
+    Args:
+        dimension: Dimension des embeddings
+        index_type: 'flat', 'hnsw' ou 'ivf' (ivfpq est déjà compressé)
+        storage: 'int8' (quantification scalaire, 4x plus petit) ou 'binary'
+            (un bit par composante, 32x plus petit, distance de Hamming)
+        n_vectors: Taille prévue du catalogue (dimensionne les listes IVF)
+    
+    Returns:
+        Index FAISS (IndexBinary pour 'binary'), à entraîner avec train_index
+    """
+    if index_type not in ('flat', 'hnsw', 'ivf') or storage not in ('int8', 'binary'):
+        raise ValueError(f"Stockage {storage} indisponible pour un index {index_type}")
+    
+    n_vectors = n_vectors or 10000
+    nlist = int(max(1, min(4 * np.sqrt(n_vectors), n_vectors / 39)))
+    
+    if storage == 'int8':
+        qtype = faiss.ScalarQuantizer.QT_8bit
+        if index_type == 'flat':
+            return faiss.IndexScalarQuantizer(dimension, qtype, faiss.METRIC_L2)
+        if index_type == 'hnsw':
+            index = faiss.IndexHNSWSQ(dimension, qtype, 32)
+            index.hnsw.efConstruction = 80
+            index.hnsw.efSearch = 64
+            return index
+        index = faiss.IndexIVFScalarQuantizer(faiss.IndexFlatL2(dimension), dimension, nlist, qtype)
+        index.nprobe = min(16, nlist)
+        return index
+    
+    if dimension % 8:
+        raise ValueError(f"Stockage binaire: dimension multiple de 8 attendue ({dimension})")
+    if index_type == 'flat':
+        return faiss.IndexBinaryFlat(dimension)
+    if index_type == 'hnsw':
+        index = faiss.IndexBinaryHNSW(dimension, 32)
+        index.hnsw.efConstruction = 80
+        index.hnsw.efSearch = 64
+        return index
+    index = faiss.IndexBinaryIVF(faiss.IndexBinaryFlat(dimension), dimension, nlist)
+    index.nprobe = min(16, nlist)
+    return index
+
+
+def binarize(embeddings, thresholds):
+    """Un bit par composante (au-dessus du seuil), empaqueté en octets pour IndexBinary"""
+    return np.packbits(np.asarray(embeddings, dtype='float32') > thresholds, axis=1)
+
 class MovieRetriever:
     """Système de recherche sémantique de films avec reranking hybride"""
     
-    def __init__(self, model_path=None, use_trained=True):
+    def __init__(self, model_path=None, use_trained=True, model=None):
         """
         Initialise le retriever avec un modèle pré-entraîné ou fine-tuné
         
         Args:
             model_path: Chemin personnalisé vers le modèle
             use_trained: Si True, utilise le modèle fine-tuné
+            model: Encodeur déjà construit (objet exposant encode()), prioritaire sur model_path
         """
+        self.movies_df = None
+        self.result_columns = None
+        self.index = None
+        self.embeddings = None
+        self.reranker = None
+        self.rerank_top_n = 0
+        self.rerank_budget_ms = None
+        self.quantization = {'storage': 'float'}
+        self.rescore_factor = config.RESCORE_FACTOR
+        self.query_parser = None
+        self.embedding_cache = None
+        self.filter_overfetch = config.QUERY_FILTER_OVERFETCH
+        self.diversify_groups = config.DEDUP_DIVERSIFY
+        self.model_path = None
+        
+        if model is not None:
+            self.model = model
+            return
+        
         if model_path is None and use_trained:
             model_path = config.FINE_TUNED_MODEL_PATH
         
@@ -40,10 +230,8 @@ class MovieRetriever:
         else:
             print(f"Chargement du modèle de base: {model_path}")
         
+        self.model_path = model_path
         self.model = SentenceTransformer(model_path)
-        self.movies_df = None
-        self.index = None
-        self.embeddings = None
         
     def load_movies(self, csv_path):
         """
@@ -53,10 +241,35 @@ class MovieRetriever:
             csv_path: Chemin vers movies.csv
         """
         print(f"Chargement des films depuis {csv_path}")
-        self.movies_df = pd.read_csv(csv_path)
+        self.set_movies(pd.read_csv(csv_path))
         print(f"{len(self.movies_df)} films chargés")
         return self.movies_df
     
+    def set_movies(self, movies_df):
+        """
+        Installe le catalogue et prépare les colonnes typées des résultats
+        Les NaN et types numpy sont résolus ici, une fois, pour que search()
+        renvoie directement des dictionnaires sérialisables en JSON
+        
+        Args:
+            movies_df: DataFrame des films
+        """
+        self.movies_df = movies_df
+        
+        poster = movies_df['poster_path'] if 'poster_path' in movies_df else pd.Series([None] * len(movies_df))
+        self.result_columns = {
+            'id': _id_column(movies_df['id']) if 'id' in movies_df else [None] * len(movies_df),
+            'title': _text_column(movies_df['title']),
+            'year': _year_column(movies_df['year']),
+            'genres': _text_column(movies_df['genres']),
+            'plot': _text_column(movies_df['plot']),
+            'keywords': _text_column(movies_df['keywords']),
+            'rating': _float_column(movies_df['rating']),
+            'popularity': _float_column(movies_df['popularity']),
+            'poster_path': _text_column(poster),
+            'dup_group': _id_column(movies_df['dup_group']) if 'dup_group' in movies_df else [None] * len(movies_df)
+        }
+    
     def create_movie_text(self, row):
         """
         Crée une représentation textuelle enrichie d'un film
@@ -86,7 +299,9 @@ class MovieRetriever:
             text_parts.append(plot)
         
         if pd.notna(row.get('year')) and pd.notna(row.get('rating')):
-            text_parts.append(f"{row['year']} film rated {row['rating']}")
+            # Année entière et note flottante quel que soit le type inféré par pandas (une colonne
+            # avec des valeurs manquantes, ou un morceau de lecture par flux, donnerait '1997.0' ou '7')
+            text_parts.append(f"{int(float(row['year']))} film rated {float(row['rating'])}")
         
         return " ".join(text_parts)
     
@@ -105,70 +320,374 @@ class MovieRetriever:
         print(f"Embeddings générés: {embeddings.shape}")
         return embeddings
     
-    def build_index(self, embeddings):
+    def build_index(self, embeddings, index_type='flat', dim=None, reduction='pca', storage='float'):
         """
         Construit l'index FAISS pour la recherche rapide
         
         Args:
             embeddings: Matrice des embeddings
+            index_type: Type d'index (voir create_index)
+            dim: Dimension des vecteurs indexés (None: dimension du modèle)
+            reduction: Réduction appliquée si dim est fixé (voir create_reduction)
+            storage: 'float', 'int8' ou 'binary' (voir create_quantized_index); les
+                candidats d'un index compressé sont rescorés avec les embeddings float
         """
-        print("Construction de l'index FAISS...")
-        dimension = embeddings.shape[1]
-        
-        self.index = faiss.IndexFlatL2(dimension)
-        self.index.add(embeddings.astype('float32'))
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+        self.init_index(embeddings, index_type=index_type, dim=dim, reduction=reduction, storage=storage,
+                        n_vectors=len(embeddings))
+        self.add_to_index(embeddings)
         
         print(f"Index construit avec {self.index.ntotal} vecteurs")
+    
+    def init_index(self, sample, index_type='flat', dim=None, reduction='pca', storage='float', n_vectors=None):
+        """
+        Crée l'index vide et l'entraîne (IVF, PQ, int8, réduction, seuils binaires)
+        Les vecteurs sont ajoutés ensuite par add_to_index, éventuellement par morceaux
         
-    def save_index(self, index_path, embeddings_path):
-        """Sauvegarde l'index FAISS et les embeddings"""
+        Args:
+            sample: Embeddings d'entraînement (le catalogue, ou un échantillon en construction par flux)
+            index_type, dim, reduction, storage: voir build_index
+            n_vectors: Taille prévue du catalogue (défaut: taille de l'échantillon)
+        """
+        dimension = sample.shape[1]
+        sample = np.ascontiguousarray(sample, dtype='float32')
+        n_vectors = n_vectors or len(sample)
+        reduced = bool(dim and dim < dimension)
+        label = f"{index_type}, {storage}" + (f", {reduction} {dimension} -> {dim}" if reduced else "")
+        print(f"Construction de l'index FAISS ({label})...")
+        
+        if storage == 'binary':
+            if reduced:
+                raise ValueError("Stockage binaire: réduction de dimension non prise en charge")
+            # Seuil par composante (médiane du catalogue): bits équilibrés, plus discriminants
+            # que le signe brut; sauvegardé avec l'index pour binariser les requêtes
+            thresholds = np.median(sample, axis=0).astype('float32')
+            self.quantization = {'storage': 'binary', 'thresholds': thresholds}
+            sample = binarize(sample, thresholds)
+            self.index = create_quantized_index(dimension, index_type, storage, n_vectors=n_vectors)
+        else:
+            index_dim = dim if reduced else dimension
+            if storage == 'float':
+                index = create_index(index_dim, index_type, n_vectors=n_vectors)
+            else:
+                index = create_quantized_index(index_dim, index_type, storage, n_vectors=n_vectors)
+            self.quantization = {'storage': storage}
+            
+            if reduced:
+                # La réduction fait partie de l'index: les requêtes restent encodées
+                # en pleine dimension et sont projetées par FAISS, l'index sauvegardé l'inclut
+                index = faiss.IndexPreTransform(create_reduction(dimension, dim, reduction), index)
+            self.index = index
+        
+        train_index(self.index, sample)
+    
+    def add_to_index(self, embeddings):
+        """Ajoute des embeddings float à l'index initialisé par init_index"""
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+        if self.quantization['storage'] == 'binary':
+            embeddings = binarize(embeddings, self.quantization['thresholds'])
+        self.index.add(embeddings)
+        
+    def save_index(self, index_path, embeddings_path=None):
+        """
+        Sauvegarde l'index FAISS, ses paramètres de quantification et les embeddings
+        (embeddings_path None: embeddings déjà écrits, par exemple par la construction en flux)
+        """
         os.makedirs(os.path.dirname(index_path), exist_ok=True)
-        os.makedirs(os.path.dirname(embeddings_path), exist_ok=True)
         
         print(f"Sauvegarde de l'index FAISS: {index_path}")
-        faiss.write_index(self.index, index_path)
+        if isinstance(self.index, faiss.IndexBinary):
+            faiss.write_index_binary(self.index, index_path)
+        else:
+            faiss.write_index(self.index, index_path)
+        
+        # Les bornes int8 sont stockées dans l'index par FAISS; les seuils binaires ici
+        quantization = {
+            key: value.tolist() if isinstance(value, np.ndarray) else value
+            for key, value in self.quantization.items()
+        }
+        with open(quantization_path(index_path), 'w') as f:
+            json.dump(quantization, f)
         
-        print(f"Sauvegarde des embeddings: {embeddings_path}")
-        np.save(embeddings_path, self.embeddings)
+        if embeddings_path is not None:
+            print(f"Sauvegarde des embeddings: {embeddings_path}")
+            os.makedirs(os.path.dirname(embeddings_path), exist_ok=True)
+            np.save(embeddings_path, self.embeddings)
         
     def load_index(self, index_path, embeddings_path):
-        """Charge l'index FAISS et les embeddings depuis le disque"""
-        print(f"Chargement de l'index FAISS: {index_path}")
-        self.index = faiss.read_index(index_path)
+        """
+        Charge l'index FAISS et les embeddings depuis le disque
+        Avec un index compressé, les embeddings float (utilisés seulement pour rescorer
+        quelques candidats) sont mappés en mémoire plutôt que chargés
+        """
+        self.quantization = {'storage': 'float'}
+        if os.path.exists(quantization_path(index_path)):
+            with open(quantization_path(index_path)) as f:
+                self.quantization = json.load(f)
+            if 'thresholds' in self.quantization:
+                self.quantization['thresholds'] = np.asarray(self.quantization['thresholds'], dtype='float32')
+        storage = self.quantization['storage']
+        
+        print(f"Chargement de l'index FAISS ({storage}): {index_path}")
+        if storage == 'binary':
+            self.index = faiss.read_index_binary(index_path)
+        else:
+            self.index = faiss.read_index(index_path)
         
         print(f"Chargement des embeddings: {embeddings_path}")
-        self.embeddings = np.load(embeddings_path)
+        self.embeddings = np.load(embeddings_path, mmap_mode='r' if storage != 'float' else None)
+        self.check_index()
     
-    def search(self, query, top_k=5, boost_rating=True, min_score=0.45, adaptive=True):
+    def check_index(self):
         """
-        Recherche sémantique avec reranking hybride
+        Vérifie que l'index, les embeddings et le catalogue décrivent les mêmes films
+        (un index construit sur un autre catalogue renverrait d'autres films via iloc)
+        
+        Raises:
+            ValueError: Nombres de lignes différents
+        """
+        counts = {'index': self.index.ntotal}
+        if self.embeddings is not None:
+            counts['embeddings'] = len(self.embeddings)
+        if self.movies_df is not None:
+            counts['catalogue'] = len(self.movies_df)
+        if len(set(counts.values())) > 1:
+            detail = ", ".join(f"{name}: {n}" for name, n in counts.items())
+            raise ValueError(f"Index et catalogue incohérents ({detail}): reconstruisez l'index")
+    
+    def search_vectors(self, query_embeddings, k):
+        """
+        Plus proches voisins d'un lot de requêtes encodées
+        Index compressé: rescore_factor x k candidats sont rescorés exactement (L2 au carré)
+        avec les embeddings float, comme le renverrait un IndexFlatL2
+        
+        Args:
+            query_embeddings: Matrice (n, dimension) float32
+            k: Nombre de voisins
+        
+        Returns:
+            Tuple (distances, indices) de forme (n, k), indice -1 si absent
+        """
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype='float32')
+        storage = self.quantization['storage']
+        if storage == 'float':
+            return self.index.search(query_embeddings, k)
+        
+        n_candidates = min(k * self.rescore_factor, self.index.ntotal)
+        if storage == 'binary':
+            queries = binarize(query_embeddings, self.quantization['thresholds'])
+            _, candidates = self.index.search(queries, n_candidates)
+        else:
+            _, candidates = self.index.search(query_embeddings, n_candidates)
+        
+        # Rescoring exact: seules les lignes candidates sont lues (embeddings mappés en mémoire)
+        vectors = np.asarray(self.embeddings[np.maximum(candidates, 0).ravel()], dtype='float32')
+        vectors = vectors.reshape(candidates.shape + (-1,))
+        distances = ((vectors - query_embeddings[:, None, :]) ** 2).sum(axis=2)
+        distances[candidates < 0] = np.inf
+        
+        order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        distances = np.take_along_axis(distances, order, axis=1).astype('float32')
+        indices = np.where(np.isfinite(distances), np.take_along_axis(candidates, order, axis=1), -1)
+        
+        if indices.shape[1] < k:
+            pad = k - indices.shape[1]
+            distances = np.pad(distances, ((0, 0), (0, pad)), constant_values=np.inf)
+            indices = np.pad(indices, ((0, 0), (0, pad)), constant_values=-1)
+        return distances, indices
+    
+    def project(self, embeddings):
+        """
+        Embeddings dans l'espace des distances de search_vectors (réduits si l'index
+        inclut une réduction et n'est pas rescoré en pleine dimension)
+        """
+        if hasattr(self.index, 'project'):
+            return self.index.project(embeddings)
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+        if self.quantization['storage'] == 'float' and isinstance(self.index, faiss.IndexPreTransform):
+            for i in range(self.index.chain.size()):
+                embeddings = faiss.downcast_VectorTransform(self.index.chain.at(i)).apply(embeddings)
+        return embeddings
+    
+    def set_reranker(self, reranker, top_n=20, budget_ms=None):
+        """
+        Active le second étage de reranking par cross-encoder
+        
+        Args:
+            reranker: Instance de CrossEncoderReranker (None pour désactiver)
+            top_n: Nombre de candidats FAISS rescorés par requête
+            budget_ms: Budget de latence par requête, au-delà on garde l'ordre dense
+        """
+        self.reranker = reranker
+        self.rerank_top_n = top_n if reranker is not None else 0
+        self.rerank_budget_ms = budget_ms
+    
+    def set_query_parser(self, parser):
+        """
+        Active l'analyse des requêtes avant encodage (contraintes de genre, année, note)
+        
+        Args:
+            parser: Instance de QueryParser (None pour désactiver)
+        """
+        self.query_parser = parser
+    
+    def set_embedding_cache(self, cache):
+        """
+        Active le cache des embeddings de requêtes
+        
+        Args:
+            cache: Instance d'EmbeddingCache (None pour désactiver)
+        """
+        self.embedding_cache = cache
+    
+    def encode_query(self, text, flags=None):
+        """
+        Encode une requête (via le cache d'embeddings s'il est actif)
+        
+        Args:
+            text: Texte à encoder
+            flags: Dictionnaire optionnel, 'embedding_cached' indique un succès du cache
+        
+        Returns:
+            Matrice (1, dimension)
+        """
+        embedding = self.embedding_cache.get(text) if self.embedding_cache is not None else None
+        if flags is not None:
+            flags['embedding_cached'] = embedding is not None
+        if embedding is not None:
+            return embedding
+        
+        embedding = self.model.encode([text])
+        if self.embedding_cache is not None:
+            self.embedding_cache.put(text, embedding)
+        return embedding
+    
+    def parse_query(self, query):
+        """ParsedQuery de la requête, ou None si l'analyse est désactivée"""
+        if self.query_parser is None:
+            return None
+        return self.query_parser.parse(query)
+    
+    def rerank(self, query, candidates, top_n, deadline=None):
+        """
+        Réordonne les top_n premiers candidats selon le score du cross-encoder
         
         Args:
             query: Requête en langage naturel
-            top_k: Nombre de résultats à retourner
-            boost_rating: Active le reranking par rating et popularité
-            min_score: Score minimum de pertinence
-            adaptive: Filtre adaptatif des résultats
+            candidates: Liste triée de tuples (movie_idx, résultat)
+            top_n: Nombre de candidats à rescorer
+            deadline: Instant limite (time.perf_counter) ou None
         
         Returns:
-            Liste de dictionnaires avec les films les plus pertinents
+            Liste de tuples réordonnée (inchangée si le budget est dépassé)
         """
-        query_embedding = self.model.encode([query])
+        head = candidates[:top_n]
+        texts = [(idx, self.reranker.create_rerank_text(result)) for idx, result in head]
         
-        search_k = top_k * 4 if boost_rating else top_k
-        distances, indices = self.index.search(query_embedding.astype('float32'), search_k)
+        scores = self.reranker.score(query, texts, deadline=deadline)
+        if scores is None:
+            return candidates
+        
+        for (_, result), score in zip(head, scores):
+            result['rerank_score'] = score
+        
+        head = sorted(head, key=lambda c: c[1]['rerank_score'], reverse=True)
+        return head + candidates[top_n:]
+    
+    def movie_result(self, idx, similarity_score, final_score, rerank_score=None):
+        """
+        Construit le dictionnaire de résultat d'un film
+        
+        Args:
+            idx: Position du film dans movies_df
+            similarity_score: Score de similarité sémantique
+            final_score: Score hybride final
+            rerank_score: Score du cross-encoder (None si non rescoré)
         
-        results = []
-        for idx, distance in zip(indices[0], distances[0]):
-            movie = self.movies_df.iloc[idx]
+        Returns:
+            Dictionnaire JSON-compatible (types Python natifs, None pour les valeurs manquantes)
+        """
+        columns = self.result_columns
+        return {
+            'id': columns['id'][idx],
+            'title': columns['title'][idx],
+            'year': columns['year'][idx],
+            'genres': columns['genres'][idx],
+            'plot': columns['plot'][idx],
+            'keywords': columns['keywords'][idx],
+            'rating': columns['rating'][idx],
+            'popularity': columns['popularity'][idx],
+            'similarity_score': float(similarity_score),
+            'final_score': float(final_score),
+            'rerank_score': rerank_score,
+            'poster_path': columns['poster_path'][idx],
+            'dup_group': columns['dup_group'][idx]
+        }
+    
+    def rank(self, query, search_k, boost_rating=True, rerank_top_n=None, timings=None, parsed=None,
+             flags=None):
+        """
+        Récupère et classe les search_k plus proches voisins d'une requête
+        Avec un analyseur de requêtes, seul le texte sans contraintes est encodé; l'index est
+        interrogé plus profondément (filter_overfetch x search_k) et les candidats qui ne
+        satisfont pas les contraintes sont écartés avant le score hybride et le reranking; les thèmes
+        et décors de la requête ajoutent un bonus au score hybride (ParsedQuery.theme_bonus).
+        Avec diversify_groups, un seul film par groupe de quasi-doublons reste en tête (voir diversify)
+        
+        Args:
+            query: Requête en langage naturel
+            search_k: Nombre de candidats à récupérer dans l'index
+            boost_rating: Active le reranking par rating et popularité
+            rerank_top_n: Candidats rescorés par le cross-encoder
+                (None: valeur de set_reranker, 0: désactivé)
+            timings: Dictionnaire optionnel rempli avec la durée (s) de chaque étape
+            parsed: ParsedQuery déjà calculée (défaut: analyse par self.query_parser)
+            flags: Dictionnaire optionnel rempli avec les indicateurs de la recherche (cache)
+        
+        Returns:
+            Liste triée de tuples (movie_idx, résultat), movie_idx étant un int Python
+        """
+        start = time.perf_counter()
+        
+        if rerank_top_n is None:
+            rerank_top_n = self.rerank_top_n
+        if self.reranker is None:
+            rerank_top_n = 0
+        
+        if parsed is None:
+            parsed = self.parse_query(query)
+        constrained = parsed is not None and parsed.has_constraints()
+        themed = parsed is not None and bool(parsed.themes)
+        parsed_at = time.perf_counter()
+        
+        query_embedding = self.encode_query(parsed.text if parsed is not None else query, flags=flags)
+        encoded = time.perf_counter()
+        
+        search_k = max(search_k, rerank_top_n)
+        fetch_k = min(search_k * self.filter_overfetch, self.index.ntotal) if constrained else search_k
+        distances, indices = self.search_vectors(query_embedding, fetch_k)
+        searched = time.perf_counter()
+        
+        columns = self.result_columns
+        neighbours = [(idx, distance) for idx, distance in zip(indices[0].tolist(), distances[0].tolist())
+                      if idx >= 0]
+        if constrained:
+            matching = [(idx, distance) for idx, distance in neighbours
+                        if parsed.matches(columns['year'][idx], columns['rating'][idx], columns['genres'][idx])]
+            # Aucun film ne satisfait les contraintes: on les relâche plutôt que de ne rien renvoyer
+            parsed.relaxed = not matching
+            neighbours = matching or neighbours
+        
+        candidates = []
+        for idx, distance in neighbours[:search_k]:
             similarity_score = 1 / (1 + distance)
             
             if boost_rating:
-                rating_normalized = movie['rating'] / 10.0
+                rating_normalized = (columns['rating'][idx] or 0.0) / 10.0
                 rating_weight = min(rating_normalized * 1.2, 0.95)
-                popularity_normalized = min(movie['popularity'] / 50.0, 1.0)
+                popularity_normalized = min((columns['popularity'][idx] or 0.0) / 50.0, 1.0)
                 
-                is_documentary = 'Documentary' in str(movie['genres'])
+                is_documentary = 'Documentary' in (columns['genres'][idx] or '')
                 doc_penalty = 0.85 if is_documentary else 1.0
                 
                 final_score = (similarity_score * 0.65 + 
@@ -177,38 +696,184 @@ class MovieRetriever:
             else:
                 final_score = similarity_score
             
-            results.append({
-                'title': movie['title'],
-                'year': movie['year'],
-                'genres': movie['genres'],
-                'plot': movie['plot'],
-                'keywords': movie['keywords'],
-                'rating': movie['rating'],
-                'popularity': movie['popularity'],
-                'similarity_score': similarity_score,
-                'final_score': final_score,
-                'poster_path': movie.get('poster_path', '')
-            })
-        
-        results = sorted(results, key=lambda x: x['final_score'], reverse=True)
+            if themed:
+                final_score += parsed.theme_bonus(columns['keywords'][idx], columns['plot'][idx])
+            
+            candidates.append((idx, self.movie_result(idx, similarity_score, final_score)))
+        
+        candidates = sorted(candidates, key=lambda c: c[1]['final_score'], reverse=True)
+        scored = time.perf_counter()
+        
+        if rerank_top_n > 0:
+            deadline = None
+            if self.rerank_budget_ms is not None:
+                deadline = start + self.rerank_budget_ms / 1000.0
+            candidates = self.rerank(query, candidates, rerank_top_n, deadline=deadline)
+        
+        if self.diversify_groups:
+            candidates = self.diversify(candidates)
+        
+        if timings is not None:
+            if parsed is not None:
+                timings['query_parse'] = parsed_at - start
+            timings['encode'] = encoded - parsed_at
+            timings['faiss_search'] = searched - encoded
+            timings['hybrid_score'] = scored - searched
+            if rerank_top_n > 0:
+                timings['rerank'] = time.perf_counter() - scored
+        
+        return candidates
+    
+    def diversify(self, candidates):
+        """
+        Un film par groupe de quasi-doublons (colonne dup_group, voir src/dedup.py) en tête de
+        liste: les autres membres d'un groupe déjà présent passent après, dans leur ordre
+        
+        Args:
+            candidates: Liste triée de tuples (movie_idx, résultat)
+        
+        Returns:
+            Liste réordonnée (inchangée si le catalogue n'a pas de groupes)
+        """
+        groups = self.result_columns['dup_group']
+        seen = set()
+        first, repeated = [], []
+        for candidate in candidates:
+            group = groups[candidate[0]]
+            if group is None or group not in seen:
+                first.append(candidate)
+                if group is not None:
+                    seen.add(group)
+            else:
+                repeated.append(candidate)
+        return first + repeated if repeated else candidates
+    
+    @staticmethod
+    def adaptive_filter(results, top_k, min_score=0.45):
+        """
+        Filtre adaptatif: s'arrête plus tôt quand les scores deviennent faibles
+        Après un reranking, la tête reclassée par le cross-encoder est gardée dans son ordre:
+        les seuils portent sur final_score (bi-encoder) et couperaient un résultat que le
+        cross-encoder a remonté. Seuls les résultats non reclassés qui complètent la page
+        doivent atteindre min_score
         
+        Args:
+            results: Liste de résultats triée
+            top_k: Nombre maximum de résultats
+            min_score: Score minimum de pertinence
+        
+        Returns:
+            Sous-liste des résultats retenus (dans l'ordre)
+        """
+        reranked = [r for r in results if r['rerank_score'] is not None]
+        if reranked:
+            if len(reranked) >= top_k:
+                return reranked[:top_k]
+            rest = [r for r in results if r['rerank_score'] is None and r['final_score'] >= min_score]
+            return reranked + rest[:top_k - len(reranked)]
+        
+        filtered_results = []
+        for r in results:
+            if r['final_score'] >= min_score:
+                filtered_results.append(r)
+                if r['final_score'] < 0.55 and len(filtered_results) >= 3:
+                    break
+                elif len(filtered_results) >= top_k:
+                    break
+        
+        if len(filtered_results) < 3 and len(results) >= 3:
+            return results[:3]
+        
+        return filtered_results if filtered_results else results[:top_k]
+    
+    def search(self, query, top_k=5, boost_rating=True, min_score=0.45, adaptive=True, rerank_top_n=None,
+               timings=None, parsed=None, flags=None):
+        """
+        Recherche sémantique avec reranking hybride
+        
+        Args:
+            query: Requête en langage naturel
+            top_k: Nombre de résultats à retourner
+            boost_rating: Active le reranking par rating et popularité
+            min_score: Score minimum de pertinence
+            adaptive: Filtre adaptatif des résultats
+            rerank_top_n: Candidats rescorés par le cross-encoder
+                (None: valeur de set_reranker, 0: désactivé)
+            timings: Dictionnaire optionnel rempli avec la durée (s) de chaque étape
+            parsed: ParsedQuery déjà calculée (défaut: analyse par self.query_parser)
+            flags: Dictionnaire optionnel rempli avec les indicateurs de la recherche (cache)
+        
+        Returns:
+            Liste de dictionnaires avec les films les plus pertinents
+        """
+        search_k = top_k * 4 if boost_rating else top_k
+        candidates = self.rank(query, search_k, boost_rating=boost_rating, rerank_top_n=rerank_top_n,
+                               timings=timings, parsed=parsed, flags=flags)
+        results = [result for _, result in candidates]
+        
+        if not adaptive:
+            return results[:top_k]
+        
+        start = time.perf_counter()
+        results = self.adaptive_filter(results, top_k, min_score)
+        if timings is not None:
+            timings['adaptive_filter'] = time.perf_counter() - start
+        
+        return results
+    
+    def search_deep(self, query, top_k=5, max_depth=200, boost_rating=True, min_score=0.45,
+                    adaptive=True, rerank_top_n=None, timings=None, parsed=None, flags=None):
+        """
+        Recherche qui conserve la liste classée complète pour la pagination
+        La première page est celle de search(), les suivantes se lisent dans ranked
+        sans ré-encoder ni re-chercher
+        
+        Args:
+            query: Requête en langage naturel
+            top_k: Nombre de résultats de la première page
+            max_depth: Nombre maximum de candidats conservés (borne la mémoire)
+            boost_rating, min_score, adaptive, rerank_top_n, timings, parsed, flags: voir search()
+        
+        Returns:
+            Tuple (première page, ranked, offset de la page suivante)
+            où ranked est une liste compacte de tuples
+            (movie_idx, similarity_score, final_score, rerank_score)
+        """
+        search_k = top_k * 4 if boost_rating else top_k
+        search_k = max(search_k, max_depth)
+        candidates = self.rank(query, search_k, boost_rating=boost_rating, rerank_top_n=rerank_top_n,
+                               timings=timings, parsed=parsed, flags=flags)
+        results = [result for _, result in candidates]
+        
+        start = time.perf_counter()
         if adaptive:
-            filtered_results = []
-            for r in results:
-                if r['final_score'] >= min_score:
-                    filtered_results.append(r)
-                    if r['final_score'] < 0.55 and len(filtered_results) >= 3:
-                        break
-                    elif len(filtered_results) >= top_k:
-                        break
-            
-            if len(filtered_results) < 3 and len(results) >= 3:
-                return results[:3]
-            
-            return filtered_results if filtered_results else results[:top_k]
+            first_page = self.adaptive_filter(results, top_k, min_score)
+        else:
+            first_page = results[:top_k]
         
-        return results[:top_k]
-
+        positions = {id(result): pos for pos, result in enumerate(results)}
+        next_offset = max((positions[id(r)] for r in first_page), default=-1) + 1
+        
+        ranked = [
+            (idx, r['similarity_score'], r['final_score'], r['rerank_score'])
+            for idx, r in candidates[:max(max_depth, next_offset)]
+        ]
+        if timings is not None:
+            timings['adaptive_filter'] = time.perf_counter() - start
+        
+        return first_page, ranked, next_offset
+    
+    def results_from_ranked(self, ranked):
+        """
+        Reconstruit les résultats à partir d'une tranche de liste classée compacte
+        
+        Args:
+            ranked: Liste de tuples (movie_idx, similarity_score, final_score, rerank_score)
+        
+        Returns:
+            Liste de dictionnaires de films
+        """
+        return [self.movie_result(*entry) for entry in ranked]
 
 def main():
     """Reconstruit l'index FAISS avec le modèle fine-tuné"""
@@ -216,15 +881,21 @@ def main():
     print("RECONSTRUCTION DE L'INDEX FAISS AVEC LE MODÈLE FINE-TUNÉ")
     print("="*70 + "\n")
     
-    retriever = MovieRetriever(use_trained=True)
-    retriever.load_movies(config.MOVIES_CSV)
+    # Construction par flux (mémoire bornée par BUILD_CHUNK_SIZE) publiée comme nouvelle version,
+    # puis chargement et vérification comme en production
+    from index_builder import StreamingIndexBuilder
+    from artifacts import load_artifact, publish_index
     
-    print("\nGénération des embeddings avec le modèle entraîné...")
-    embeddings = retriever.generate_embeddings()
-    retriever.embeddings = embeddings
+    retriever = MovieRetriever(use_trained=True)
+    builder = StreamingIndexBuilder(retriever, chunk_size=config.BUILD_CHUNK_SIZE,
+                                    queue_depth=config.BUILD_QUEUE_DEPTH, train_size=config.BUILD_TRAIN_SIZE)
+    manifest = publish_index(builder, config.MOVIES_CSV, config.ARTIFACTS_DIR,
+                             index_type=config.INDEX_TYPE, dim=config.INDEX_DIM,
+                             reduction=config.INDEX_REDUCTION, storage=config.INDEX_STORAGE)
     
-    retriever.build_index(embeddings)
-    retriever.save_index(config.FAISS_INDEX_FILE, config.EMBEDDINGS_FILE)
+    retriever.load_movies(config.MOVIES_CSV)
+    load_artifact(retriever, config.ARTIFACTS_DIR, version=manifest['version'], csv_path=config.MOVIES_CSV)
+    print(f"Version v{manifest['version']:04d} publiée dans {config.ARTIFACTS_DIR}")
     
     print("\n" + "="*70)
     print("Test du retriever avec des requêtes exemples:")
@@ -0,0 +1,326 @@
+"""
+Représentation multi-vecteurs des films, fusion tardive par champ
+Au lieu d'un seul texte (titre x2, genres x3, keywords x4, plot tronqué à 400
+caractères), chaque film a un vecteur par champ: titre, ensemble genres + keywords,
+et plot. Le plot est découpé en passages encodés séparément puis moyennés: tout le
+résumé est couvert, chaque séquence reste courte, et le stockage reste borné à un
+vecteur par champ et par film.
+
+Chaque champ a son index FAISS; une requête les interroge en parallèle, les
+candidats sont réunis puis rescorés exactement sur tous les champs:
+    distance fusionnée = somme des poids x distance L2 au carré de chaque champ
+MultiVectorIndex expose l'interface d'un index FAISS (search, ntotal, d): le score
+hybride, le reranking et la pagination de MovieRetriever restent inchangés.
+
+Sur disque, le dossier contient les embeddings et l'index FAISS de chaque champ, et
+fields.json: poids, paramètres, empreintes du catalogue et du modèle. Le dossier est
+écrit à côté puis échangé; au chargement, un catalogue ou un modèle différent de ceux
+de la construction arrête le démarrage (voir src/artifacts.py).
+
+Usage:
+    python -m src.multi_vector
+    FIELD_WEIGHTS=title:0.2,keywords:0.3,plot:0.5 USE_MULTI_VECTOR=1 python -m src.app
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import datetime
+import json
+import os
+import shutil
+import sys
+
+import faiss
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import config
+from movie_retriever import MovieRetriever, INDEX_TYPES, create_index, train_index
+from artifacts import ArtifactMismatch, catalog_hash, model_fingerprint
+
+
+FIELDS = ('title', 'keywords', 'plot')
+WEIGHTS_FILE = 'fields.json'
+MANIFEST_FORMAT = 1
+
+
+def parse_weights(weights):
+    """'title:0.3,plot:0.7' ou dictionnaire -> poids normalisés (somme 1) par champ"""
+    if isinstance(weights, str):
+        weights = {name: float(value) for name, value in (part.split(':') for part in weights.split(',') if part)}
+    unknown = set(weights) - set(FIELDS)
+    if unknown:
+        raise ValueError(f"Champs inconnus: {', '.join(sorted(unknown))} (attendu: {', '.join(FIELDS)})")
+    total = sum(weights.values())
+    return {name: weights.get(name, 0.0) / total for name in FIELDS}
+
+
+def plot_chunks(plot, chunk_words=64, max_chunks=8):
+    """Découpe un résumé en passages de chunk_words mots (au plus max_chunks)"""
+    if not isinstance(plot, str) or len(plot) <= 10:
+        return []
+    words = plot.split()
+    return [" ".join(words[i:i + chunk_words]) for i in range(0, len(words), chunk_words)][:max_chunks]
+
+
+def field_texts(movies_df):
+    """
+    Textes des champs courts de chaque film
+
+    Returns:
+        Dictionnaire {'title': [...], 'keywords': [...]}
+    """
+    titles, keywords = [], []
+    for row in movies_df.itertuples(index=False):
+        title = str(row.title) if pd.notna(row.title) else ''
+        if pd.notna(getattr(row, 'year', None)):
+            title = f"{title} ({int(float(row.year))})"
+        titles.append(title)
+        keywords.append(", ".join(str(v) for v in (row.genres, row.keywords) if pd.notna(v)))
+    return {'title': titles, 'keywords': keywords}
+
+
+def encode_fields(model, movies_df, chunk_words=64, max_chunks=8, batch_size=64):
+    """
+    Encode les trois champs du catalogue
+
+    Args:
+        model: Encodeur (SentenceTransformer ou compatible)
+        movies_df: Catalogue
+        chunk_words: Mots par passage de plot
+        max_chunks: Passages encodés au plus par film (borne le coût d'encodage)
+        batch_size: Taille des batches d'encodage
+
+    Returns:
+        Dictionnaire {champ: matrice (n_movies, dim) float32}
+    """
+    texts = field_texts(movies_df)
+    embeddings = {
+        name: np.asarray(model.encode(values, batch_size=batch_size, show_progress_bar=True), dtype='float32')
+        for name, values in texts.items()
+    }
+
+    # Tous les passages en un seul appel, puis moyenne par film (segment_sum)
+    chunks, owners = [], []
+    for row, plot in enumerate(movies_df['plot'].tolist()):
+        for chunk in plot_chunks(plot, chunk_words, max_chunks):
+            chunks.append(chunk)
+            owners.append(row)
+
+    dimension = embeddings['title'].shape[1]
+    pooled = np.zeros((len(movies_df), dimension), dtype='float32')
+    counts = np.zeros(len(movies_df), dtype='float32')
+    if chunks:
+        chunk_embeddings = np.asarray(model.encode(chunks, batch_size=batch_size, show_progress_bar=True),
+                                      dtype='float32')
+        np.add.at(pooled, np.asarray(owners), chunk_embeddings)
+        np.add.at(counts, np.asarray(owners), 1.0)
+
+    # Film sans plot: le vecteur du champ keywords le remplace (pas de vecteur nul)
+    has_plot = counts > 0
+    pooled[has_plot] /= counts[has_plot, None]
+    pooled[~has_plot] = embeddings['keywords'][~has_plot]
+    norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+    embeddings['plot'] = pooled / np.maximum(norms, 1e-12)
+
+    return embeddings
+
+
+class MultiVectorIndex:
+    """Index par champ interrogés en parallèle, fusion pondérée des distances"""
+
+    def __init__(self, embeddings, weights=None, index_type='flat', candidate_factor=2, indexes=None):
+        """
+        Args:
+            embeddings: Dictionnaire {champ: matrice (n_movies, dim)}
+            weights: Poids par champ (défaut: config.FIELD_WEIGHTS)
+            index_type: Type d'index FAISS de chaque champ
+            candidate_factor: Chaque champ propose candidate_factor x k candidats
+            indexes: Index FAISS déjà construits par champ (les champs absents sont indexés ici)
+        """
+        self.embeddings = {name: np.ascontiguousarray(embeddings[name], dtype='float32') for name in FIELDS}
+        self.weights = parse_weights(weights or config.FIELD_WEIGHTS)
+        self.index_type = index_type
+        self.candidate_factor = candidate_factor
+        self.ntotal = len(self.embeddings['title'])
+        self.d = self.embeddings['title'].shape[1]
+
+        self.indexes = dict(indexes or {})
+        for name in self.active_fields():
+            self.field_index(name)
+
+        self.pool = ThreadPoolExecutor(max_workers=len(FIELDS), thread_name_prefix='field')
+
+    def field_index(self, name):
+        """Index FAISS d'un champ, construit à la première demande"""
+        if name not in self.indexes:
+            index = create_index(self.d, self.index_type, n_vectors=self.ntotal)
+            train_index(index, self.embeddings[name])
+            index.add(self.embeddings[name])
+            self.indexes[name] = index
+        return self.indexes[name]
+
+    def active_fields(self):
+        return [name for name in FIELDS if self.weights[name] > 0]
+
+    def search(self, query_embeddings, k):
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype='float32')
+        depth = min(k * self.candidate_factor, self.ntotal)
+        fields = self.active_fields()
+        futures = [self.pool.submit(self.indexes[name].search, query_embeddings, depth) for name in fields]
+        field_candidates = [future.result()[1] for future in futures]
+
+        distances = np.full((len(query_embeddings), k), np.inf, dtype='float32')
+        indices = np.full((len(query_embeddings), k), -1, dtype='int64')
+        for row, query in enumerate(query_embeddings):
+            candidates = np.unique(np.concatenate([c[row] for c in field_candidates]))
+            candidates = candidates[candidates >= 0]
+
+            # Rescoring exact: un candidat trouvé par un seul champ est noté sur tous
+            fused = np.zeros(len(candidates), dtype='float32')
+            for name in fields:
+                diff = self.embeddings[name][candidates] - query
+                fused += self.weights[name] * np.einsum('ij,ij->i', diff, diff)
+
+            order = np.argsort(fused, kind='stable')[:k]
+            distances[row, :len(order)] = fused[order]
+            indices[row, :len(order)] = candidates[order]
+
+        return distances, indices
+
+    def project(self, embeddings):
+        """Pas de réduction: les champs sont indexés en pleine dimension"""
+        return np.ascontiguousarray(embeddings, dtype='float32')
+
+    def save(self, directory, csv_path=None, model_path=None):
+        """
+        Écrit embeddings, index de tous les champs (les poids restent ajustables au chargement)
+        et manifeste, dans un dossier temporaire échangé ensuite avec directory
+
+        Args:
+            directory: Dossier de destination
+            csv_path: Catalogue encodé (empreinte vérifiée au chargement)
+            model_path: Modèle ayant encodé les champs (empreinte vérifiée au chargement)
+        """
+        tmp_dir = f"{directory.rstrip(os.sep)}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name in FIELDS:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), self.embeddings[name])
+            faiss.write_index(self.field_index(name), os.path.join(tmp_dir, f"{name}.index"))
+        manifest = {
+            'format': MANIFEST_FORMAT,
+            'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'weights': self.weights,
+            'index_type': self.index_type,
+            'candidate_factor': self.candidate_factor,
+            'n_movies': self.ntotal,
+            'dimension': self.d,
+            'catalog_hash': catalog_hash(csv_path) if csv_path else None,
+            'model': str(model_path) if model_path else None,
+            'model_fingerprint': model_fingerprint(model_path)
+        }
+        with open(os.path.join(tmp_dir, WEIGHTS_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        # Échange: l'ancienne version n'est supprimée qu'une fois la nouvelle en place
+        old_dir = f"{directory.rstrip(os.sep)}.old"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(directory):
+            os.replace(directory, old_dir)
+        os.replace(tmp_dir, directory)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        return manifest
+
+    @classmethod
+    def load(cls, directory, weights=None):
+        """
+        Args:
+            directory: Dossier écrit par save()
+            weights: Poids à utiliser (défaut: config.FIELD_WEIGHTS, ajustables sans réencoder)
+
+        Returns:
+            Tuple (MultiVectorIndex, manifeste)
+        """
+        with open(os.path.join(directory, WEIGHTS_FILE)) as f:
+            manifest = json.load(f)
+        if manifest.get('format') != MANIFEST_FORMAT:
+            raise ArtifactMismatch(f"Représentation multi-vecteurs sans manifeste dans {directory} "
+                                   "(relancez 'python -m src.multi_vector')")
+        # Les embeddings ne servent qu'au rescoring de quelques lignes par requête: mappés en
+        # mémoire, seuls les index FAISS des champs sont chargés en RAM
+        embeddings = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r') for name in FIELDS}
+        indexes = {name: faiss.read_index(os.path.join(directory, f"{name}.index")) for name in FIELDS}
+        index = cls(embeddings, weights=weights, index_type=manifest['index_type'],
+                    candidate_factor=manifest['candidate_factor'], indexes=indexes)
+        return index, manifest
+
+
+def attach_multi_vector(retriever, directory, weights=None, csv_path=None, check_model=True):
+    """
+    Remplace l'index du retriever par la représentation multi-vecteurs
+
+    Args:
+        retriever: MovieRetriever dont le catalogue est chargé
+        directory: Dossier écrit par MultiVectorIndex.save()
+        weights: Poids par champ (défaut: config.FIELD_WEIGHTS)
+        csv_path: Fichier du catalogue chargé (None: empreinte non vérifiée)
+        check_model: Vérifie l'empreinte du modèle de requêtes (ignoré pour un encodeur fourni)
+
+    Returns:
+        MultiVectorIndex attaché
+
+    Raises:
+        ArtifactMismatch: Représentation construite pour un autre catalogue ou un autre modèle
+    """
+    index, manifest = MultiVectorIndex.load(directory, weights=weights)
+    rebuild = "(relancez 'python -m src.multi_vector')"
+    for name, field_index in index.indexes.items():
+        if field_index.ntotal != index.ntotal:
+            raise ArtifactMismatch(f"Index du champ {name}: {field_index.ntotal} vecteurs, {index.ntotal} attendus")
+    if index.ntotal != len(retriever.movies_df):
+        raise ArtifactMismatch(f"Représentation multi-vecteurs obsolète: {index.ntotal} films, "
+                               f"catalogue: {len(retriever.movies_df)} {rebuild}")
+    if csv_path is not None and catalog_hash(csv_path) != manifest['catalog_hash']:
+        raise ArtifactMismatch(f"Représentation multi-vecteurs construite sur un autre catalogue que {csv_path} "
+                               f"{rebuild}")
+    if check_model and manifest['model_fingerprint'] is not None:
+        fingerprint = model_fingerprint(retriever.model_path)
+        if fingerprint is not None and fingerprint != manifest['model_fingerprint']:
+            raise ArtifactMismatch(f"Représentation multi-vecteurs encodée avec {manifest['model']}, "
+                                   f"le modèle chargé ({retriever.model_path}) est différent {rebuild}")
+    retriever.index = index
+    retriever.quantization = {'storage': 'float'}
+    # Les embeddings du vecteur unique ne servent plus: le rescoring lit ceux des champs
+    retriever.embeddings = None
+    return index
+
+
+def main(argv=None):
+    """Encode les champs du catalogue et sauvegarde la représentation multi-vecteurs"""
+    parser = argparse.ArgumentParser(description="Représentation multi-vecteurs par champ")
+    parser.add_argument('--index-type', choices=INDEX_TYPES, default=config.INDEX_TYPE)
+    parser.add_argument('--chunk-words', type=int, default=config.PLOT_CHUNK_WORDS)
+    parser.add_argument('--max-chunks', type=int, default=config.PLOT_MAX_CHUNKS)
+    args = parser.parse_args(argv)
+
+    print("\n" + "="*70)
+    print("ENCODAGE MULTI-VECTEURS (titre, keywords, plot)")
+    print("="*70 + "\n")
+
+    retriever = MovieRetriever(use_trained=True)
+    retriever.load_movies(config.MOVIES_CSV)
+
+    embeddings = encode_fields(retriever.model, retriever.movies_df, args.chunk_words, args.max_chunks)
+    index = MultiVectorIndex(embeddings, index_type=args.index_type)
+    index.save(config.MULTI_VECTOR_DIR, csv_path=config.MOVIES_CSV, model_path=retriever.model_path)
+
+    size_mb = sum(e.nbytes for e in embeddings.values()) / 1024**2
+    print(f"\n{index.ntotal} films x {len(FIELDS)} vecteurs ({size_mb:.1f} Mo) dans {config.MULTI_VECTOR_DIR}")
+    print(f"Poids: {index.weights}")
+    print("Activez-la dans l'API avec USE_MULTI_VECTOR=1")
+
+
+if __name__ == "__main__":
+    main()
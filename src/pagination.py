@@ -0,0 +1,112 @@
+"""
+Pagination par curseur des résultats de recherche
+Conserve côté serveur la liste classée d'une requête pour servir les pages suivantes
+sans ré-encoder la requête ni interroger à nouveau l'index
+"""
+
+from collections import OrderedDict
+import base64
+import json
+import secrets
+import threading
+import time
+
+
+class CursorStore:
+    """Cache LRU à expiration des listes classées, adressées par curseur opaque"""
+
+    def __init__(self, max_entries=1000, ttl_seconds=600):
+        """
+        Args:
+            max_entries: Nombre maximum de listes classées conservées
+            ttl_seconds: Durée de vie d'une liste classée
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def create(self, query, ranked):
+        """
+        Enregistre une liste classée
+
+        Args:
+            query: Requête d'origine
+            ranked: Liste compacte produite par MovieRetriever.search_deep
+
+        Returns:
+            Jeton identifiant la liste
+        """
+        token = secrets.token_urlsafe(12)
+        with self._lock:
+            self._entries[token] = (time.monotonic(), query, ranked)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return token
+
+    def get(self, token):
+        """
+        Récupère une liste classée
+
+        Returns:
+            Tuple (query, ranked) ou None si le jeton est inconnu ou expiré
+        """
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            created, query, ranked = entry
+            if time.monotonic() - created > self.ttl_seconds:
+                del self._entries[token]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return query, ranked
+
+    def __len__(self):
+        return len(self._entries)
+
+    def cache_info(self):
+        """Statistiques d'utilisation des curseurs"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0
+        }
+
+    @staticmethod
+    def encode_cursor(token, offset):
+        """Encode (jeton, offset) en curseur opaque"""
+        payload = json.dumps({'t': token, 'o': offset}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        Décode un curseur opaque
+
+        Returns:
+            Tuple (jeton, offset)
+
+        Raises:
+            ValueError: si le curseur est malformé
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            token, offset = str(payload['t']), int(payload['o'])
+        except (TypeError, KeyError, ValueError, UnicodeDecodeError) as e:
+            raise ValueError(f"Curseur invalide: {e}")
+
+        if offset < 0:
+            raise ValueError("Curseur invalide: offset négatif")
+
+        return token, offset
@@ -0,0 +1,243 @@
+"""
+Journal persistant des requêtes de recherche
+Chaque recherche (requête, paramètres, durées par étape, identifiants renvoyés,
+succès de cache) est ajoutée à un journal en ajout seul: JSON lines compressé en
+gzip, avec rotation par taille et par âge. Le chemin des requêtes ne fait qu'un
+put_nowait dans une file; un thread dédié écrit par lots (un membre gzip par lot,
+lisible même si le processus s'arrête brutalement).
+
+Le journal alimente le préchauffage (src/warmup.py) et les rapports d'analyse:
+    python -m src.query_log --top 50
+"""
+
+from datetime import datetime, timezone
+import argparse
+import glob
+import gzip
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import config
+
+
+FILE_PREFIX = 'queries-'
+FILE_SUFFIX = '.jsonl.gz'
+
+_STOP = object()
+
+
+class QueryLog:
+    """Journal de requêtes écrit par lots depuis un thread dédié"""
+
+    def __init__(self, directory, batch_size=256, flush_seconds=2.0, max_bytes=64 * 1024**2,
+                 rotate_seconds=3600, max_files=168, queue_size=100000):
+        """
+        Args:
+            directory: Dossier des fichiers du journal
+            batch_size: Entrées écrites au plus par lot
+            flush_seconds: Délai maximum avant l'écriture d'un lot incomplet
+            max_bytes: Taille (compressée) au-delà de laquelle on change de fichier
+            rotate_seconds: Âge au-delà duquel on change de fichier
+            max_files: Fichiers conservés (les plus anciens sont supprimés, 0: tous)
+            queue_size: Entrées en attente au plus; au-delà elles sont perdues (comptées dans dropped)
+        """
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.max_files = max_files
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._path = None
+        self._opened = 0.0
+        self.written = 0
+        self.dropped = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='query-log', daemon=True)
+        self._thread.start()
+
+    def record(self, entry):
+        """Ajoute une entrée sans bloquer (file pleine: l'entrée est perdue)"""
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=5.0):
+        """Écrit les entrées en attente et arrête le thread"""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    entry = self._queue.get(timeout=max(deadline - time.monotonic(), 0.001))
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            if batch:
+                try:
+                    self._write(batch)
+                except OSError:
+                    # Disque plein ou dossier supprimé: le lot est perdu, le service continue
+                    self.dropped += len(batch)
+                    self._path = None
+
+    def _write(self, batch):
+        if self._needs_rotation():
+            self._rotate()
+        lines = "".join(json.dumps(entry, ensure_ascii=False, default=str) + "\n" for entry in batch)
+        with gzip.open(self._path, 'at', encoding='utf-8') as f:
+            f.write(lines)
+        self.written += len(batch)
+
+    def _needs_rotation(self):
+        if self._path is None:
+            return True
+        if time.monotonic() - self._opened > self.rotate_seconds:
+            return True
+        return os.path.exists(self._path) and os.path.getsize(self._path) > self.max_bytes
+
+    def _rotate(self):
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S-%f')
+        self._path = os.path.join(self.directory, f"{FILE_PREFIX}{stamp}{FILE_SUFFIX}")
+        self._opened = time.monotonic()
+
+        if self.max_files:
+            # Le nouveau fichier n'existe pas encore: on garde max_files - 1 anciens
+            files = log_files(self.directory)
+            for old in files[:max(len(files) - self.max_files + 1, 0)]:
+                os.remove(old)
+
+    def info(self):
+        """Compteurs du journal"""
+        return {'written': self.written, 'dropped': self.dropped, 'pending': self._queue.qsize()}
+
+
+def log_files(directory):
+    """Fichiers du journal, du plus ancien au plus récent"""
+    return sorted(glob.glob(os.path.join(directory, f"{FILE_PREFIX}*{FILE_SUFFIX}")))
+
+
+def read_query_log(directory, since=None):
+    """
+    Charge le journal en DataFrame
+
+    Args:
+        directory: Dossier du journal
+        since: Timestamp UNIX minimum (None: tout le journal)
+
+    Returns:
+        DataFrame, une ligne par recherche ou page servie
+    """
+    records = []
+    for path in log_files(directory):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    records.append(json.loads(line))
+            except (EOFError, OSError, ValueError):
+                # Dernier membre tronqué par un arrêt brutal: les lots précédents restent lisibles
+                pass
+    df = pd.DataFrame(records)
+    if since is not None and len(df):
+        df = df[df['ts'] >= since]
+    return df
+
+
+def query_report(df, top=50):
+    """
+    Agrège le journal: requêtes les plus fréquentes et requêtes sans résultat
+    (aucun film renvoyé, ou aucun film ne satisfaisait les contraintes extraites: filtres relâchés)
+
+    Args:
+        df: DataFrame de read_query_log
+        top: Nombre de requêtes par rapport
+
+    Returns:
+        Tuple (top_queries, zero_results) de DataFrames
+    """
+    searches = df[df['offset'] == 0].copy()
+    searches['normalized'] = searches['query'].str.strip().str.lower()
+    searches['n_results'] = searches['ids'].apply(len)
+    searches['relaxed'] = searches['filters'].apply(lambda f: isinstance(f, dict) and bool(f.get('relaxed')))
+
+    grouped = searches.groupby('normalized')
+    top_queries = pd.DataFrame({
+        'count': grouped.size(),
+        'mean_ms': grouped['total_ms'].mean().round(2),
+        'p95_ms': grouped['total_ms'].quantile(0.95).round(2),
+        'cache_hit_rate': grouped['cache_hit'].mean().round(3),
+        'mean_results': grouped['n_results'].mean().round(1)
+    }).sort_values('count', ascending=False).head(top)
+
+    empty = searches[(searches['n_results'] == 0) | searches['relaxed']].groupby('normalized')
+    zero_results = pd.DataFrame({
+        'count': empty.size(),
+        'relaxed': empty['relaxed'].mean().round(3),
+        'last_seen': empty['ts'].max().apply(lambda ts: datetime.fromtimestamp(ts, timezone.utc).isoformat())
+    }).sort_values('count', ascending=False).head(top)
+
+    return top_queries, zero_results
+
+
+def main(argv=None):
+    """Rapports d'analyse du journal de requêtes"""
+    parser = argparse.ArgumentParser(description="Analyse du journal de requêtes")
+    parser.add_argument('--dir', default=config.QUERY_LOG_DIR, help="Dossier du journal")
+    parser.add_argument('--top', type=int, default=50, help="Requêtes par rapport")
+    parser.add_argument('--days', type=float, default=None, help="Limite aux N derniers jours")
+    parser.add_argument('--output', default=os.path.join(config.BASE_DIR, 'docs'),
+                        help="Dossier des rapports CSV")
+    args = parser.parse_args(argv)
+
+    since = time.time() - args.days * 86400 if args.days else None
+    df = read_query_log(args.dir, since=since)
+    if df.empty:
+        print(f"Journal vide: {args.dir}")
+        return
+
+    top_queries, zero_results = query_report(df, top=args.top)
+    searches = df[df['offset'] == 0]
+
+    print("\n" + "="*70)
+    print("JOURNAL DE REQUÊTES")
+    print("="*70)
+    print(f"{len(searches)} recherches, {len(df) - len(searches)} pages suivantes, "
+          f"{searches['query'].str.strip().str.lower().nunique()} requêtes distinctes")
+    if len(searches):
+        print(f"Latence: p50 {np.percentile(searches['total_ms'], 50):.1f} ms, "
+              f"p95 {np.percentile(searches['total_ms'], 95):.1f} ms")
+    else:
+        print("Latence: aucune recherche (seulement des pages suivantes)")
+    print(f"Succès de cache: {df['cache_hit'].mean():.1%}")
+
+    print(f"\nTop {len(top_queries)} requêtes:")
+    print(top_queries.to_string())
+    print(f"\nRequêtes sans résultat ({len(zero_results)}):")
+    print(zero_results.to_string() if len(zero_results) else "(aucune)")
+
+    os.makedirs(args.output, exist_ok=True)
+    top_queries.to_csv(os.path.join(args.output, 'query_log_top_queries.csv'))
+    zero_results.to_csv(os.path.join(args.output, 'query_log_zero_results.csv'))
+    print(f"\nRapports sauvegardés dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
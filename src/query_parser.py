@@ -0,0 +1,304 @@
+"""
+Analyse des requêtes avant encodage
+Extrait par règles et lexique les contraintes structurées d'une requête (genre,
+ambiance, décennie/année, note) pour les appliquer comme filtres, et les retire
+du texte envoyé à l'encodeur: "heist movie from the 90s rated above 7" devient le
+texte "heist movie" avec les filtres 1990-1999 et note >= 7. Les lexiques de genre et d'ambiance viennent des
+vocabulaires du générateur de paires (src/vocabulary.py). Les thèmes et décors de ces vocabulaires
+("revenge", "outer space") ne filtrent rien: ils restent dans le texte encodé et donnent un léger
+bonus aux films dont les mots-clés ou le résumé les mentionnent.
+
+Une seule regex précompilée par type de contrainte: l'analyse d'une requête prend
+quelques dizaines de microsecondes.
+"""
+
+import re
+
+from vocabulary import GENRE_DESCRIPTORS, SETTINGS, THEMES
+
+
+# Genres TMDB et formes usuelles dans les requêtes
+GENRE_ALIASES = {
+    'action': ['Action'], 'adventure': ['Adventure'], 'animation': ['Animation'],
+    'animated': ['Animation'], 'cartoon': ['Animation'], 'anime': ['Animation'],
+    'comedy': ['Comedy'], 'comedies': ['Comedy'], 'crime': ['Crime'],
+    'documentary': ['Documentary'], 'documentaries': ['Documentary'],
+    'drama': ['Drama'], 'dramas': ['Drama'], 'fantasy': ['Fantasy'], 'horror': ['Horror'],
+    'musical': ['Music'], 'musicals': ['Music'], 'mystery': ['Mystery'], 'mysteries': ['Mystery'],
+    'romance': ['Romance'], 'romances': ['Romance'],
+    'romantic comedy': ['Romance', 'Comedy'], 'rom-com': ['Romance', 'Comedy'], 'romcom': ['Romance', 'Comedy'],
+    'science fiction': ['Science Fiction'], 'sci-fi': ['Science Fiction'], 'sci fi': ['Science Fiction'],
+    'scifi': ['Science Fiction'], 'thriller': ['Thriller'], 'thrillers': ['Thriller'],
+    'war movie': ['War'], 'war movies': ['War'], 'war film': ['War'], 'war films': ['War'],
+    'western': ['Western'], 'westerns': ['Western']
+}
+
+# Noms communs ambigus: genres seulement en position de genre ("family movie", "history film");
+# "mafia family succession drama" ou "a history of violence" restent du texte
+GENRE_NOUNS = {'family': ['Family'], 'history': ['History'], 'historical': ['History']}
+GENRE_ALIASES.update({
+    f"{noun} {kind}": genres for noun, genres in GENRE_NOUNS.items() for kind in ('movie', 'movies', 'film', 'films')
+})
+
+# Descripteurs de ton (sous-ensemble de GENRE_DESCRIPTORS): un film doit avoir l'un des genres
+# où le descripteur apparaît. Les descripteurs de contenu (aliens, quest, time travel...)
+# restent dans le texte encodé, le modèle dense les gère mieux qu'un filtre.
+MOOD_DESCRIPTORS = (
+    'explosive', 'high-octane', 'adrenaline-fueled',
+    'funny', 'hilarious', 'humorous', 'laugh-out-loud', 'witty', 'lighthearted', 'comedic', 'amusing',
+    'scary', 'terrifying', 'creepy', 'frightening', 'chilling', 'nightmarish', 'suspenseful',
+    'romantic', 'heartwarming', 'futuristic', 'tense', 'nail-biting', 'edge-of-seat',
+    'magical', 'enchanted', 'family-friendly', 'hand-drawn', 'pixar-style'
+)
+
+HIGH_RATING = 7.5
+
+# Bonus de final_score par thème ou décor de la requête retrouvé dans les mots-clés ou le résumé d'un film
+THEME_BOOST = 0.05
+
+# Mots de liaison sans contenu: si le texte restant n'a qu'eux, on encode les genres à la place
+FILLER_WORDS = {'a', 'an', 'the', 'movie', 'movies', 'film', 'films', 'some', 'any', 'good', 'great',
+                'best', 'with', 'and', 'from', 'in', 'of', 'me', 'show', 'find', 'recommend'}
+
+# Mots laissés en bordure du texte après retrait d'une contrainte ("heist movie with")
+CONNECTORS = {'with', 'and', 'from', 'in', 'of', 'that', 'is', 'rated', 'a', 'the'}
+
+# Note sur 10 (ou en étoiles, voir _rating_value); (?!\.?\d): "100" ou "7.55" ne sont pas lus "10" ou "7"
+_NUMBER = r"(\d{1,2}(?:\.\d)?)(?!\.?\d)(?:\s*/\s*10\b)?"
+_STARS = r"(?:\s+stars?\b)?"
+_LEAD = r"(?:(?:from|in|of|during)\s+)?(?:the\s+)?"
+
+RATING_MIN_REGEX = re.compile(
+    r"\b(?:(?:rated|rating|score|scored|imdb)\s+(?:of\s+)?(?:above|over|higher than|greater than|more than|"
+    r"at least|>=?)?\s*" + _NUMBER + r"(?:\s*\+)?" + _STARS + r"|(?:above|over|at least)\s+" + _NUMBER
+    + r"\s+(?:rating|stars)|" + _NUMBER + r"\s*\+\s*(?:rated|rating|stars))"
+    r"|\b(?:highly|top|well|best)[\s-]rated\b|\bcritically acclaimed\b"
+)
+RATING_MAX_REGEX = re.compile(
+    r"\b(?:rated|rating|score|scored)\s+(?:below|under|lower than|less than|<=?)\s*" + _NUMBER + _STARS
+)
+DECADE_REGEX = re.compile(
+    r"\b" + _LEAD + r"(early|mid|late)?[\s-]?(?:(19|20)(\d)0|'?(\d)0)'?s\b"
+)
+YEAR_RANGE_REGEX = re.compile(r"\bbetween\s+((?:19|20)\d{2})\s+and\s+((?:19|20)\d{2})\b")
+YEAR_BOUND_REGEX = re.compile(r"\b(before|pre|until|after|post|since)[\s-]((?:19|20)\d{2})\b")
+# Année seule: précédée d'une préposition ou suivie de movie/film ("2001: a space odyssey" reste du texte)
+YEAR_REGEX = re.compile(r"\b(?:(?:from|in|during)\s+(?:the\s+year\s+)?((?:19|20)\d{2})|((?:19|20)\d{2})(?=\s+(?:movies?|films?)\b))\b")
+
+
+def _rating_value(match, value):
+    """Note sur 10: une note en étoiles (sur 5) est doublée, au-delà de 5 étoiles elle est ignorée (None)"""
+    if 'star' in match.group(0):
+        return value * 2 if value <= 5 else None
+    return value if value <= 10 else None
+
+
+def _lexicon_regex(phrases):
+    alternation = '|'.join(re.escape(p) for p in sorted(phrases, key=len, reverse=True))
+    return re.compile(rf"(?<![\w-])(?:{alternation})(?![\w-])")
+
+
+def theme_terms():
+    """Thème ou décor (THEMES, SETTINGS) -> termes qui le désignent, en minuscules"""
+    terms = {}
+    for vocabulary in (THEMES, SETTINGS):
+        for name, phrases in vocabulary.items():
+            name = name.replace('_', ' ')
+            terms[name] = [name] + [phrase.lower() for phrase in phrases]
+    return terms
+
+
+class ParsedQuery:
+    """Texte à encoder et contraintes extraites d'une requête"""
+
+    def __init__(self, query):
+        self.query = query
+        self.text = query
+        self.genres = []
+        self.moods = {}
+        self.themes = {}
+        self.year_min = None
+        self.year_max = None
+        self.rating_min = None
+        self.rating_max = None
+        self.relaxed = False
+
+    def has_constraints(self):
+        return bool(self.genres or self.moods or self.year_min or self.year_max
+                    or self.rating_min is not None or self.rating_max is not None)
+
+    @property
+    def filters(self):
+        """Contraintes non vides, au format JSON (renvoyées au client)"""
+        filters = {
+            'genres': self.genres or None,
+            'moods': self.moods or None,
+            'themes': sorted(self.themes) or None,
+            'year_min': self.year_min,
+            'year_max': self.year_max,
+            'rating_min': self.rating_min,
+            'rating_max': self.rating_max,
+            'relaxed': self.relaxed or None
+        }
+        return {key: value for key, value in filters.items() if value is not None}
+
+    def matches(self, year, rating, genres):
+        """
+        Args:
+            year: Année du film ('1997' ou None)
+            rating: Note sur 10 ou None
+            genres: Genres séparés par des virgules ou None
+
+        Returns:
+            True si le film satisfait toutes les contraintes (valeur manquante: non satisfaite)
+        """
+        if self.year_min or self.year_max:
+            if year is None:
+                return False
+            year = int(year)
+            if (self.year_min and year < self.year_min) or (self.year_max and year > self.year_max):
+                return False
+
+        if self.rating_min is not None or self.rating_max is not None:
+            if rating is None:
+                return False
+            if (self.rating_min is not None and rating < self.rating_min) or \
+               (self.rating_max is not None and rating > self.rating_max):
+                return False
+
+        if self.genres or self.moods:
+            movie_genres = {g.strip() for g in genres.split(',')} if genres else set()
+            if any(g not in movie_genres for g in self.genres):
+                return False
+            if any(movie_genres.isdisjoint(options) for options in self.moods.values()):
+                return False
+
+        return True
+
+    def theme_bonus(self, keywords, plot):
+        """
+        Args:
+            keywords: Mots-clés du film ou None
+            plot: Résumé du film ou None
+
+        Returns:
+            THEME_BOOST par thème ou décor de la requête mentionné par le film (0.0 sans thème)
+        """
+        if not self.themes:
+            return 0.0
+        text = f"{keywords or ''} {plot or ''}".lower()
+        return THEME_BOOST * sum(1 for regex in self.themes.values() if regex.search(text))
+
+
+class QueryParser:
+    """Analyseur de requêtes par règles (regex précompilées) et lexiques"""
+
+    def __init__(self, genre_aliases=None, mood_descriptors=MOOD_DESCRIPTORS):
+        """
+        Args:
+            genre_aliases: Forme dans la requête -> genres requis (défaut: GENRE_ALIASES)
+            mood_descriptors: Descripteurs de GENRE_DESCRIPTORS traités comme filtres d'ambiance
+        """
+        self.genre_aliases = genre_aliases or GENRE_ALIASES
+
+        wanted = {d.lower() for d in mood_descriptors}
+        self.mood_genres = {}
+        for genre, descriptors in GENRE_DESCRIPTORS.items():
+            for descriptor in descriptors:
+                if descriptor.lower() in wanted:
+                    self.mood_genres.setdefault(descriptor.lower(), []).append(genre)
+
+        # Les alias de genre priment: 'animated' est un genre, pas une ambiance
+        self.lexicon = {phrase: ('mood', genres) for phrase, genres in self.mood_genres.items()}
+        self.lexicon.update({phrase: ('genre', genres) for phrase, genres in self.genre_aliases.items()})
+        self.lexicon_regex = _lexicon_regex(self.lexicon)
+
+        # Thèmes et décors: repérés dans la requête sans en être retirés (bonus, pas filtre)
+        self.theme_regexes = {name: _lexicon_regex(terms) for name, terms in theme_terms().items()}
+        self.theme_names = {term: name for name, terms in theme_terms().items() for term in terms}
+        self.theme_regex = _lexicon_regex(self.theme_names)
+
+    def parse(self, query):
+        """
+        Extrait les contraintes d'une requête
+
+        Args:
+            query: Requête en langage naturel
+
+        Returns:
+            ParsedQuery (text: requête sans les contraintes reconnues)
+        """
+        parsed = ParsedQuery(query)
+        text = query.lower()
+
+        for match in self.theme_regex.finditer(text):
+            name = self.theme_names[match.group(0)]
+            parsed.themes[name] = self.theme_regexes[name]
+
+        def rating_min(match):
+            values = [float(v) for v in match.groups() if v is not None]
+            value = _rating_value(match, values[0]) if values else HIGH_RATING
+            if value is not None:
+                parsed.rating_min = max(parsed.rating_min or 0.0, value)
+            return ' '
+
+        def rating_max(match):
+            value = _rating_value(match, float(match.group(1)))
+            if value is not None:
+                parsed.rating_max = value if parsed.rating_max is None else min(parsed.rating_max, value)
+            return ' '
+
+        def decade(match):
+            part, century, digit, short = match.groups()
+            if century:
+                start = int(century) * 100 + int(digit) * 10
+            else:
+                start = (2000 if short in '01' else 1900) + int(short) * 10
+            low, high = {'early': (0, 3), 'mid': (3, 6), 'late': (6, 9)}.get(part, (0, 9))
+            parsed.year_min, parsed.year_max = start + low, start + high
+            return ' '
+
+        def year_range(match):
+            parsed.year_min, parsed.year_max = sorted(int(v) for v in match.groups())
+            return ' '
+
+        def year_bound(match):
+            word, year = match.group(1), int(match.group(2))
+            if word in ('before', 'pre', 'until'):
+                parsed.year_max = year - 1 if word != 'until' else year
+            else:
+                parsed.year_min = year + 1 if word in ('after', 'post') else year
+            return ' '
+
+        def year(match):
+            parsed.year_min = parsed.year_max = int(match.group(1) or match.group(2))
+            return ' '
+
+        def lexicon(match):
+            kind, genres = self.lexicon[match.group(0)]
+            if kind == 'genre':
+                parsed.genres.extend(g for g in genres if g not in parsed.genres)
+            else:
+                parsed.moods[match.group(0)] = genres
+            return ' '
+
+        text = RATING_MAX_REGEX.sub(rating_max, text)
+        text = RATING_MIN_REGEX.sub(rating_min, text)
+        text = DECADE_REGEX.sub(decade, text)
+        text = YEAR_RANGE_REGEX.sub(year_range, text)
+        text = YEAR_BOUND_REGEX.sub(year_bound, text)
+        text = YEAR_REGEX.sub(year, text)
+        text = self.lexicon_regex.sub(lexicon, text)
+
+        if not parsed.has_constraints():
+            return parsed
+        words = text.split()
+        while words and words[-1] in CONNECTORS:
+            words.pop()
+        while words and words[0] in CONNECTORS:
+            words.pop(0)
+        if all(w in FILLER_WORDS for w in words):
+            # Plus rien à encoder: le vecteur de la requête décrit les genres et ambiances demandés
+            words = list(parsed.moods) + [g.lower() for g in parsed.genres] + ['movie']
+        parsed.text = " ".join(words)
+        return parsed
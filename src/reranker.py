@@ -0,0 +1,112 @@
+"""
+Second étage de recherche: reranking des meilleurs candidats FAISS par cross-encoder
+Scoring par batch, budget de latence par requête et cache des scores (requête, film)
+"""
+
+from collections import OrderedDict
+import time
+
+import pandas as pd
+from sentence_transformers import CrossEncoder
+
+
+class CrossEncoderReranker:
+    """Rescore les top-N candidats du bi-encoder avec un cross-encoder local"""
+
+    def __init__(self, model_name='cross-encoder/ms-marco-MiniLM-L-6-v2', batch_size=16, cache_size=50000):
+        """
+        Initialise le cross-encoder
+
+        Args:
+            model_name: Nom ou chemin du cross-encoder
+            batch_size: Nombre de paires (requête, film) scorées par batch
+            cache_size: Nombre maximum de scores (requête, film) conservés en cache
+        """
+        print(f"Chargement du cross-encoder: {model_name}")
+        self.model = CrossEncoder(model_name)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @staticmethod
+    def create_rerank_text(movie):
+        """
+        Texte court d'un film pour le cross-encoder
+        Sans les répétitions du texte bi-encoder, qui gaspillent la fenêtre de tokens
+        """
+        parts = []
+        for field in ('title', 'genres', 'keywords', 'plot'):
+            value = movie.get(field)
+            if value is not None and pd.notna(value) and str(value):
+                parts.append(str(value))
+        return ". ".join(parts)
+
+    def _cache_get(self, key):
+        score = self._cache.get(key)
+        if score is not None:
+            self._cache.move_to_end(key)
+        return score
+
+    def _cache_put(self, key, score):
+        self._cache[key] = score
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def score(self, query, candidates, deadline=None):
+        """
+        Score les paires (requête, film) par batch en respectant une échéance
+
+        Args:
+            query: Requête en langage naturel
+            candidates: Liste de tuples (movie_idx, texte du film)
+            deadline: Instant limite (time.perf_counter) ou None pour aucun budget
+
+        Returns:
+            Liste de scores alignée sur candidates, ou None si le budget est dépassé
+        """
+        scores = [None] * len(candidates)
+        pending = []
+
+        for pos, (movie_idx, text) in enumerate(candidates):
+            cached = self._cache_get((query, movie_idx))
+            if cached is not None:
+                scores[pos] = cached
+                self.cache_hits += 1
+            else:
+                pending.append(pos)
+                self.cache_misses += 1
+
+        for start in range(0, len(pending), self.batch_size):
+            if deadline is not None and time.perf_counter() >= deadline:
+                return None
+
+            batch = pending[start:start + self.batch_size]
+            pairs = [[query, candidates[pos][1]] for pos in batch]
+            batch_scores = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+
+            for pos, value in zip(batch, batch_scores):
+                value = float(value)
+                scores[pos] = value
+                self._cache_put((query, candidates[pos][0]), value)
+
+        return scores
+
+    def clear_cache(self):
+        """Vide le cache de scores et remet les compteurs à zéro"""
+        self._cache.clear()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def cache_info(self):
+        """Statistiques du cache de scores"""
+        total = self.cache_hits + self.cache_misses
+        return {
+            'size': len(self._cache),
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'hit_ratio': self.cache_hits / total if total else 0.0
+        }
@@ -0,0 +1,395 @@
+"""
+Serveurs de shards et agrégateur multi-processus / multi-machines
+Chaque shard d'une version (voir sharding.py) est servi par un processus léger qui
+ne charge que son index et ses embeddings. L'API joue le rôle d'agrégateur: elle
+encode la requête, envoie l'embedding une seule fois à chaque shard en float32 brut
+sur des connexions TCP persistantes, puis fusionne les top-k. Les films sont résolus
+localement depuis les tables movies.parquet de la version (stockage partagé).
+
+Protocole (petit-boutiste):
+    requête  = en-tête REQUEST (magic, op, id, n, d, k) + n x d float32
+    réponse  = en-tête RESPONSE (magic, statut, id, n, k) + n x k float32 (distances)
+               + n x k int64 (indices locaux au shard)
+    OP_INFO renvoie un JSON (nom, version, ntotal, d) de n octets
+    Un en-tête hors limites (d différent de celui du shard, n > SHARD_MAX_BATCH, k nul ou
+    supérieur au nombre de films du shard) reçoit le statut d'erreur avant toute lecture du
+    corps, et la connexion est fermée
+
+Usage:
+    python -m src.shard_server --all --base-port 7600     # un processus par shard
+    python -m src.shard_server --shard 2 --port 7602
+    SHARD_SERVERS=127.0.0.1:7600,127.0.0.1:7601 python -m src.app
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import queue
+import signal
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import time
+
+import faiss
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import config
+from logger import configure_logging, get_logger, log_event
+from sharding import ShardedIndex, load_shard, read_shard_manifest, shard_version_dir
+from stub_encoder import StubEncoder
+
+
+MAGIC = b'CSH1'
+OP_SEARCH = 1
+OP_INFO = 2
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+REQUEST = struct.Struct('<4sBIIII')
+RESPONSE = struct.Struct('<4sBIII')
+
+log = get_logger('shard_server')
+
+
+def recv_exactly(sock, size, deadline=None):
+    """
+    Lit exactement size octets
+
+    Args:
+        sock: Socket connectée
+        size: Nombre d'octets attendus
+        deadline: Instant limite (time.monotonic) ou None (bloquant)
+
+    Raises:
+        ConnectionError: si le pair ferme la connexion
+        socket.timeout: si deadline est dépassé
+    """
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout("délai du shard dépassé")
+            sock.settimeout(remaining)
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError("connexion fermée par le pair")
+        received += n
+    return buffer
+
+
+class ShardRequestHandler(socketserver.BaseRequestHandler):
+    """Une connexion persistante: requêtes traitées en séquence jusqu'à la fermeture"""
+
+    def handle(self):
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        shard = self.server.shard
+
+        while True:
+            try:
+                header = recv_exactly(sock, REQUEST.size)
+            except (ConnectionError, OSError):
+                return
+
+            magic, op, request_id, n, d, k = REQUEST.unpack(header)
+            if magic != MAGIC:
+                log_event(log, logging.WARNING, "Requête invalide, connexion fermée", peer=self.client_address)
+                return
+
+            if op == OP_INFO:
+                payload = json.dumps(self.server.info).encode('utf-8')
+                sock.sendall(RESPONSE.pack(MAGIC, STATUS_OK, request_id, len(payload), 0) + payload)
+                continue
+
+            # En-tête validé avant de lire le corps: n x d x 4 octets et k viennent du client
+            error = self.server.check_request(op, n, d, k)
+            if error is not None:
+                log_event(log, logging.WARNING, "Requête refusée, connexion fermée", peer=self.client_address,
+                          error=error)
+                sock.sendall(RESPONSE.pack(MAGIC, STATUS_ERROR, request_id, 0, 0))
+                return
+
+            queries = np.frombuffer(recv_exactly(sock, n * d * 4), dtype='<f4').reshape(n, d)
+            try:
+                distances, indices = shard.search_vectors(queries, k)
+            except Exception as e:
+                log_event(log, logging.ERROR, "Échec de recherche", error=repr(e))
+                sock.sendall(RESPONSE.pack(MAGIC, STATUS_ERROR, request_id, 0, 0))
+                continue
+
+            sock.sendall(b''.join((
+                RESPONSE.pack(MAGIC, STATUS_OK, request_id, n, k),
+                np.ascontiguousarray(distances, dtype='<f4').tobytes(),
+                np.ascontiguousarray(indices, dtype='<i8').tobytes()
+            )))
+
+
+class ShardServer(socketserver.ThreadingTCPServer):
+    """Serveur TCP d'un shard (un thread par connexion persistante)"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, shard, info, max_batch=None):
+        """
+        Args:
+            address: Tuple (hôte, port)
+            shard: MovieRetriever du shard (index et embeddings chargés)
+            info: Dictionnaire renvoyé par OP_INFO (nom, version, ntotal, d)
+            max_batch: Nombre maximum de requêtes par message (défaut: config.SHARD_MAX_BATCH)
+        """
+        super().__init__(address, ShardRequestHandler)
+        self.shard = shard
+        self.info = info
+        self.max_batch = config.SHARD_MAX_BATCH if max_batch is None else max_batch
+
+    def check_request(self, op, n, d, k):
+        """
+        Returns:
+            Motif du refus d'un en-tête de recherche, None s'il est acceptable
+        """
+        if op != OP_SEARCH:
+            return f"opération inconnue: {op}"
+        if d != self.info['d']:
+            return f"dimension {d}, attendue {self.info['d']}"
+        if not 0 < n <= self.max_batch:
+            return f"{n} requêtes (maximum {self.max_batch})"
+        if not 0 < k <= self.info['ntotal']:
+            return f"k={k} (le shard a {self.info['ntotal']} films)"
+        return None
+
+
+class RemoteShard:
+    """Client d'un serveur de shard, utilisable comme shard d'un ShardedIndex"""
+
+    def __init__(self, host, port, timeout_ms=200, name=None, ntotal=None):
+        """
+        Args:
+            host: Hôte du serveur
+            port: Port du serveur
+            timeout_ms: Délai maximal d'une recherche (envoi et réponse)
+            name: Nom du shard (journaux)
+            ntotal: Nombre de films du shard: k est borné à ce nombre (le serveur refuse au-delà)
+        """
+        self.address = (host, port)
+        self.ntotal = ntotal
+        self.timeout = timeout_ms / 1000.0
+        self.name = name or f"{host}:{port}"
+        # Connexions persistantes réutilisées entre requêtes (une par requête concurrente)
+        self._connections = queue.LifoQueue()
+        self._ids = itertools.count(1)
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def _call(self, op, n, d, k, payload=b''):
+        try:
+            sock = self._connections.get_nowait()
+        except queue.Empty:
+            sock = self._connect()
+
+        request_id = next(self._ids) & 0xFFFFFFFF
+        deadline = time.monotonic() + self.timeout
+        try:
+            sock.settimeout(self.timeout)
+            sock.sendall(REQUEST.pack(MAGIC, op, request_id, n, d, k) + payload)
+            magic, status, response_id, rn, rk = RESPONSE.unpack(recv_exactly(sock, RESPONSE.size, deadline))
+            if magic != MAGIC or response_id != request_id:
+                raise ConnectionError("réponse désynchronisée")
+            if op == OP_INFO:
+                body = recv_exactly(sock, rn, deadline)
+            else:
+                body = recv_exactly(sock, rn * rk * 12, deadline) if status == STATUS_OK else b''
+        except BaseException:
+            # Une réponse tardive désynchroniserait la connexion: on la ferme
+            sock.close()
+            raise
+
+        if status != STATUS_OK:
+            # Le serveur ferme la connexion après un en-tête refusé
+            sock.close()
+            raise RuntimeError(f"{self.name}: erreur du serveur")
+        self._connections.put(sock)
+        return rn, rk, body
+
+    def search_vectors(self, embeddings, k):
+        """Même contrat que MovieRetriever.search_vectors (indices locaux au shard)"""
+        embeddings = np.ascontiguousarray(embeddings, dtype='<f4')
+        n, d = embeddings.shape
+        shard_k = min(k, self.ntotal) if self.ntotal else k
+        rn, rk, body = self._call(OP_SEARCH, n, d, shard_k, embeddings.tobytes())
+        distances = np.frombuffer(body, dtype='<f4', count=rn * rk).reshape(rn, rk)
+        indices = np.frombuffer(body, dtype='<i8', offset=rn * rk * 4).reshape(rn, rk)
+        if rk < k:
+            # Shard plus petit que k: colonnes vides, comme un index FAISS local
+            distances = np.pad(distances, ((0, 0), (0, k - rk)), constant_values=np.inf)
+            indices = np.pad(indices, ((0, 0), (0, k - rk)), constant_values=-1)
+        return distances, indices
+
+    def info(self):
+        _, _, body = self._call(OP_INFO, 0, 0, 0)
+        return json.loads(bytes(body))
+
+    def close(self):
+        while not self._connections.empty():
+            self._connections.get_nowait().close()
+
+
+def parse_servers(servers):
+    """'hôte:port,hôte:port' -> liste de tuples (hôte, port)"""
+    addresses = []
+    for server in servers.split(',') if isinstance(servers, str) else servers:
+        host, port = server.strip().rsplit(':', 1)
+        addresses.append((host, int(port)))
+    return addresses
+
+
+def attach_remote_shards(retriever, shards_dir, servers, timeout_ms=None, allow_partial=None, version=None):
+    """
+    Branche le retriever sur des serveurs de shards (un serveur par shard, dans l'ordre du manifeste)
+
+    Args:
+        retriever: MovieRetriever (seul son encodeur est conservé)
+        shards_dir: Dossier racine des versions (tables de films)
+        servers: 'hôte:port,...' ou liste
+        timeout_ms: Délai par shard (défaut: config.SHARD_TIMEOUT_MS)
+        allow_partial: Tolère des shards en échec (défaut: config.SHARD_ALLOW_PARTIAL)
+        version: Version attendue (défaut: version courante)
+
+    Returns:
+        Manifeste de la version servie
+    """
+    manifest = read_shard_manifest(shards_dir, version)
+    if manifest is None:
+        raise FileNotFoundError(f"Aucun manifeste de shards dans {shards_dir}")
+
+    addresses = parse_servers(servers)
+    if len(addresses) != len(manifest['shards']):
+        raise ValueError(f"{len(addresses)} serveurs pour {len(manifest['shards'])} shards")
+
+    timeout_ms = config.SHARD_TIMEOUT_MS if timeout_ms is None else timeout_ms
+    allow_partial = config.SHARD_ALLOW_PARTIAL if allow_partial is None else allow_partial
+    version_dir = shard_version_dir(shards_dir, manifest['version'])
+
+    shards, frames = [], []
+    for entry, (host, port) in zip(manifest['shards'], addresses):
+        shard = RemoteShard(host, port, timeout_ms=timeout_ms, name=entry['name'], ntotal=entry['n_movies'])
+        try:
+            info = shard.info()
+            if info['version'] != manifest['version'] or info['ntotal'] != entry['n_movies']:
+                raise ValueError(f"{entry['name']}: le serveur {host}:{port} sert {info}, "
+                                 f"attendu version {manifest['version']}")
+        except OSError as e:
+            log_event(log, logging.WARNING, "Serveur de shard injoignable au démarrage",
+                      shard=entry['name'], server=f"{host}:{port}", error=repr(e))
+        shards.append(shard)
+        frames.append(pd.read_parquet(os.path.join(version_dir, entry['name'], 'movies.parquet')))
+
+    retriever.set_movies(pd.concat(frames, ignore_index=True))
+    retriever.index = ShardedIndex(
+        shards, [entry['n_movies'] for entry in manifest['shards']], manifest['dimension'],
+        names=[entry['name'] for entry in manifest['shards']], allow_partial=allow_partial
+    )
+    retriever.quantization = {'storage': 'float'}
+    retriever.embeddings = None
+
+    return manifest
+
+
+def serve_shard(shard_number, host, port, version=None):
+    """Charge un shard de la version et le sert jusqu'à l'arrêt du processus"""
+    manifest = read_shard_manifest(config.SHARDS_DIR, version)
+    if manifest is None:
+        print(f"Erreur: aucun shard publié dans {config.SHARDS_DIR} (python -m src.sharding)")
+        sys.exit(1)
+
+    entry = manifest['shards'][shard_number]
+    path = os.path.join(shard_version_dir(config.SHARDS_DIR, manifest['version']), entry['name'])
+    # Le serveur reçoit des embeddings déjà calculés: aucun modèle n'est chargé
+    shard = load_shard(path, StubEncoder(manifest['dimension']))
+
+    info = {'name': entry['name'], 'version': manifest['version'],
+            'ntotal': len(shard.movies_df), 'd': manifest['dimension']}
+    server = ShardServer((host, port), shard, info)
+    log_event(log, logging.INFO, "Serveur de shard prêt", address=f"{host}:{port}", **info)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def serve_all(host, base_port, version=None, threads=None):
+    """Lance un processus par shard de la version (tests sur une seule machine)"""
+    manifest = read_shard_manifest(config.SHARDS_DIR, version)
+    if manifest is None:
+        print(f"Erreur: aucun shard publié dans {config.SHARDS_DIR} (python -m src.sharding)")
+        sys.exit(1)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    # Arrêter le lanceur arrête aussi les serveurs
+    signal.signal(signal.SIGTERM, stop)
+
+    processes = []
+    for i in range(len(manifest['shards'])):
+        command = [sys.executable, '-m', 'src.shard_server', '--shard', str(i), '--host', host,
+                   '--port', str(base_port + i), '--version', str(manifest['version'])]
+        if threads:
+            command += ['--threads', str(threads)]
+        processes.append(subprocess.Popen(command))
+
+    servers = ','.join(f"{host}:{base_port + i}" for i in range(len(processes)))
+    print(f"{len(processes)} serveurs de shards (version {manifest['version']})")
+    print(f"SHARD_SERVERS={servers}")
+
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.send_signal(signal.SIGTERM)
+        for process in processes:
+            process.wait()
+
+
+def main(argv=None):
+    """Point d'entrée des serveurs de shards"""
+    parser = argparse.ArgumentParser(description="Serveur de shard CineSphere")
+    parser.add_argument('--shard', type=int, default=None, help="Numéro du shard servi")
+    parser.add_argument('--all', action='store_true', help="Un processus par shard")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7600)
+    parser.add_argument('--base-port', type=int, default=7600, help="Port du premier shard (--all)")
+    parser.add_argument('--version', type=int, default=None, help="Version des shards (défaut: courante)")
+    parser.add_argument('--threads', type=int, default=None, help="Threads OpenMP de FAISS par processus")
+    args = parser.parse_args(argv)
+
+    configure_logging(config.LOG_LEVEL)
+
+    if args.all:
+        serve_all(args.host, args.base_port, args.version, args.threads)
+    elif args.shard is not None:
+        if args.threads:
+            faiss.omp_set_num_threads(args.threads)
+        serve_shard(args.shard, args.host, args.port, args.version)
+    else:
+        parser.error("--shard ou --all requis")
+
+
+if __name__ == "__main__":
+    main()
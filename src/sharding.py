@@ -0,0 +1,361 @@
+"""
+Index FAISS partitionné en shards
+Le catalogue est découpé par hash de l'identifiant du film ou par décennie de sortie;
+chaque shard a son propre index, ses embeddings et sa table de films. Réduction de dimension,
+quantification et centroïdes sont entraînés une seule fois sur tout le catalogue puis partagés
+par les shards: leurs distances sont dans le même espace et comparables. Une requête
+est envoyée à tous les shards en parallèle (FAISS relâche le GIL pendant la
+recherche) puis les top-k de chaque shard sont fusionnés par un tas avant le score
+hybride et le reranking.
+
+Sur disque, chaque construction produit une version complète:
+    shards/v0003/manifest.json
+    shards/v0003/shard-00/{index.bin, index_quantization.json, embeddings.npy, movies.parquet}
+    shards/manifest.json          (copie du manifeste de la version courante)
+
+Usage:
+    python -m src.sharding --shards 8
+    python -m src.sharding --strategy decade --storage int8
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import datetime
+import heapq
+import itertools
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+import zlib
+
+import faiss
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import config
+from movie_retriever import MovieRetriever, INDEX_TYPES, REDUCTIONS, STORAGE_MODES
+from artifacts import reusable_embeddings
+from logger import get_logger, log_event
+
+
+MANIFEST_FILE = 'manifest.json'
+SHARD_STRATEGIES = ('hash', 'decade')
+MANIFEST_FORMAT = 1
+
+log = get_logger('shards')
+
+
+def shard_keys(movies_df, n_shards=4, strategy='hash'):
+    """
+    Clé de shard de chaque film
+
+    Args:
+        movies_df: Catalogue (colonnes id et year)
+        n_shards: Nombre de shards pour 'hash' (ignoré pour 'decade')
+        strategy: 'hash' (crc32 de l'identifiant, répartition uniforme et stable)
+            ou 'decade' (décennie de sortie, 'unknown' si l'année manque)
+
+    Returns:
+        Liste des clés, une par film
+    """
+    if strategy == 'hash':
+        return [f"{zlib.crc32(str(movie_id).encode('utf-8')) % n_shards:02d}" for movie_id in movies_df['id']]
+    if strategy == 'decade':
+        years = pd.to_numeric(movies_df['year'], errors='coerce')
+        return [f"{int(y) // 10 * 10}s" if pd.notna(y) else 'unknown' for y in years]
+    raise ValueError(f"Stratégie inconnue: {strategy} (attendu: {', '.join(SHARD_STRATEGIES)})")
+
+
+def _shard_stream(distances, indices, offset):
+    """Voisins d'un shard (déjà triés) en (distance, indice global)"""
+    return ((float(d), int(i) + offset) for d, i in zip(distances, indices) if i >= 0)
+
+
+def merge_topk(shard_results, offsets, k):
+    """
+    Fusionne les top-k triés de chaque shard en un top-k global
+
+    Args:
+        shard_results: Liste de tuples (distances, indices locaux), un par shard
+        offsets: Position du premier film de chaque shard dans le catalogue global
+        k: Nombre de voisins à garder
+
+    Returns:
+        Tuple (distances, indices globaux) de forme (n, k), indice -1 si absent
+    """
+    n_queries = len(shard_results[0][0])
+    distances = np.full((n_queries, k), np.inf, dtype='float32')
+    indices = np.full((n_queries, k), -1, dtype='int64')
+
+    for row in range(n_queries):
+        streams = [
+            _shard_stream(shard_d[row], shard_i[row], offset)
+            for (shard_d, shard_i), offset in zip(shard_results, offsets)
+        ]
+        for col, (distance, idx) in enumerate(itertools.islice(heapq.merge(*streams), k)):
+            distances[row, col] = distance
+            indices[row, col] = idx
+
+    return distances, indices
+
+
+class ShardedIndex:
+    """
+    Se comporte comme un index FAISS (search, ntotal, d) au-dessus de plusieurs shards
+    Un shard est tout objet exposant search_vectors(embeddings, k): MovieRetriever local
+    ou client d'un serveur de shard (voir shard_server.RemoteShard)
+    """
+
+    def __init__(self, shards, sizes, dimension, threads=None, names=None, allow_partial=False):
+        """
+        Args:
+            shards: Liste des shards
+            sizes: Nombre de films de chaque shard
+            dimension: Dimension des embeddings de requête
+            threads: Threads de recherche (défaut: un par shard)
+            names: Noms des shards (journaux, métriques)
+            allow_partial: Un shard en échec (timeout, connexion) est ignoré au lieu de
+                faire échouer la recherche; les résultats sont alors partiels
+        """
+        self.shards = shards
+        self.sizes = list(sizes)
+        self.offsets = [0] + list(itertools.accumulate(self.sizes))[:-1]
+        self.ntotal = sum(self.sizes)
+        self.d = dimension
+        self.names = list(names) if names else [f"shard-{i:02d}" for i in range(len(shards))]
+        self.allow_partial = allow_partial
+        self.errors = {name: 0 for name in self.names}
+        self.pool = ThreadPoolExecutor(max_workers=threads or len(shards), thread_name_prefix='shard')
+        self._local = threading.local()
+
+    def search(self, embeddings, k):
+        futures = [self.pool.submit(shard.search_vectors, embeddings, k) for shard in self.shards]
+
+        results = []
+        missing = []
+        for name, future in zip(self.names, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                if not self.allow_partial:
+                    raise
+                self.errors[name] += 1
+                missing.append(name)
+                log_event(log, logging.WARNING, "Shard ignoré", shard=name, error=repr(e))
+                results.append((np.empty((len(embeddings), 0), dtype='float32'),
+                                np.empty((len(embeddings), 0), dtype='int64')))
+
+        if len(missing) == len(self.shards):
+            raise RuntimeError(f"Aucun shard n'a répondu ({', '.join(missing)})")
+
+        self._local.missing = missing
+        return merge_topk(results, self.offsets, k)
+
+    def missing_shards(self):
+        """Shards absents de la dernière recherche du thread courant (résultats partiels)"""
+        return list(getattr(self._local, 'missing', []))
+
+    def project(self, embeddings):
+        """Espace des distances des shards (transformation commune, voir build_shards)"""
+        return self.shards[0].project(embeddings)
+
+
+def shard_version_dir(shards_dir, version):
+    return os.path.join(shards_dir, f"v{version:04d}")
+
+
+def read_shard_manifest(shards_dir, version=None):
+    """
+    Manifeste de la version demandée (défaut: version courante)
+
+    Returns:
+        Dictionnaire du manifeste, None si aucune version n'a été publiée
+    """
+    path = os.path.join(shards_dir, MANIFEST_FILE)
+    if version is not None:
+        path = os.path.join(shard_version_dir(shards_dir, version), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _build_shard(path, model, movies_df, embeddings, template):
+    shard = MovieRetriever(model=model)
+    shard.set_movies(movies_df.reset_index(drop=True))
+    shard.embeddings = embeddings
+    # Copie de l'index entraîné sur tout le catalogue: même réduction, même quantification
+    if isinstance(template.index, faiss.IndexBinary):
+        shard.index = faiss.clone_binary_index(template.index)
+    else:
+        shard.index = faiss.clone_index(template.index)
+    shard.quantization = dict(template.quantization)
+    shard.add_to_index(embeddings)
+
+    os.makedirs(path)
+    shard.save_index(os.path.join(path, 'index.bin'), os.path.join(path, 'embeddings.npy'))
+    shard.movies_df.to_parquet(os.path.join(path, 'movies.parquet'), index=False)
+
+
+def build_shards(retriever, shards_dir, n_shards=4, strategy='hash', index_type='flat', dim=None,
+                 reduction='pca', storage='float', workers=None):
+    """
+    Partitionne le catalogue et construit tous les shards en parallèle, dans une nouvelle version
+
+    Args:
+        retriever: MovieRetriever avec catalogue et embeddings
+        shards_dir: Dossier racine des versions
+        n_shards: Nombre de shards (stratégie 'hash')
+        strategy: Voir shard_keys
+        index_type, dim, reduction, storage: Paramètres d'index (voir MovieRetriever.build_index)
+        workers: Shards construits simultanément (défaut: tous)
+
+    Returns:
+        Manifeste de la version publiée
+    """
+    keys = np.asarray(shard_keys(retriever.movies_df, n_shards, strategy))
+    shard_names = sorted(set(keys.tolist()))
+
+    previous = read_shard_manifest(shards_dir)
+    version = previous['version'] + 1 if previous else 1
+    version_dir = shard_version_dir(shards_dir, version)
+    tmp_dir = f"{version_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    start = time.time()
+    # Index vide entraîné une fois sur tout le catalogue (PCA, bornes int8, seuils binaires,
+    # centroïdes IVF), dimensionné pour le plus grand shard
+    template = MovieRetriever(model=retriever.model)
+    template.init_index(retriever.embeddings, index_type=index_type, dim=dim, reduction=reduction,
+                        storage=storage, n_vectors=max(int((keys == key).sum()) for key in shard_names))
+
+    entries = []
+    with ThreadPoolExecutor(max_workers=workers or len(shard_names)) as pool:
+        futures = []
+        for i, key in enumerate(shard_names):
+            rows = np.flatnonzero(keys == key)
+            name = f"shard-{i:02d}"
+            entries.append({'name': name, 'key': key, 'n_movies': int(len(rows))})
+            futures.append(pool.submit(
+                _build_shard, os.path.join(tmp_dir, name), retriever.model, retriever.movies_df.iloc[rows],
+                np.ascontiguousarray(retriever.embeddings[rows], dtype='float32'), template
+            ))
+        for future in futures:
+            future.result()
+
+    manifest = {
+        'format': MANIFEST_FORMAT,
+        'version': version,
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'strategy': strategy,
+        'index_type': index_type,
+        'dim': dim,
+        'reduction': reduction,
+        'storage': storage,
+        'dimension': int(retriever.embeddings.shape[1]),
+        'n_movies': int(len(retriever.movies_df)),
+        'build_seconds': round(time.time() - start, 2),
+        'shards': entries
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Publication: la version complète apparaît d'un coup, puis devient courante
+    os.replace(tmp_dir, version_dir)
+    current_tmp = os.path.join(shards_dir, f"{MANIFEST_FILE}.tmp")
+    shutil.copyfile(os.path.join(version_dir, MANIFEST_FILE), current_tmp)
+    os.replace(current_tmp, os.path.join(shards_dir, MANIFEST_FILE))
+
+    return manifest
+
+
+def load_shard(path, model):
+    """Charge un shard (index, embeddings et table de films) dans un MovieRetriever"""
+    shard = MovieRetriever(model=model)
+    shard.set_movies(pd.read_parquet(os.path.join(path, 'movies.parquet')))
+    shard.load_index(os.path.join(path, 'index.bin'), os.path.join(path, 'embeddings.npy'))
+    return shard
+
+
+def attach_shards(retriever, shards_dir, version=None, threads=None):
+    """
+    Remplace le catalogue et l'index du retriever par les shards d'une version
+
+    Args:
+        retriever: MovieRetriever (seul son encodeur est conservé)
+        shards_dir: Dossier racine des versions
+        version: Version à charger (défaut: version courante)
+        threads: Threads de recherche (défaut: config.SHARD_SEARCH_THREADS, 0: un par shard)
+
+    Returns:
+        Manifeste de la version chargée
+    """
+    manifest = read_shard_manifest(shards_dir, version)
+    if manifest is None:
+        raise FileNotFoundError(f"Aucun manifeste de shards dans {shards_dir}")
+
+    version_dir = shard_version_dir(shards_dir, manifest['version'])
+    paths = [os.path.join(version_dir, entry['name']) for entry in manifest['shards']]
+    with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+        shards = list(pool.map(lambda path: load_shard(path, retriever.model), paths))
+
+    retriever.set_movies(pd.concat([shard.movies_df for shard in shards], ignore_index=True))
+    retriever.index = ShardedIndex(
+        shards, [len(shard.movies_df) for shard in shards], manifest['dimension'],
+        threads=config.SHARD_SEARCH_THREADS if threads is None else threads,
+        names=[entry['name'] for entry in manifest['shards']]
+    )
+    retriever.quantization = {'storage': 'float'}
+    # Embeddings float conservés par shard uniquement (rescoring local)
+    retriever.embeddings = None
+
+    return manifest
+
+
+def main(argv=None):
+    """Construit une nouvelle version des shards à partir des embeddings du catalogue"""
+    parser = argparse.ArgumentParser(description="Construction de l'index partitionné")
+    parser.add_argument('--shards', type=int, default=config.SHARD_COUNT, help="Nombre de shards (hash)")
+    parser.add_argument('--strategy', choices=SHARD_STRATEGIES, default=config.SHARD_STRATEGY)
+    parser.add_argument('--index-type', choices=INDEX_TYPES, default=config.INDEX_TYPE)
+    parser.add_argument('--dim', type=int, default=config.INDEX_DIM)
+    parser.add_argument('--reduction', choices=REDUCTIONS, default=config.INDEX_REDUCTION)
+    parser.add_argument('--storage', choices=STORAGE_MODES, default=config.INDEX_STORAGE)
+    parser.add_argument('--workers', type=int, default=None, help="Shards construits simultanément")
+    args = parser.parse_args(argv)
+
+    print("\n" + "="*70)
+    print("CONSTRUCTION DE L'INDEX PARTITIONNÉ")
+    print("="*70 + "\n")
+
+    retriever = MovieRetriever(use_trained=True)
+    retriever.load_movies(config.MOVIES_CSV)
+
+    embeddings_path = reusable_embeddings(config.ARTIFACTS_DIR, config.MOVIES_CSV, retriever.model_path)
+    if embeddings_path is not None:
+        print(f"Réutilisation des embeddings: {embeddings_path}")
+        retriever.embeddings = np.load(embeddings_path)
+    else:
+        retriever.embeddings = retriever.generate_embeddings()
+
+    manifest = build_shards(
+        retriever, config.SHARDS_DIR, n_shards=args.shards, strategy=args.strategy,
+        index_type=args.index_type, dim=args.dim, reduction=args.reduction, storage=args.storage,
+        workers=args.workers
+    )
+
+    print(f"\nVersion {manifest['version']} publiée dans {config.SHARDS_DIR} "
+          f"({manifest['build_seconds']} s):")
+    for entry in manifest['shards']:
+        print(f"   {entry['name']} [{entry['key']}]: {entry['n_movies']} films")
+    print("\nActivez-la dans l'API avec USE_SHARDS=1")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Encodeur de substitution déterministe et quasi gratuit
+Remplace le modèle dans l'API pour mesurer le coût du serveur seul (tests de charge)
+"""
+
+import zlib
+
+import numpy as np
+
+
+class StubEncoder:
+    """Hachage des mots dans un vecteur normalisé, même interface que SentenceTransformer.encode"""
+
+    def __init__(self, dimension=384):
+        """
+        Args:
+            dimension: Dimension des vecteurs produits (doit correspondre à l'index)
+        """
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        """
+        Encode une phrase ou une liste de phrases
+
+        Returns:
+            Vecteur (dimension,) ou matrice (n, dimension) float32 normalisés
+        """
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        embeddings = np.zeros((len(sentences), self.dimension), dtype='float32')
+        for row, text in enumerate(sentences):
+            for token in str(text).lower().split():
+                h = zlib.crc32(token.encode('utf-8'))
+                embeddings[row, h % self.dimension] += 1.0 if (h >> 31) & 1 else -1.0
+
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.maximum(norms, 1e-12)
+
+        return embeddings[0] if single else embeddings
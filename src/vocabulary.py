@@ -0,0 +1,72 @@
+"""
+Vocabulaires partagés: descripteurs de genre, thèmes et décors
+Utilisés par le générateur de paires d'entraînement (requêtes synthétiques) et par
+l'analyseur de requêtes de l'API (contraintes de genre et d'ambiance)
+"""
+
+
+GENRE_DESCRIPTORS = {
+    'Action': [
+        'explosive', 'high-octane', 'adrenaline-fueled', 'intense',
+        'fight scenes', 'chase sequences', 'battles', 'combat'
+    ],
+    'Drama': [
+        'emotional', 'powerful', 'moving', 'touching', 'deep',
+        'character-driven', 'realistic', 'serious', 'profound'
+    ],
+    'Comedy': [
+        'funny', 'hilarious', 'humorous', 'laugh-out-loud', 'witty',
+        'lighthearted', 'comedic', 'amusing', 'entertaining'
+    ],
+    'Horror': [
+        'scary', 'terrifying', 'creepy', 'frightening', 'suspenseful',
+        'disturbing', 'chilling', 'haunting', 'nightmarish'
+    ],
+    'Romance': [
+        'romantic', 'love story', 'heartwarming', 'passionate',
+        'relationship', 'falling in love', 'tender', 'intimate'
+    ],
+    'Science Fiction': [
+        'futuristic', 'sci-fi', 'space', 'technology', 'aliens',
+        'dystopian', 'advanced civilization', 'time travel', 'robots'
+    ],
+    'Thriller': [
+        'suspenseful', 'tense', 'gripping', 'edge-of-seat', 'mystery',
+        'psychological', 'intense', 'nail-biting', 'twisting'
+    ],
+    'Fantasy': [
+        'magical', 'mythical', 'enchanted', 'supernatural', 'epic',
+        'wizards', 'dragons', 'mythological', 'otherworldly'
+    ],
+    'Animation': [
+        'animated', 'cartoon', 'family-friendly', 'colorful',
+        'for kids', 'CGI', 'hand-drawn', 'Pixar-style'
+    ],
+    'Adventure': [
+        'thrilling journey', 'quest', 'exploration', 'expedition',
+        'treasure hunt', 'discovery', 'daring', 'heroic'
+    ]
+}
+
+THEMES = {
+    'revenge': ['seeking revenge', 'vendetta', 'payback', 'retribution'],
+    'friendship': ['bond between friends', 'friendship', 'companions', 'allies'],
+    'family': ['family bonds', 'parent-child', 'siblings', 'family drama'],
+    'survival': ['fight for survival', 'staying alive', 'survival against odds'],
+    'redemption': ['seeking redemption', 'second chance', 'atonement'],
+    'coming-of-age': ['growing up', 'loss of innocence', 'self-discovery'],
+    'war': ['wartime', 'battlefield', 'military conflict', 'soldiers'],
+    'crime': ['criminal underworld', 'heist', 'organized crime', 'gangsters'],
+    'identity': ['finding oneself', 'identity crisis', 'who am I'],
+    'sacrifice': ['ultimate sacrifice', 'giving up everything', 'selflessness']
+}
+
+SETTINGS = {
+    'urban': ['city', 'metropolitan', 'urban setting', 'downtown'],
+    'rural': ['countryside', 'small town', 'rural', 'village'],
+    'space': ['outer space', 'spaceship', 'alien planet', 'galaxy'],
+    'historical': ['period piece', 'historical setting', 'based on true events'],
+    'fantasy_world': ['fantasy realm', 'magical world', 'mythical land'],
+    'underwater': ['under the sea', 'ocean depths', 'underwater world'],
+    'post_apocalyptic': ['after apocalypse', 'dystopian future', 'wasteland']
+}
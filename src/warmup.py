@@ -0,0 +1,195 @@
+"""
+Préchauffage de l'API au démarrage
+Un processus qui vient de démarrer sert ses premiers utilisateurs avec des caches vides
+et des noyaux torch non initialisés. Le préchauffage encode quelques textes factices de
+longueurs différentes (initialisations paresseuses), puis rejoue les requêtes les plus
+fréquentes du journal de requêtes ou d'un fichier: le cache d'embeddings et le cache de
+scores du reranker sont remplis avant que /api/health ne réponde "ready".
+
+Il n'y a pas de cache de résultats à préremplir: le CursorStore (src/pagination.py) ne
+conserve une liste classée que sous un curseur opaque remis au client, il ne sert pas
+une nouvelle recherche. Le rejeu passe par search_deep, le même chemin que /api/search
+(analyse, encodage, FAISS, score hybride, reranking, liste classée de SEARCH_MAX_DEPTH):
+ce sont ces étapes, et leurs caches, qui sont préchauffées.
+"""
+
+from collections import Counter
+import glob
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from logger import get_logger, log_event
+
+
+log = get_logger('warmup')
+
+# Requêtes de repli (exemples de la documentation) quand aucun journal ni fichier n'est configuré
+DEFAULT_QUERIES = [
+    "romantic movie on a sinking cruise ship",
+    "AI falls in love with lonely writer",
+    "dreams within dreams heist",
+    "chef rat controls human cooking",
+    "toys that come to life and question existence",
+    "time loop comedy repeat same day",
+    "scary 90s movie",
+    "animated movie rated above 8"
+]
+
+# Longueurs (en mots) des encodages factices: les formes de tenseurs rencontrées ensuite
+# sont déjà initialisées
+DUMMY_LENGTHS = (1, 4, 16, 64, 256)
+
+
+def _open_log(path):
+    return gzip.open(path, 'rt', encoding='utf-8') if path.endswith('.gz') else open(path, encoding='utf-8')
+
+
+def top_logged_queries(pattern, n):
+    """
+    Requêtes les plus fréquentes d'un journal de requêtes JSON lines
+
+    Args:
+        pattern: Fichier, dossier ou motif glob (fichiers .jsonl ou .jsonl.gz)
+        n: Nombre de requêtes renvoyées
+
+    Returns:
+        Liste des n requêtes les plus fréquentes (les plus fréquentes d'abord)
+    """
+    if not os.path.exists(pattern) and not glob.has_magic(pattern):
+        return []
+    paths = glob.glob(os.path.join(pattern, '*.jsonl*')) if os.path.isdir(pattern) else glob.glob(pattern)
+    counts = Counter()
+    for path in sorted(paths):
+        with _open_log(path) as f:
+            try:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    query = record.get('query') if isinstance(record, dict) else None
+                    if query and record.get('offset', 0) == 0:
+                        counts[query.strip()] += 1
+            except (EOFError, OSError, ValueError):
+                # Fichier tronqué par un arrêt brutal: les lignes lues jusque-là sont comptées
+                pass
+    return [query for query, _ in counts.most_common(n)]
+
+
+def load_queries_file(path):
+    """
+    Requêtes d'un fichier: texte (une par ligne), CSV ou JSONL avec une colonne query
+    (par exemple le fichier de requêtes de training.evaluate)
+    """
+    if path.endswith('.csv'):
+        return pd.read_csv(path)['query'].dropna().astype(str).tolist()
+    if path.endswith('.jsonl'):
+        return pd.read_json(path, lines=True)['query'].dropna().astype(str).tolist()
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def warmup_queries(n, query_log=None, queries_file=None):
+    """
+    Requêtes à rejouer: journal de requêtes puis fichier, dédupliquées, au plus n
+
+    Args:
+        n: Nombre maximum de requêtes
+        query_log: Journal de requêtes (voir top_logged_queries)
+        queries_file: Fichier de requêtes (voir load_queries_file)
+
+    Returns:
+        Liste de requêtes (DEFAULT_QUERIES si aucune source n'en fournit, ex. journal encore vide)
+    """
+    queries = []
+    if query_log:
+        queries += top_logged_queries(query_log, n)
+    if queries_file and os.path.exists(queries_file):
+        queries += load_queries_file(queries_file)
+    if not queries:
+        queries = list(DEFAULT_QUERIES)
+    return list(dict.fromkeys(queries))[:n]
+
+
+class Warmup:
+    """Préchauffage exécuté dans un thread: l'API répond pendant ce temps mais n'est pas "ready" """
+
+    def __init__(self, retriever, queries, top_k=10, max_depth=200, dummy_lengths=DUMMY_LENGTHS):
+        """
+        Args:
+            retriever: MovieRetriever de l'API
+            queries: Requêtes à rejouer, ou fonction qui les renvoie (appelée dans le thread de
+                préchauffage: la lecture du journal ne retarde pas le démarrage)
+            top_k: Profondeur de la première page (comme /api/search)
+            max_depth: Profondeur de la liste classée (comme /api/search)
+            dummy_lengths: Longueurs des encodages factices
+        """
+        self.retriever = retriever
+        self.queries = queries
+        self.top_k = top_k
+        self.max_depth = max_depth
+        self.dummy_lengths = dummy_lengths
+        self.done = threading.Event()
+        self.report = {'status': 'pending'}
+
+    @property
+    def ready(self):
+        return self.done.is_set()
+
+    def run(self):
+        """
+        Exécute le préchauffage (bloquant)
+
+        Returns:
+            Rapport: durées par phase, requêtes rejouées et en échec
+        """
+        start = time.perf_counter()
+        self.report = {'status': 'running'}
+        try:
+            if callable(self.queries):
+                self.queries = self.queries()
+            self.report['queries'] = len(self.queries)
+            loaded = time.perf_counter()
+            for length in self.dummy_lengths:
+                self.retriever.model.encode([" ".join(["movie"] * length)])
+            encoded = time.perf_counter()
+
+            failed = 0
+            for query in self.queries:
+                try:
+                    self.retriever.search_deep(query, top_k=self.top_k, max_depth=self.max_depth, adaptive=True)
+                except Exception as e:
+                    failed += 1
+                    log_event(log, logging.WARNING, "Requête de préchauffage en échec", query=query, error=repr(e))
+
+            self.report = {
+                'status': 'done',
+                'queries': len(self.queries),
+                'failed': failed,
+                'load_queries_s': round(loaded - start, 3),
+                'dummy_encode_s': round(encoded - loaded, 3),
+                'replay_s': round(time.perf_counter() - encoded, 3),
+                'duration_s': round(time.perf_counter() - start, 3)
+            }
+        except Exception as e:
+            # Un préchauffage raté ne doit pas empêcher de servir: l'API passe "ready" à froid
+            log_event(log, logging.ERROR, "Préchauffage interrompu", error=repr(e))
+            self.report = {'status': 'failed', 'error': str(e),
+                           'duration_s': round(time.perf_counter() - start, 3)}
+        finally:
+            self.done.set()
+
+        log_event(log, logging.INFO, "Préchauffage terminé", **self.report)
+        return self.report
+
+    def start(self):
+        """Lance le préchauffage dans un thread démon"""
+        thread = threading.Thread(target=self.run, name='warmup', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,104 @@
+"""
+Checkpoints d'entraînement reprenables
+Chaque checkpoint contient le modèle et l'état du trainer (optimiseur, scheduler,
+position dans l'époque, meilleur score, générateurs aléatoires). L'écriture passe
+par un dossier temporaire renommé à la fin: un arrêt brutal (préemption) ne laisse
+jamais de checkpoint partiel.
+"""
+
+import glob
+import os
+import random
+import re
+import shutil
+
+import numpy as np
+import torch
+
+import config
+
+
+CHECKPOINTS_DIR = 'checkpoints'
+STATE_FILE = 'trainer_state.pt'
+
+
+def _checkpoint_step(path):
+    match = re.search(r'step-(\d+)$', path)
+    return int(match.group(1)) if match else -1
+
+
+def list_checkpoints(checkpoint_dir):
+    """Checkpoints complets, du plus ancien au plus récent"""
+    paths = [p for p in glob.glob(os.path.join(checkpoint_dir, 'step-*')) if _checkpoint_step(p) >= 0]
+    return sorted(paths, key=_checkpoint_step)
+
+
+def latest_checkpoint(checkpoint_dir):
+    """Chemin du dernier checkpoint complet (None s'il n'y en a pas)"""
+    checkpoints = list_checkpoints(checkpoint_dir)
+    return checkpoints[-1] if checkpoints else None
+
+
+def save_checkpoint(checkpoint_dir, model, optimizer, scheduler, state, keep=None):
+    """
+    Écrit un checkpoint de façon atomique et supprime les plus anciens
+
+    Args:
+        checkpoint_dir: Dossier des checkpoints
+        model: SentenceTransformer
+        optimizer: Optimiseur torch
+        scheduler: Scheduler du taux d'apprentissage
+        state: Dictionnaire d'état (global_step, epoch, batches_done, best_score)
+        keep: Nombre de checkpoints conservés (défaut: config.TRAIN_CHECKPOINT_LIMIT)
+
+    Returns:
+        Chemin du checkpoint
+    """
+    keep = config.TRAIN_CHECKPOINT_LIMIT if keep is None else keep
+    path = os.path.join(checkpoint_dir, f"step-{state['global_step']:07d}")
+    tmp_path = f"{path}.tmp"
+
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    model.save(os.path.join(tmp_path, 'model'))
+    torch.save({
+        'state': dict(state),
+        'optimizer': optimizer.state_dict(),
+        'scheduler': scheduler.state_dict(),
+        'rng': {
+            'python': random.getstate(),
+            'numpy': np.random.get_state(),
+            'torch': torch.get_rng_state(),
+            'cuda': torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None
+        }
+    }, os.path.join(tmp_path, STATE_FILE))
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+    for old in list_checkpoints(checkpoint_dir)[:-keep] if keep > 0 else []:
+        shutil.rmtree(old, ignore_errors=True)
+
+    return path
+
+
+def load_checkpoint(path, optimizer, scheduler):
+    """
+    Restaure l'optimiseur, le scheduler et les générateurs aléatoires
+    (le modèle se charge depuis <path>/model avec SentenceTransformer)
+
+    Returns:
+        Dictionnaire d'état sauvegardé
+    """
+    checkpoint = torch.load(os.path.join(path, STATE_FILE), weights_only=False)
+    optimizer.load_state_dict(checkpoint['optimizer'])
+    scheduler.load_state_dict(checkpoint['scheduler'])
+
+    rng = checkpoint['rng']
+    random.setstate(rng['python'])
+    np.random.set_state(rng['numpy'])
+    torch.set_rng_state(rng['torch'])
+    if rng['cuda'] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(rng['cuda'])
+
+    return checkpoint['state']
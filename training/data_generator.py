@@ -7,12 +7,22 @@ import pandas as pd
 import numpy as np
 import random
 import re
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict
+import json
 import os
+import shutil
 import sys
 
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
 import config
+from vocabulary import GENRE_DESCRIPTORS, SETTINGS, THEMES
+
+from training.pair_store import (
+    MANIFEST_FILE, MOVIE_SCHEMA, MOVIES_DIR, PAIR_SCHEMA, TOKEN_CACHE_DIR, TRIPLETS_DIR, LevelReservoir,
+    ShardWriter,
+    read_movie_texts, shard_paths, split_for
+)
 
 
 class CurriculumDataGenerator:
@@ -26,64 +36,12 @@ class CurriculumDataGenerator:
         4. Requêtes multi-concepts complexes
     """
     
-    def __init__(self, movies_df):
+    def __init__(self, movies_df, seed=42):
         self.movies_df = movies_df
+        self.seed = seed
         
-        self.genre_descriptors = {
-            'Action': [
-                'explosive', 'high-octane', 'adrenaline-fueled', 'intense',
-                'fight scenes', 'chase sequences', 'battles', 'combat'
-            ],
-            'Drama': [
-                'emotional', 'powerful', 'moving', 'touching', 'deep',
-                'character-driven', 'realistic', 'serious', 'profound'
-            ],
-            'Comedy': [
-                'funny', 'hilarious', 'humorous', 'laugh-out-loud', 'witty',
-                'lighthearted', 'comedic', 'amusing', 'entertaining'
-            ],
-            'Horror': [
-                'scary', 'terrifying', 'creepy', 'frightening', 'suspenseful',
-                'disturbing', 'chilling', 'haunting', 'nightmarish'
-            ],
-            'Romance': [
-                'romantic', 'love story', 'heartwarming', 'passionate',
-                'relationship', 'falling in love', 'tender', 'intimate'
-            ],
-            'Science Fiction': [
-                'futuristic', 'sci-fi', 'space', 'technology', 'aliens',
-                'dystopian', 'advanced civilization', 'time travel', 'robots'
-            ],
-            'Thriller': [
-                'suspenseful', 'tense', 'gripping', 'edge-of-seat', 'mystery',
-                'psychological', 'intense', 'nail-biting', 'twisting'
-            ],
-            'Fantasy': [
-                'magical', 'mythical', 'enchanted', 'supernatural', 'epic',
-                'wizards', 'dragons', 'mythological', 'otherworldly'
-            ],
-            'Animation': [
-                'animated', 'cartoon', 'family-friendly', 'colorful',
-                'for kids', 'CGI', 'hand-drawn', 'Pixar-style'
-            ],
-            'Adventure': [
-                'thrilling journey', 'quest', 'exploration', 'expedition',
-                'treasure hunt', 'discovery', 'daring', 'heroic'
-            ]
-        }
-        
-        self.themes = {
-            'revenge': ['seeking revenge', 'vendetta', 'payback', 'retribution'],
-            'friendship': ['bond between friends', 'friendship', 'companions', 'allies'],
-            'family': ['family bonds', 'parent-child', 'siblings', 'family drama'],
-            'survival': ['fight for survival', 'staying alive', 'survival against odds'],
-            'redemption': ['seeking redemption', 'second chance', 'atonement'],
-            'coming-of-age': ['growing up', 'loss of innocence', 'self-discovery'],
-            'war': ['wartime', 'battlefield', 'military conflict', 'soldiers'],
-            'crime': ['criminal underworld', 'heist', 'organized crime', 'gangsters'],
-            'identity': ['finding oneself', 'identity crisis', 'who am I'],
-            'sacrifice': ['ultimate sacrifice', 'giving up everything', 'selflessness']
-        }
+        self.genre_descriptors = GENRE_DESCRIPTORS
+        self.themes = THEMES
         
         self.character_patterns = {
             'hero': ['protagonist', 'hero', 'main character', 'champion'],
@@ -105,15 +63,31 @@ class CurriculumDataGenerator:
             'fish out of water'
         ]
         
-        self.settings = {
-            'urban': ['city', 'metropolitan', 'urban setting', 'downtown'],
-            'rural': ['countryside', 'small town', 'rural', 'village'],
-            'space': ['outer space', 'spaceship', 'alien planet', 'galaxy'],
-            'historical': ['period piece', 'historical setting', 'based on true events'],
-            'fantasy_world': ['fantasy realm', 'magical world', 'mythical land'],
-            'underwater': ['under the sea', 'ocean depths', 'underwater world'],
-            'post_apocalyptic': ['after apocalypse', 'dystopian future', 'wasteland']
-        }
+        self.settings = SETTINGS
+        
+        self._compile_indicators()
+    
+    def _compile_indicators(self):
+        """
+        Compile tous les indicateurs de thèmes et de décors en une seule regex
+        Le lookahead trouve chaque position où un indicateur commence (correspondances
+        chevauchantes comprises), ce qui reproduit exactement `ind in plot_lower`
+        en un seul parcours du texte au lieu d'un parcours par indicateur
+        """
+        self._indicator_targets = {}
+        for kind, vocabulary in (('themes', self.themes), ('settings', self.settings)):
+            for name, indicators in vocabulary.items():
+                for ind in indicators:
+                    self._indicator_targets.setdefault(ind, []).append((kind, name))
+        
+        self._indicators_by_first_char = {}
+        for ind in self._indicator_targets:
+            self._indicators_by_first_char.setdefault(ind[0], []).append(ind)
+        
+        alternation = '|'.join(
+            re.escape(ind) for ind in sorted(self._indicator_targets, key=len, reverse=True)
+        )
+        self._indicator_regex = re.compile(f"(?=(?:{alternation}))")
     
     def create_movie_text(self, row):
         """
@@ -138,7 +112,7 @@ class CurriculumDataGenerator:
             parts.append(plot)
         
         if pd.notna(row.get('year')) and pd.notna(row.get('rating')):
-            parts.append(f"{row['year']} film rated {row['rating']}")
+            parts.append(f"{int(float(row['year']))} film rated {float(row['rating'])}")
         
         return " ".join(parts)
     
@@ -148,24 +122,23 @@ class CurriculumDataGenerator:
             return {}
         
         plot_lower = plot_text.lower()
-        elements = {
-            'themes': [],
-            'settings': [],
-            'character_types': []
-        }
         
-        for theme, indicators in self.themes.items():
-            if any(ind in plot_lower for ind in indicators):
-                elements['themes'].append(theme)
+        found = set()
+        for match in self._indicator_regex.finditer(plot_lower):
+            pos = match.start()
+            for ind in self._indicators_by_first_char[plot_lower[pos]]:
+                if plot_lower.startswith(ind, pos):
+                    found.update(self._indicator_targets[ind])
         
-        for setting, indicators in self.settings.items():
-            if any(ind in plot_lower for ind in indicators):
-                elements['settings'].append(setting)
-        
-        return elements
+        return {
+            'themes': [t for t in self.themes if ('themes', t) in found],
+            'settings': [s for s in self.settings if ('settings', s) in found],
+            'character_types': []
+        }
     
-    def generate_level1_genre_queries(self, row) -> List[str]:
+    def generate_level1_genre_queries(self, row, rng=None) -> List[str]:
         """Niveau 1: Compréhension basique des genres"""
+        rng = rng or random
         queries = []
         
         if pd.notna(row['genres']):
@@ -173,18 +146,19 @@ class CurriculumDataGenerator:
             for genre in genres:
                 if genre in self.genre_descriptors:
                     descriptors = self.genre_descriptors[genre]
-                    for desc in random.sample(descriptors, min(2, len(descriptors))):
+                    for desc in rng.sample(descriptors, min(2, len(descriptors))):
                         queries.append(f"{desc} {genre.lower()} movie")
                         queries.append(f"{desc} film")
         
         return queries
     
-    def generate_level2_theme_queries(self, row) -> List[str]:
+    def generate_level2_theme_queries(self, row, elements=None) -> List[str]:
         """Niveau 2: Compréhension thématique"""
         queries = []
         
         if pd.notna(row['plot']):
-            elements = self.extract_plot_elements(row['plot'])
+            if elements is None:
+                elements = self.extract_plot_elements(row['plot'])
             
             for theme in elements['themes'][:2]:
                 queries.append(f"movie about {theme}")
@@ -243,13 +217,15 @@ class CurriculumDataGenerator:
         
         return queries
     
-    def generate_level4_multimodal_queries(self, row) -> List[str]:
+    def generate_level4_multimodal_queries(self, row, rng=None, elements=None) -> List[str]:
         """Niveau 4: Requêtes multi-concepts complexes"""
+        rng = rng or random
         queries = []
         
         if pd.notna(row['genres']) and pd.notna(row['plot']):
             genre = str(row['genres']).split(', ')[0]
-            elements = self.extract_plot_elements(row['plot'])
+            if elements is None:
+                elements = self.extract_plot_elements(row['plot'])
             
             if elements['settings'] and elements['themes']:
                 setting = elements['settings'][0]
@@ -261,130 +237,296 @@ class CurriculumDataGenerator:
             keywords = str(row['keywords']).split(', ')
             
             if len(keywords) >= 2:
-                kw1, kw2 = random.sample(keywords[:5], 2)
+                kw1, kw2 = rng.sample(keywords[:5], 2)
                 queries.append(f"{genre.lower()} with {kw1} and {kw2}")
         
         return queries
     
-    def generate_comprehensive_pairs(self) -> List[Dict]:
-        """Génère toutes les paires d'entraînement par curriculum"""
-        all_pairs = []
-        
-        print("Génération Niveau 1: Requêtes de genre...")
-        level1_count = 0
-        
-        print("Génération Niveau 2: Requêtes thématiques...")
-        level2_count = 0
-        
-        print("Génération Niveau 3: Requêtes basées sur le plot...")
-        level3_count = 0
-        
-        print("Génération Niveau 4: Requêtes multi-concepts...")
-        level4_count = 0
+    def generate_row_pairs(self, row, rng):
+        """
+        Génère les requêtes des 4 niveaux pour un film
         
-        for idx, row in self.movies_df.iterrows():
-            if idx % 200 == 0:
-                print(f"Traitement: {idx}/{len(self.movies_df)} films...")
-            
-            movie_text = self.create_movie_text(row)
-            
-            l1_queries = self.generate_level1_genre_queries(row)
-            for q in l1_queries:
-                all_pairs.append({
-                    'query': q,
-                    'movie_text': movie_text,
-                    'level': 1,
-                    'movie_id': row['id'],
-                    'movie_title': row['title']
-                })
-                level1_count += 1
-            
-            l2_queries = self.generate_level2_theme_queries(row)
-            for q in l2_queries:
-                all_pairs.append({
-                    'query': q,
-                    'movie_text': movie_text,
-                    'level': 2,
-                    'movie_id': row['id'],
-                    'movie_title': row['title']
-                })
-                level2_count += 1
-            
-            l3_queries = self.generate_level3_plot_based_queries(row)
-            for q in l3_queries:
-                all_pairs.append({
-                    'query': q,
-                    'movie_text': movie_text,
-                    'level': 3,
-                    'movie_id': row['id'],
-                    'movie_title': row['title']
-                })
-                level3_count += 1
-            
-            l4_queries = self.generate_level4_multimodal_queries(row)
-            for q in l4_queries:
-                all_pairs.append({
-                    'query': q,
-                    'movie_text': movie_text,
-                    'level': 4,
-                    'movie_id': row['id'],
-                    'movie_title': row['title']
-                })
-                level4_count += 1
+        Args:
+            row: Dictionnaire des champs du film
+            rng: Générateur aléatoire (random.Random) du bloc
         
-        print(f"\nDistribution des requêtes:")
-        print(f"   Niveau 1 (Genre): {level1_count}")
-        print(f"   Niveau 2 (Thème): {level2_count}")
-        print(f"   Niveau 3 (Plot): {level3_count}")
-        print(f"   Niveau 4 (Multi-concept): {level4_count}")
-        print(f"   Total: {len(all_pairs)}")
+        Returns:
+            Liste de tuples (requête, niveau)
+        """
+        elements = None
+        if pd.notna(row['plot']):
+            elements = self.extract_plot_elements(row['plot'])
         
-        return all_pairs
+        pairs = [(q, 1) for q in self.generate_level1_genre_queries(row, rng=rng)]
+        pairs += [(q, 2) for q in self.generate_level2_theme_queries(row, elements=elements)]
+        pairs += [(q, 3) for q in self.generate_level3_plot_based_queries(row)]
+        pairs += [(q, 4) for q in self.generate_level4_multimodal_queries(row, rng=rng, elements=elements)]
+        return pairs
     
-    def save_training_data(self, output_path, max_pairs=20000):
+    def generate_chunk(self, records, start, chunk_seed):
         """
-        Génère et sauvegarde les données d'entraînement
+        Génère les paires d'un bloc de films, en colonnes
         
         Args:
-            output_path: Chemin de base pour les fichiers train/val
-            max_pairs: Nombre maximum de paires (échantillonnage si dépassé)
-        """
-        pairs = self.generate_comprehensive_pairs()
-        
-        if len(pairs) > max_pairs:
-            df = pd.DataFrame(pairs)
-            sampled = df.groupby('level', group_keys=False).apply(
-                lambda x: x.sample(min(len(x), max_pairs // 4)),
-                include_groups=False
-            ).reset_index(drop=True)
-            pairs = sampled.to_dict('records')
+            records: Liste de dictionnaires (un par film)
+            start: Position du premier film du bloc dans movies_df
+            chunk_seed: Graine du bloc (indépendante du nombre de workers)
         
-        df = pd.DataFrame(pairs)
-        df = df.sample(frac=1, random_state=42).reset_index(drop=True)
-        
-        split_idx = int(len(df) * 0.8)
-        train_df = df[:split_idx]
-        val_df = df[split_idx:]
+        Returns:
+            Dictionnaire de colonnes: query, level, row pour les paires, movie_text pour les films
+        """
+        rng = random.Random(chunk_seed)
+        queries = []
+        levels = []
+        rows = []
+        movie_texts = []
+        
+        for offset, row in enumerate(records):
+            movie_texts.append(self.create_movie_text(row))
+            for query, level in self.generate_row_pairs(row, rng):
+                queries.append(query)
+                levels.append(level)
+                rows.append(start + offset)
+        
+        return {
+            'query': queries,
+            'level': np.asarray(levels, dtype=np.int8),
+            'row': np.asarray(rows, dtype=np.int64),
+            'movie_text': movie_texts
+        }
+    
+    def iter_chunks(self, n_workers=None, chunk_size=2000):
+        """
+        Génère les paires bloc par bloc, en parallèle sur un pool de processus
+        Les blocs sortent dans l'ordre du catalogue; au plus 2 blocs par worker sont en vol
         
-        train_path = output_path.replace('.csv', '_train.csv')
-        val_path = output_path.replace('.csv', '_val.csv')
+        Args:
+            n_workers: Nombre de processus (défaut: nombre de CPU, 1 = séquentiel)
+            chunk_size: Nombre de films par bloc
         
-        os.makedirs(os.path.dirname(train_path), exist_ok=True)
+        Yields:
+            Tuple (start, colonnes du bloc) comme renvoyé par generate_chunk
+        """
+        columns = [c for c in GENERATOR_COLUMNS if c in self.movies_df.columns]
+        n_movies = len(self.movies_df)
+        n_workers = n_workers or os.cpu_count() or 1
+        
+        def tasks():
+            for chunk_index, start in enumerate(range(0, n_movies, chunk_size)):
+                records = self.movies_df.iloc[start:start + chunk_size][columns].to_dict('records')
+                yield records, start, self.seed * 1000003 + chunk_index
+        
+        if n_workers == 1 or n_movies <= chunk_size:
+            for records, start, chunk_seed in tasks():
+                yield start, self.generate_chunk(records, start, chunk_seed)
+            return
+        
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(self.seed,)) as pool:
+            pending = []
+            for records, start, chunk_seed in tasks():
+                pending.append((start, pool.submit(_generate_chunk_worker, records, start, chunk_seed)))
+                if len(pending) >= 2 * n_workers:
+                    first_start, future = pending.pop(0)
+                    yield first_start, future.result()
+            for start, future in pending:
+                yield start, future.result()
+    
+    def generate_pairs_columnar(self, n_workers=None, chunk_size=2000):
+        """
+        Génère toutes les paires d'entraînement par curriculum, en colonnes
+        Le texte de chaque film est stocké une seule fois (movie_text, indexé par row)
         
-        train_df.to_csv(train_path, index=False)
-        val_df.to_csv(val_path, index=False)
+        Args:
+            n_workers: Nombre de processus (défaut: nombre de CPU)
+            chunk_size: Nombre de films par bloc
         
-        print(f"\n{len(train_df)} paires d'entraînement -> {train_path}")
-        print(f"{len(val_df)} paires de validation -> {val_path}")
+        Returns:
+            Dictionnaire de colonnes: query, level, row, movie_id (une entrée par paire)
+            et movie_text (une entrée par film)
+        """
+        n_movies = len(self.movies_df)
+        queries = []
+        levels = []
+        rows = []
+        movie_texts = []
+        
+        print(f"Génération des 4 niveaux sur {n_movies} films...")
+        for start, chunk in self.iter_chunks(n_workers=n_workers, chunk_size=chunk_size):
+            queries.extend(chunk['query'])
+            levels.append(chunk['level'])
+            rows.append(chunk['row'])
+            movie_texts.extend(chunk['movie_text'])
+            print(f"Traitement: {start + len(chunk['movie_text'])}/{n_movies} films...")
+        
+        levels = np.concatenate(levels) if levels else np.empty(0, dtype=np.int8)
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        
+        counts = np.bincount(levels, minlength=5)
+        print(f"\nDistribution des requêtes:")
+        print(f"   Niveau 1 (Genre): {counts[1]}")
+        print(f"   Niveau 2 (Thème): {counts[2]}")
+        print(f"   Niveau 3 (Plot): {counts[3]}")
+        print(f"   Niveau 4 (Multi-concept): {counts[4]}")
+        print(f"   Total: {len(queries)}")
+        
+        return {
+            'query': queries,
+            'level': levels,
+            'row': rows,
+            'movie_id': self.movies_df['id'].to_numpy()[rows],
+            'movie_text': movie_texts
+        }
+    
+    def pairs_dataframe(self, columns):
+        """Construit le DataFrame des paires (format CSV historique) depuis les colonnes"""
+        rows = columns['row']
+        movie_texts = np.asarray(columns['movie_text'], dtype=object)
+        return pd.DataFrame({
+            'query': columns['query'],
+            'movie_text': movie_texts[rows],
+            'level': columns['level'],
+            'movie_id': columns['movie_id'],
+            'movie_title': self.movies_df['title'].to_numpy()[rows]
+        })
+    
+    def generate_comprehensive_pairs(self) -> List[Dict]:
+        """Génère toutes les paires d'entraînement par curriculum (liste de dictionnaires)"""
+        return self.pairs_dataframe(self.generate_pairs_columnar()).to_dict('records')
+    
+    def save_training_data(self, output_dir, max_pairs=20000, n_workers=None, chunk_size=2000,
+                           shard_size=100000, val_fraction=0.2):
+        """
+        Génère et écrit les données d'entraînement en flux, en shards Parquet
         
-        print(f"\nÉchantillon de requêtes:")
-        for level in [1, 2, 3, 4]:
-            sample = train_df[train_df['level'] == level].sample(min(2, len(train_df[train_df['level'] == level])))
-            print(f"\n  Niveau {level}:")
-            for _, row in sample.iterrows():
-                print(f"    \"{row['query']}\" -> {row['movie_title']}")
+        Le texte des films est écrit une fois dans la table annexe movies/, les paires
+        (requête, movie_id, niveau) dans train/ et val/. Le split est un hash de movie_id.
+        Avec max_pairs, un échantillonnage par réservoir stratifié borne la mémoire: sous
+        max_pairs paires générées tout est gardé, au-delà chaque niveau reçoit max_pairs // 4
+        paires, plus la part laissée par les niveaux plus petits. Sans max_pairs, les paires
+        sont écrites au fil de la génération.
         
-        return train_df, val_df
+        Args:
+            output_dir: Dossier de sortie
+            max_pairs: Nombre maximum de paires (None: toutes)
+            n_workers: Nombre de processus de génération (défaut: nombre de CPU)
+            chunk_size: Nombre de films par bloc de génération
+            shard_size: Nombre de lignes par fichier Parquet
+            val_fraction: Fraction des films en validation
+        
+        Returns:
+            Manifeste du dossier (dictionnaire, aussi écrit dans manifest.json)
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        # Le cache des tokens et les triplets minés correspondent aux anciens shards
+        for derived in (TOKEN_CACHE_DIR, TRIPLETS_DIR):
+            shutil.rmtree(os.path.join(output_dir, derived), ignore_errors=True)
+        
+        movie_ids = self.movies_df['id'].to_numpy(dtype=np.int64)
+        titles = self.movies_df['title'].fillna('').astype(str).to_numpy(dtype=object)
+        n_movies = len(self.movies_df)
+        
+        movie_writer = ShardWriter(os.path.join(output_dir, MOVIES_DIR), MOVIE_SCHEMA, shard_size)
+        pair_writers = {
+            split: ShardWriter(os.path.join(output_dir, split), PAIR_SCHEMA, shard_size,
+                               shuffle_seed=self.seed + offset)
+            for offset, split in enumerate(('train', 'val'))
+        }
+        reservoir = LevelReservoir(max_pairs, seed=self.seed) if max_pairs else None
+        counts = np.zeros(5, dtype=np.int64)
+        
+        print(f"Génération des 4 niveaux sur {n_movies} films...")
+        for start, chunk in self.iter_chunks(n_workers=n_workers, chunk_size=chunk_size):
+            stop = start + len(chunk['movie_text'])
+            movie_writer.write({
+                'movie_id': movie_ids[start:stop],
+                'movie_title': titles[start:stop],
+                'movie_text': chunk['movie_text']
+            })
+            
+            pairs = {
+                'query': np.asarray(chunk['query'], dtype=object),
+                'movie_id': movie_ids[chunk['row']],
+                'level': chunk['level']
+            }
+            counts += np.bincount(pairs['level'], minlength=5)
+            
+            if reservoir is not None:
+                reservoir.add(pairs['query'], pairs['movie_id'], pairs['level'])
+            else:
+                self._write_split(pair_writers, pairs, val_fraction)
+            
+            print(f"Traitement: {stop}/{n_movies} films...")
+        
+        if reservoir is not None:
+            if counts.sum() > max_pairs:
+                quotas = reservoir.quotas()
+                print(f"\nÉchantillonnage à {max_pairs} paires: "
+                      + ", ".join(f"niveau {level} {quotas[level]}/{counts[level]}" for level in quotas))
+            pairs = reservoir.columns()
+            order = np.random.default_rng(self.seed).permutation(len(pairs['query']))
+            self._write_split(pair_writers, {k: v[order] for k, v in pairs.items()}, val_fraction)
+        
+        movies_info = movie_writer.close()
+        splits_info = {split: writer.close() for split, writer in pair_writers.items()}
+        
+        manifest = {
+            'format': 'parquet',
+            'seed': self.seed,
+            'max_pairs': max_pairs,
+            'val_fraction': val_fraction,
+            'generated_pairs_by_level': {str(level): int(counts[level]) for level in range(1, 5)},
+            'movies': movies_info,
+            'splits': splits_info
+        }
+        with open(os.path.join(output_dir, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        
+        print(f"\nDistribution des requêtes générées:")
+        print(f"   Niveau 1 (Genre): {counts[1]}")
+        print(f"   Niveau 2 (Thème): {counts[2]}")
+        print(f"   Niveau 3 (Plot): {counts[3]}")
+        print(f"   Niveau 4 (Multi-concept): {counts[4]}")
+        print(f"   Total: {counts.sum()}")
+        
+        print(f"\n{splits_info['train']['rows']} paires d'entraînement -> {output_dir}/train "
+              f"({len(splits_info['train']['shards'])} shards)")
+        print(f"{splits_info['val']['rows']} paires de validation -> {output_dir}/val "
+              f"({len(splits_info['val']['shards'])} shards)")
+        
+        train_shards = shard_paths(output_dir, 'train')
+        if train_shards:
+            sample_df = pd.read_parquet(train_shards[0]).join(read_movie_texts(output_dir), on='movie_id')
+            print(f"\nÉchantillon de requêtes:")
+            for level in [1, 2, 3, 4]:
+                level_df = sample_df[sample_df['level'] == level]
+                sample = level_df.sample(min(2, len(level_df)), random_state=self.seed)
+                print(f"\n  Niveau {level}:")
+                for query, title in zip(sample['query'], sample['movie_title']):
+                    print(f"    \"{query}\" -> {title}")
+        
+        return manifest
+    
+    @staticmethod
+    def _write_split(writers, pairs, val_fraction):
+        """Répartit un bloc de paires entre les writers train et val"""
+        is_val = split_for(pairs['movie_id'], val_fraction)
+        for split, mask in (('train', ~is_val), ('val', is_val)):
+            if mask.any():
+                writers[split].write({k: v[mask] for k, v in pairs.items()})
+
+GENERATOR_COLUMNS = ['id', 'title', 'genres', 'keywords', 'plot', 'year', 'rating']
+
+_worker_generator = None
+
+
+def _init_worker(seed):
+    """Initialise un générateur (vocabulaires et regex compilée) par processus"""
+    global _worker_generator
+    _worker_generator = CurriculumDataGenerator(None, seed=seed)
+
+
+def _generate_chunk_worker(records, start, chunk_seed):
+    return _worker_generator.generate_chunk(records, start, chunk_seed)
 
 
 def main():
@@ -404,7 +546,7 @@ def main():
     print(f"Chargé: {len(df)} films\n")
     
     generator = CurriculumDataGenerator(df)
-    generator.save_training_data(config.TRAINING_DATA_PATH)
+    generator.save_training_data(config.TRAINING_DATA_DIR)
     
     print("\n" + "="*70)
     print("Données d'entraînement prêtes")
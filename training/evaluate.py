@@ -1,24 +1,111 @@
 """
 Module d'évaluation quantitative des modèles
-Compare le modèle de base au modèle fine-tuné sur des requêtes de test
+Compare des modèles sur des requêtes étiquetées en passant par le chemin de
+production (MovieRetriever.search: index choisi, score hybride, reranking,
+filtre adaptatif) et mesure qualité et latence par requête
 """
 
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 from sentence_transformers import SentenceTransformer
 import faiss
+import argparse
+import threading
+import time
+import zlib
+import re
 import sys
 import os
 
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
 import config
+from movie_retriever import MovieRetriever, INDEX_TYPES, REDUCTIONS, STORAGE_MODES
+from reranker import CrossEncoderReranker
+from multi_vector import MultiVectorIndex, encode_fields
+from query_parser import QueryParser
+from eval_queries import TEST_QUERIES
+
+from training.pair_store import read_manifest, read_pairs
+
+
+DOCS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'docs')
+EVAL_CACHE_DIR = os.path.join(config.DATA_DIR, 'processed', 'eval_cache')
+
+
+def load_query_set(path):
+    """
+    Charge des requêtes étiquetées depuis un fichier CSV ou JSONL
+    Colonnes: query et expected (titre attendu, correspondance partielle) et/ou
+    movie_id (plusieurs lignes pour une même requête = plusieurs films pertinents)
+    
+    Returns:
+        Liste de dictionnaires {'query', 'expected', 'movie_ids'}
+    """
+    if path.endswith('.csv'):
+        df = pd.read_csv(path)
+    else:
+        df = pd.read_json(path, lines=True)
+    
+    queries = {}
+    for row in df.to_dict('records'):
+        query = str(row['query'])
+        entry = queries.setdefault(query, {'query': query, 'expected': None, 'movie_ids': set()})
+        expected = row.get('expected', row.get('title'))
+        if expected is not None and pd.notna(expected):
+            entry['expected'] = str(expected)
+        if row.get('movie_id') is not None and pd.notna(row.get('movie_id')):
+            entry['movie_ids'].add(int(row['movie_id']))
+    
+    return list(queries.values())
+
+
+def validation_query_set(n_queries, seed=42):
+    """
+    Tire des requêtes étiquetées dans le split de validation des paires d'entraînement
+    (les films pertinents d'une requête sont tous ceux qui la partagent)
+    """
+    val_df = read_pairs(config.TRAINING_DATA_DIR, 'val', with_text=False)
+    grouped = val_df.groupby('query')['movie_id'].apply(set)
+    if len(grouped) > n_queries:
+        grouped = grouped.sample(n_queries, random_state=seed)
+    return [{'query': q, 'expected': None, 'movie_ids': ids} for q, ids in grouped.items()]
+
+
+class CachedQueryEncoder:
+    """
+    Encodeur injecté dans MovieRetriever: les requêtes évaluées sont encodées
+    une fois par gros batches, search() les retrouve sans repasser par le modèle
+    """
+    
+    def __init__(self, model, queries, batch_size=256):
+        start = time.perf_counter()
+        embeddings = model.encode(queries, batch_size=batch_size, show_progress_bar=False)
+        self.encode_seconds = time.perf_counter() - start
+        self.model = model
+        self.vectors = dict(zip(queries, np.asarray(embeddings, dtype='float32')))
+    
+    def get_sentence_embedding_dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+    
+    def encode(self, sentences, **kwargs):
+        if isinstance(sentences, list) and all(s in self.vectors for s in sentences):
+            return np.stack([self.vectors[s] for s in sentences])
+        return self.model.encode(sentences, **kwargs)
 
 
 class ModelEvaluator:
     """Évalue et compare les performances des modèles"""
     
-    def __init__(self):
-        """Initialise l'évaluateur avec le dataset et les requêtes de test"""
+    def __init__(self, query_file=None, val_queries=0, seed=42):
+        """
+        Initialise l'évaluateur avec le dataset et les requêtes de test
+        
+        Args:
+            query_file: Fichier de requêtes étiquetées (CSV/JSONL, voir load_query_set)
+            val_queries: Nombre de requêtes tirées du split de validation (0: aucune)
+            seed: Graine du tirage
+        """
         movies_path = config.MOVIES_CSV
         
         if not os.path.exists(movies_path):
@@ -26,137 +113,206 @@ class ModelEvaluator:
             sys.exit(1)
         
         self.movies_df = pd.read_csv(movies_path)
+        self.titles_by_id = dict(zip(self.movies_df['id'], self.movies_df['title'].astype(str).str.lower()))
+        
+        if query_file:
+            self.test_queries = load_query_set(query_file)
+        else:
+            self.test_queries = [
+                {'query': query, 'expected': expected, 'movie_ids': set()} for query, expected in TEST_QUERIES
+            ]
+        if val_queries and read_manifest(config.TRAINING_DATA_DIR) is not None:
+            self.test_queries += validation_query_set(val_queries, seed=seed)
+        
+        self._corpus_cache = {}
+        self._corpus_locks = {}
+        self._locks_guard = threading.Lock()
+    
+    @staticmethod
+    def find_rank(expected_title, titles):
+        """Rang (1-indexé) du premier titre correspondant, None si absent"""
+        for i, title in enumerate(titles, 1):
+            if expected_title.lower() in str(title).lower():
+                return i
+        return None
+    
+    def rank_of(self, labelled, titles):
+        """Rang du premier résultat pertinent: titre attendu, ou titre d'un des movie_id étiquetés"""
+        if labelled['expected']:
+            return self.find_rank(labelled['expected'], titles)
+        
+        relevant = {self.titles_by_id.get(m) for m in labelled['movie_ids']} - {None}
+        for i, title in enumerate(titles, 1):
+            if str(title).lower() in relevant:
+                return i
+        return None
+    
+    def corpus_embeddings(self, model, model_path, retriever):
+        """
+        Embeddings du catalogue pour un modèle, partagés entre évaluations
+        Cache mémoire (entre threads) et disque (entre exécutions), invalidé si le
+        catalogue ou le modèle change
+        """
+        movie_texts = self.movies_df.apply(retriever.create_movie_text, axis=1).tolist()
+        catalog_hash = zlib.crc32("\n".join(movie_texts).encode('utf-8'))
+        model_version = int(os.path.getmtime(model_path)) if os.path.exists(str(model_path)) else 0
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', str(model_path)).strip('_')[-80:]
+        key = f"{slug}-{model_version}-{catalog_hash:08x}"
+        
+        # Un verrou par clé: deux modèles différents s'encodent en parallèle,
+        # deux évaluations du même modèle attendent le même encodage
+        with self._locks_guard:
+            lock = self._corpus_locks.setdefault(key, threading.Lock())
+        
+        with lock:
+            if key in self._corpus_cache:
+                return self._corpus_cache[key]
+            
+            path = os.path.join(EVAL_CACHE_DIR, f"{key}.npy")
+            if os.path.exists(path):
+                embeddings = np.load(path)
+            else:
+                embeddings = model.encode(movie_texts, batch_size=128, show_progress_bar=False)
+                embeddings = np.asarray(embeddings, dtype='float32')
+                os.makedirs(EVAL_CACHE_DIR, exist_ok=True)
+                np.save(path, embeddings)
+            
+            self._corpus_cache[key] = embeddings
+            return embeddings
+    
+    def resolve_model_path(self, model_path):
+        """Chemins relatifs des modèles locaux exprimés depuis la racine du projet"""
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        if not os.path.isabs(model_path) and os.path.exists(os.path.join(root, model_path)):
+            return os.path.join(root, model_path)
+        return model_path
+    
+    def build_retriever(self, model_path, index_type='flat', rerank_top_n=0, reranker_model=None,
+                        budget_ms=None, dim=None, reduction='pca'):
+        """
+        Construit un MovieRetriever de production pour un modèle donné
+        (dim et reduction: voir MovieRetriever.build_index)
+        
+        Returns:
+            Tuple (retriever, encodeur de requêtes)
+        """
+        model = SentenceTransformer(self.resolve_model_path(model_path))
+        parser = QueryParser() if config.QUERY_PARSER else None
+        # search() encode le texte restant après analyse: c'est lui qui doit être en cache
+        queries = [q['query'] for q in self.test_queries]
+        if parser is not None:
+            queries = list(dict.fromkeys(parser.parse(query).text for query in queries))
+        encoder = CachedQueryEncoder(model, queries)
+        
+        retriever = MovieRetriever(model=encoder)
+        retriever.set_movies(self.movies_df)
+        retriever.embeddings = self.corpus_embeddings(model, self.resolve_model_path(model_path), retriever)
+        retriever.build_index(retriever.embeddings, index_type=index_type, dim=dim, reduction=reduction)
         
-        self.test_queries = [
-            ("romantic movie on a sinking cruise ship", "Titanic"),
-            ("toys that come to life and question existence", "Toy Story"),
-            ("sad space movie about isolation", "Solaris"),
-            ("AI falls in love with lonely writer", "Her"),
-            ("time loop comedy repeat same day", "Groundhog Day"),
-            ("underground fight club soap maker", "Fight Club"),
-            ("wizard school for children", "Harry Potter"),
-            ("dreams within dreams heist", "Inception"),
-            ("gladiator seeking revenge in rome", "Gladiator"),
-            ("robot cleans earth falls in love", "WALL-E"),
-            ("clownfish father searches for son", "Finding Nemo"),
-            ("animated movie about emotions inside girl's head", "Inside Out"),
-            ("mafia family succession drama", "The Godfather"),
-            ("superhero loses powers becomes human", "Spider-Man"),
-            ("video game characters escape arcade", "Wreck-It Ralph"),
-            ("monster scares children for energy", "Monsters"),
-            ("chef rat controls human cooking", "Ratatouille"),
-            ("princess with ice powers", "Frozen"),
-            ("talking car race", "Cars"),
-            ("family of superheroes", "The Incredibles")
-        ]
-    
-    def create_movie_text(self, row):
-        """Crée la représentation textuelle d'un film (identique à l'entraînement)"""
-        parts = []
-        if pd.notna(row['title']): 
-            parts.append(f"{row['title']} {row['title']}")
-        if pd.notna(row['genres']): 
-            parts.append(f"{row['genres']} {row['genres']} {row['genres']}")
-        if pd.notna(row['keywords']): 
-            parts.append(f"{row['keywords']} {row['keywords']} {row['keywords']} {row['keywords']}")
-        if pd.notna(row['plot']): 
-            parts.append(str(row['plot'])[:400])
-        if pd.notna(row.get('year')) and pd.notna(row.get('rating')): 
-            parts.append(f"{row['year']} film rated {row['rating']}")
-        return " ".join(parts)
-    
-    def evaluate_model(self, model_path, model_name):
-        """
-        Évalue un modèle sur l'ensemble de test
+        if rerank_top_n:
+            reranker = CrossEncoderReranker(reranker_model or config.RERANKER_MODEL)
+            retriever.set_reranker(reranker, top_n=rerank_top_n, budget_ms=budget_ms)
+        if parser is not None:
+            retriever.set_query_parser(parser)
+        
+        return retriever, encoder
+    
+    def evaluate_model(self, model_path, model_name, index_type='flat', rerank_top_n=0, adaptive=True,
+                       top_k=10):
+        """
+        Évalue un modèle sur l'ensemble de test via MovieRetriever.search
         
         Args:
             model_path: Chemin vers le modèle
             model_name: Nom du modèle pour l'affichage
+            index_type: Type d'index FAISS (voir movie_retriever.INDEX_TYPES)
+            rerank_top_n: Candidats rescorés par le cross-encoder (0: désactivé)
+            adaptive: Applique le filtre adaptatif de production
+            top_k: Profondeur maximale de la liste évaluée
         
         Returns:
-            Dictionnaire avec métriques et résultats détaillés
+            Dictionnaire avec métriques et résultats détaillés (None si le modèle ne charge pas)
         """
-        print("\n" + "="*70)
-        print(f"Évaluation: {model_name}")
-        print("="*70 + "\n")
-        
-        if not model_name.startswith('Base'):
-            if not os.path.isabs(model_path):
-                model_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), model_path)
-        
         try:
-            print(f"Chargement du modèle: {model_path}")
-            model = SentenceTransformer(model_path)
-            print("Modèle chargé avec succès")
+            retriever, encoder = self.build_retriever(model_path, index_type, rerank_top_n)
         except Exception as e:
-            print(f"Échec du chargement: {e}")
+            print(f"Échec du chargement de {model_name} ({model_path}): {e}")
             return None
         
-        print("\nEncodage des films...")
-        movie_texts = self.movies_df.apply(self.create_movie_text, axis=1).tolist()
-        embeddings = model.encode(movie_texts, batch_size=64, show_progress_bar=True)
-        
-        print("Construction de l'index FAISS...")
-        dimension = embeddings.shape[1]
-        index = faiss.IndexFlatL2(dimension)
-        index.add(embeddings.astype('float32'))
+        metrics, results_detail = self.run_queries(retriever, encoder, top_k=top_k, adaptive=adaptive)
         
-        metrics = {
-            'mrr': 0,
-            'precision_at_1': 0,
-            'precision_at_3': 0,
-            'precision_at_5': 0,
-            'recall_at_10': 0,
-            'avg_rank': []
+        return {
+            'model_name': model_name,
+            'model_path': model_path,
+            'index_type': index_type,
+            'rerank_top_n': rerank_top_n,
+            'metrics': metrics,
+            'details': results_detail
         }
+    
+    def run_queries(self, retriever, encoder, top_k=10, adaptive=True):
+        """
+        Passe toutes les requêtes de test dans retriever.search
         
-        results_detail = []
+        Returns:
+            Tuple (métriques, résultats détaillés par requête)
+        """
+        # Première requête hors mesure: initialisations paresseuses (index, reranker)
+        retriever.search(self.test_queries[0]['query'], top_k=top_k, adaptive=adaptive)
         
-        print("\nÉvaluation des requêtes...")
-        for query, expected_title in self.test_queries:
-            q_emb = model.encode([query])
-            D, I = index.search(q_emb.astype('float32'), k=10)
-            
-            top_movies = []
-            for idx in I[0]:
-                top_movies.append(self.movies_df.iloc[idx]['title'])
-            
-            rank = None
-            for i, title in enumerate(top_movies, 1):
-                if expected_title.lower() in title.lower():
-                    rank = i
-                    break
+        results_detail = []
+        stage_totals = {}
+        for labelled in self.test_queries:
+            timings = {}
+            start = time.perf_counter()
+            results = retriever.search(labelled['query'], top_k=top_k, adaptive=adaptive, timings=timings)
+            latency_ms = (time.perf_counter() - start) * 1000
             
-            if rank:
-                metrics['mrr'] += 1 / rank
-                metrics['avg_rank'].append(rank)
-                
-                if rank == 1:
-                    metrics['precision_at_1'] += 1
-                if rank <= 3:
-                    metrics['precision_at_3'] += 1
-                if rank <= 5:
-                    metrics['precision_at_5'] += 1
-                if rank <= 10:
-                    metrics['recall_at_10'] += 1
+            for stage, seconds in timings.items():
+                stage_totals[stage] = stage_totals.get(stage, 0.0) + seconds * 1000
             
+            titles = [r['title'] for r in results]
+            rank = self.rank_of(labelled, titles)
             results_detail.append({
-                'query': query,
-                'expected': expected_title,
-                'rank': rank if rank else '>10',
-                'top_1': top_movies[0],
-                'found': 'OK' if rank else 'ÉCHEC'
+                'query': labelled['query'],
+                'expected': labelled['expected'] or ",".join(map(str, sorted(labelled['movie_ids']))),
+                'rank': rank,
+                'n_results': len(results),
+                'top_1': titles[0] if titles else None,
+                'latency_ms': round(latency_ms, 3)
             })
         
-        n = len(self.test_queries)
-        metrics['mrr'] /= n
-        metrics['precision_at_1'] /= n
-        metrics['precision_at_3'] /= n
-        metrics['precision_at_5'] /= n
-        metrics['recall_at_10'] /= n
-        metrics['avg_rank'] = np.mean(metrics['avg_rank']) if metrics['avg_rank'] else None
+        ranks = [d['rank'] for d in results_detail]
+        latencies = [d['latency_ms'] for d in results_detail]
+        n = len(ranks)
+        encode_ms = encoder.encode_seconds * 1000 / n
+        
+        metrics = {
+            'mrr': sum(1 / r for r in ranks if r) / n,
+            'precision_at_1': sum(1 for r in ranks if r == 1) / n,
+            'precision_at_3': sum(1 for r in ranks if r and r <= 3) / n,
+            'precision_at_5': sum(1 for r in ranks if r and r <= 5) / n,
+            'recall_at_10': sum(1 for r in ranks if r and r <= 10) / n,
+            'avg_rank': float(np.mean([r for r in ranks if r])) if any(ranks) else None,
+            'n_queries': n,
+            'encode_ms_per_query': round(encode_ms, 3),
+            'search_p50_ms': round(float(np.percentile(latencies, 50)), 3),
+            'search_p95_ms': round(float(np.percentile(latencies, 95)), 3),
+            'search_p99_ms': round(float(np.percentile(latencies, 99)), 3),
+            'stages_mean_ms': {stage: round(total / n, 3) for stage, total in stage_totals.items()}
+        }
+        
+        return metrics, results_detail
+    
+    def print_result(self, result, max_details=30):
+        """Affiche les métriques d'un modèle (et le détail si l'ensemble est petit)"""
+        metrics = result['metrics']
+        print("\n" + "="*70)
+        print(f"Évaluation: {result['model_name']} (index {result['index_type']}, "
+              f"rerank {result['rerank_top_n']})")
+        print("="*70)
         
-        print(f"\nMÉTRIQUES:")
+        print(f"\nMÉTRIQUES ({metrics['n_queries']} requêtes):")
         print(f"   MRR (Mean Reciprocal Rank): {metrics['mrr']:.3f}")
         print(f"   Precision@1: {metrics['precision_at_1']:.1%}")
         print(f"   Precision@3: {metrics['precision_at_3']:.1%}")
@@ -164,37 +320,55 @@ class ModelEvaluator:
         print(f"   Recall@10: {metrics['recall_at_10']:.1%}")
         if metrics['avg_rank']:
             print(f"   Rang moyen: {metrics['avg_rank']:.2f}")
+        print(f"   Encodage (batch): {metrics['encode_ms_per_query']:.2f} ms/requête")
+        print(f"   Recherche: p50 {metrics['search_p50_ms']:.2f} ms, p95 {metrics['search_p95_ms']:.2f} ms, "
+              f"p99 {metrics['search_p99_ms']:.2f} ms")
+        print(f"   Étapes (moyenne ms): {metrics['stages_mean_ms']}")
         
-        print(f"\nRÉSULTATS DÉTAILLÉS:")
-        for r in results_detail:
-            status = r['found']
-            print(f"   [{status}] \"{r['query']}\"")
-            print(f"      Attendu: {r['expected']} | Rang: {r['rank']}")
-            print(f"      Obtenu: {r['top_1']}\n")
-        
-        return {
-            'model_name': model_name,
-            'metrics': metrics,
-            'details': results_detail
-        }
+        if len(result['details']) <= max_details:
+            print(f"\nRÉSULTATS DÉTAILLÉS:")
+            for r in result['details']:
+                status = 'OK' if r['rank'] else 'ÉCHEC'
+                print(f"   [{status}] \"{r['query']}\"")
+                print(f"      Attendu: {r['expected']} | Rang: {r['rank'] or '>10'} | {r['latency_ms']:.2f} ms")
+                print(f"      Obtenu: {r['top_1']}\n")
     
-    def compare_models(self):
-        """Compare le modèle de base au modèle fine-tuné"""
-        models_to_test = {
+    def compare_models(self, models=None, index_type='flat', rerank_top_n=0, adaptive=True, max_workers=None):
+        """
+        Évalue plusieurs modèles en parallèle et compare leurs métriques
+        
+        Args:
+            models: Dictionnaire {nom: chemin} (défaut: base et fine-tuné)
+            index_type: Type d'index FAISS
+            rerank_top_n: Candidats rescorés par le cross-encoder (0: désactivé)
+            adaptive: Applique le filtre adaptatif de production
+            max_workers: Modèles évalués simultanément (défaut: tous)
+        
+        Returns:
+            Liste des résultats par modèle
+        """
+        models_to_test = models or {
             'Base (Non entraîné)': 'all-MiniLM-L6-v2',
             'Fine-tuné (v1)': os.path.join(config.MODELS_DIR, 'fine_tuned', 'movie_finder_v1')
         }
         
-        all_results = []
+        print(f"Évaluation de {len(models_to_test)} modèles sur {len(self.test_queries)} requêtes "
+              f"(index {index_type}, rerank {rerank_top_n})...")
+        
+        with ThreadPoolExecutor(max_workers=max_workers or len(models_to_test)) as pool:
+            futures = [
+                pool.submit(self.evaluate_model, path, name, index_type, rerank_top_n, adaptive)
+                for name, path in models_to_test.items()
+            ]
+            all_results = [f.result() for f in futures]
+        all_results = [r for r in all_results if r]
         
-        for name, path in models_to_test.items():
-            result = self.evaluate_model(path, name)
-            if result:
-                all_results.append(result)
+        for result in all_results:
+            self.print_result(result)
         
         if len(all_results) < 2:
             print("\nImpossible de comparer (un modèle n'a pas pu être chargé)")
-            return
+            return all_results
         
         print("\n" + "="*70)
         print("COMPARAISON FINALE")
@@ -208,7 +382,9 @@ class ModelEvaluator:
                 'P@1': f"{r['metrics']['precision_at_1']:.1%}",
                 'P@3': f"{r['metrics']['precision_at_3']:.1%}",
                 'P@5': f"{r['metrics']['precision_at_5']:.1%}",
-                'R@10': f"{r['metrics']['recall_at_10']:.1%}"
+                'R@10': f"{r['metrics']['recall_at_10']:.1%}",
+                'p50 ms': f"{r['metrics']['search_p50_ms']:.2f}",
+                'p95 ms': f"{r['metrics']['search_p95_ms']:.2f}"
             })
         
         comparison_df = pd.DataFrame(comparison_data)
@@ -218,20 +394,334 @@ class ModelEvaluator:
             base = all_results[0]['metrics']
             trained = all_results[1]['metrics']
             
-            mrr_improvement = ((trained['mrr'] - base['mrr']) / base['mrr']) * 100
+            mrr_improvement = ((trained['mrr'] - base['mrr']) / base['mrr']) * 100 if base['mrr'] > 0 else 0
             p1_improvement = ((trained['precision_at_1'] - base['precision_at_1']) / base['precision_at_1']) * 100 if base['precision_at_1'] > 0 else 0
             
             print(f"\nAMÉLIORATION:")
             print(f"   MRR: +{mrr_improvement:.1f}%")
             print(f"   Precision@1: +{p1_improvement:.1f}%")
         
-        results_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'docs')
-        os.makedirs(results_dir, exist_ok=True)
-        output_file = os.path.join(results_dir, 'evaluation_results.csv')
+        os.makedirs(DOCS_DIR, exist_ok=True)
+        output_file = os.path.join(DOCS_DIR, 'evaluation_results.csv')
         comparison_df.to_csv(output_file, index=False)
+        
+        details_file = os.path.join(DOCS_DIR, 'evaluation_queries.csv')
+        pd.DataFrame([
+            dict(model=r['model_name'], **d) for r in all_results for d in r['details']
+        ]).to_csv(details_file, index=False)
+        
         print(f"\nRésultats sauvegardés: {output_file}")
+        print(f"Détail par requête (rang, latence): {details_file}")
         
         return all_results
+    
+    def evaluate_dimensions(self, model_path=None, dims=(64, 128, 256), index_type='flat', reduction='pca',
+                            adaptive=True, top_k=10):
+        """
+        Courbe qualité / latence / mémoire selon la dimension des vecteurs indexés
+        Le catalogue est encodé une fois; seul l'index est reconstruit pour chaque dimension
+        
+        Args:
+            model_path: Modèle bi-encoder (défaut: modèle fine-tuné)
+            dims: Dimensions à comparer (la dimension complète est toujours ajoutée)
+            index_type: Type d'index FAISS
+            reduction: 'pca' ou 'truncate' (modèle entraîné en Matryoshka)
+            adaptive: Applique le filtre adaptatif de production
+            top_k: Profondeur de la liste évaluée
+        
+        Returns:
+            Liste de dictionnaires, un par dimension
+        """
+        print("\n" + "="*70)
+        print(f"Réduction de dimension ({reduction}, index {index_type})")
+        print("="*70 + "\n")
+        
+        retriever, encoder = self.build_retriever(model_path or config.FINE_TUNED_MODEL_PATH, index_type)
+        dimension = retriever.embeddings.shape[1]
+        
+        report = []
+        for dim in sorted({d for d in dims if d < dimension}) + [dimension]:
+            retriever.build_index(retriever.embeddings, index_type=index_type, dim=dim, reduction=reduction)
+            metrics, _ = self.run_queries(retriever, encoder, top_k=top_k, adaptive=adaptive)
+            report.append({
+                'dim': dim,
+                'mrr': metrics['mrr'],
+                'precision_at_1': metrics['precision_at_1'],
+                'recall_at_10': metrics['recall_at_10'],
+                'faiss_search_ms': metrics['stages_mean_ms'].get('faiss_search'),
+                'search_p50_ms': metrics['search_p50_ms'],
+                'search_p95_ms': metrics['search_p95_ms'],
+                'index_mb': round(self.index_bytes(retriever.index) / 1024**2, 3),
+                'bytes_per_movie': round(self.index_bytes(retriever.index) / len(retriever.embeddings))
+            })
+        
+        print(f"\n{'dim':>5} {'MRR':>7} {'P@1':>7} {'R@10':>7} {'faiss ms':>9} {'p95 ms':>8} {'index MB':>9} {'o/film':>7}")
+        for r in report:
+            print(f"{r['dim']:>5} {r['mrr']:>7.3f} {r['precision_at_1']:>7.1%} {r['recall_at_10']:>7.1%} "
+                  f"{r['faiss_search_ms']:>9.3f} {r['search_p95_ms']:>8.2f} {r['index_mb']:>9.2f} "
+                  f"{r['bytes_per_movie']:>7}")
+        
+        os.makedirs(DOCS_DIR, exist_ok=True)
+        output_file = os.path.join(DOCS_DIR, f"dimension_evaluation_{reduction}.csv")
+        pd.DataFrame(report).to_csv(output_file, index=False)
+        print(f"\nRésultats sauvegardés: {output_file}")
+        
+        return report
+    
+    @staticmethod
+    def index_bytes(index):
+        """Taille sérialisée d'un index FAISS (float ou binaire)"""
+        if isinstance(index, faiss.IndexBinary):
+            return len(faiss.serialize_index_binary(index))
+        return len(faiss.serialize_index(index))
+    
+    def evaluate_storage(self, model_path=None, modes=STORAGE_MODES, index_type='flat', rescore_factor=None,
+                         adaptive=True, top_k=10):
+        """
+        Compare les modes de stockage de l'index: mémoire et écart de qualité par rapport au float
+        Les candidats des index compressés sont rescorés avec les embeddings float
+        
+        Args:
+            model_path: Modèle bi-encoder (défaut: modèle fine-tuné)
+            modes: Modes à comparer ('float' sert de référence et est toujours inclus)
+            index_type: Type d'index FAISS
+            rescore_factor: Candidats rescorés = rescore_factor x k (défaut: config.RESCORE_FACTOR)
+            adaptive: Applique le filtre adaptatif de production
+            top_k: Profondeur de la liste évaluée
+        
+        Returns:
+            Liste de dictionnaires, un par mode
+        """
+        print("\n" + "="*70)
+        print(f"Stockage de l'index (index {index_type})")
+        print("="*70 + "\n")
+        
+        retriever, encoder = self.build_retriever(model_path or config.FINE_TUNED_MODEL_PATH, index_type)
+        if rescore_factor:
+            retriever.rescore_factor = rescore_factor
+        
+        report = []
+        for mode in ['float'] + [m for m in modes if m != 'float']:
+            retriever.build_index(retriever.embeddings, index_type=index_type, storage=mode)
+            metrics, _ = self.run_queries(retriever, encoder, top_k=top_k, adaptive=adaptive)
+            report.append({
+                'storage': mode,
+                'mrr': metrics['mrr'],
+                'precision_at_1': metrics['precision_at_1'],
+                'recall_at_10': metrics['recall_at_10'],
+                'faiss_search_ms': metrics['stages_mean_ms'].get('faiss_search'),
+                'search_p95_ms': metrics['search_p95_ms'],
+                'index_mb': round(self.index_bytes(retriever.index) / 1024**2, 3)
+            })
+        
+        reference = report[0]
+        for r in report:
+            r['recall_at_10_delta'] = r['recall_at_10'] - reference['recall_at_10']
+            r['memory_saving'] = round(reference['index_mb'] / max(r['index_mb'], 1e-9), 1)
+        
+        print(f"\nRescoring float: {retriever.rescore_factor} x k candidats "
+              f"(embeddings float de {retriever.embeddings.nbytes / 1024**2:.1f} Mo mappés en mémoire en production)")
+        print(f"\n{'mode':>7} {'MRR':>7} {'R@10':>7} {'Δ R@10':>8} {'faiss ms':>9} {'p95 ms':>8} {'index MB':>9} {'gain':>6}")
+        for r in report:
+            print(f"{r['storage']:>7} {r['mrr']:>7.3f} {r['recall_at_10']:>7.1%} {r['recall_at_10_delta']:>+8.1%} "
+                  f"{r['faiss_search_ms']:>9.3f} {r['search_p95_ms']:>8.2f} {r['index_mb']:>9.2f} "
+                  f"{r['memory_saving']:>5}x")
+        
+        os.makedirs(DOCS_DIR, exist_ok=True)
+        output_file = os.path.join(DOCS_DIR, 'storage_evaluation.csv')
+        pd.DataFrame(report).to_csv(output_file, index=False)
+        print(f"\nRésultats sauvegardés: {output_file}")
+        
+        return report
+    
+    def evaluate_fields(self, model_path=None, weight_sets=None, index_type='flat', adaptive=True, top_k=10):
+        """
+        Compare l'index à vecteur unique et la représentation multi-vecteurs par champ
+        Les champs sont encodés une seule fois; seuls les poids de fusion changent
+        
+        Args:
+            model_path: Modèle bi-encoder (défaut: modèle fine-tuné)
+            weight_sets: Poids à tester ('title:0.3,plot:0.7', défaut: config.FIELD_WEIGHTS)
+            index_type: Type d'index FAISS de chaque champ
+            adaptive: Applique le filtre adaptatif de production
+            top_k: Profondeur de la liste évaluée
+        
+        Returns:
+            Liste de dictionnaires, un par configuration
+        """
+        print("\n" + "="*70)
+        print(f"Représentation multi-vecteurs (index {index_type})")
+        print("="*70 + "\n")
+        
+        retriever, encoder = self.build_retriever(model_path or config.FINE_TUNED_MODEL_PATH, index_type)
+        
+        def run(name, embeddings_bytes):
+            metrics, _ = self.run_queries(retriever, encoder, top_k=top_k, adaptive=adaptive)
+            return {
+                'representation': name,
+                'mrr': metrics['mrr'],
+                'precision_at_1': metrics['precision_at_1'],
+                'recall_at_10': metrics['recall_at_10'],
+                'faiss_search_ms': metrics['stages_mean_ms'].get('faiss_search'),
+                'search_p95_ms': metrics['search_p95_ms'],
+                'embeddings_mb': round(embeddings_bytes / 1024**2, 3)
+            }
+        
+        report = [run('single', retriever.embeddings.nbytes)]
+        
+        start = time.perf_counter()
+        fields = encode_fields(retriever.model, retriever.movies_df,
+                               config.PLOT_CHUNK_WORDS, config.PLOT_MAX_CHUNKS)
+        print(f"Champs encodés en {time.perf_counter() - start:.1f}s")
+        fields_bytes = sum(e.nbytes for e in fields.values())
+        
+        for weights in weight_sets or [config.FIELD_WEIGHTS]:
+            retriever.index = MultiVectorIndex(fields, weights=weights, index_type=index_type)
+            report.append(run(weights, fields_bytes))
+        
+        print(f"\n{'représentation':<40} {'MRR':>7} {'P@1':>7} {'R@10':>7} {'faiss ms':>9} {'p95 ms':>8} {'MB':>7}")
+        for r in report:
+            print(f"{r['representation']:<40} {r['mrr']:>7.3f} {r['precision_at_1']:>7.1%} {r['recall_at_10']:>7.1%} "
+                  f"{r['faiss_search_ms']:>9.3f} {r['search_p95_ms']:>8.2f} {r['embeddings_mb']:>7.2f}")
+        
+        os.makedirs(DOCS_DIR, exist_ok=True)
+        output_file = os.path.join(DOCS_DIR, 'fields_evaluation.csv')
+        pd.DataFrame(report).to_csv(output_file, index=False)
+        print(f"\nRésultats sauvegardés: {output_file}")
+        
+        return report
+    
+    def evaluate_reranking(self, model_path=None, rerank_sizes=(0, 10, 20, 50),
+                           reranker_model=None, budget_ms=None, top_k=10, index_type='flat'):
+        """
+        Mesure le compromis latence/qualité du reranking cross-encoder pour chaque N
+        Passe par MovieRetriever.search, le chemin de production
+        
+        Args:
+            model_path: Modèle bi-encoder (défaut: modèle fine-tuné)
+            rerank_sizes: Valeurs de N à tester (0 = recherche dense seule)
+            reranker_model: Cross-encoder à utiliser (défaut: config.RERANKER_MODEL)
+            budget_ms: Budget de latence par requête (None = illimité)
+            top_k: Profondeur de la liste évaluée
+            index_type: Type d'index FAISS
+        
+        Returns:
+            Liste de dictionnaires de métriques, un par valeur de N
+        """
+        print("\n" + "="*70)
+        print("Évaluation du reranking cross-encoder")
+        print("="*70 + "\n")
+        
+        retriever, _ = self.build_retriever(
+            model_path or config.FINE_TUNED_MODEL_PATH, index_type, rerank_top_n=max(rerank_sizes) or 1,
+            reranker_model=reranker_model, budget_ms=budget_ms
+        )
+        reranker = retriever.reranker
+        
+        # Chauffe du modèle pour ne pas compter l'initialisation paresseuse
+        retriever.search(self.test_queries[0]['query'], top_k=top_k, adaptive=False, rerank_top_n=max(rerank_sizes))
+        reranker.clear_cache()
+        
+        report = []
+        for n in rerank_sizes:
+            latencies = []
+            reciprocal_ranks = []
+            hits_at_1 = 0
+            hits_at_5 = 0
+            degraded = 0
+            
+            for labelled in self.test_queries:
+                start = time.perf_counter()
+                results = retriever.search(labelled['query'], top_k=top_k, adaptive=False, rerank_top_n=n)
+                latencies.append((time.perf_counter() - start) * 1000)
+                
+                if n > 0 and all(r['rerank_score'] is None for r in results):
+                    degraded += 1
+                
+                rank = self.rank_of(labelled, [r['title'] for r in results])
+                reciprocal_ranks.append(1 / rank if rank else 0.0)
+                if rank == 1:
+                    hits_at_1 += 1
+                if rank and rank <= 5:
+                    hits_at_5 += 1
+            
+            # Vide le cache pour que chaque N paie le vrai coût du cross-encoder
+            reranker.clear_cache()
+            
+            n_queries = len(self.test_queries)
+            report.append({
+                'rerank_top_n': n,
+                'mrr': float(np.mean(reciprocal_ranks)),
+                'precision_at_1': hits_at_1 / n_queries,
+                'precision_at_5': hits_at_5 / n_queries,
+                'latency_p50_ms': float(np.percentile(latencies, 50)),
+                'latency_p95_ms': float(np.percentile(latencies, 95)),
+                'degraded_queries': degraded
+            })
+        
+        print(f"\n{'N':>4} {'MRR':>7} {'P@1':>7} {'P@5':>7} {'p50 ms':>9} {'p95 ms':>9} {'dégradées':>10}")
+        for r in report:
+            print(f"{r['rerank_top_n']:>4} {r['mrr']:>7.3f} {r['precision_at_1']:>7.1%} "
+                  f"{r['precision_at_5']:>7.1%} {r['latency_p50_ms']:>9.1f} "
+                  f"{r['latency_p95_ms']:>9.1f} {r['degraded_queries']:>10}")
+        
+        os.makedirs(DOCS_DIR, exist_ok=True)
+        output_file = os.path.join(DOCS_DIR, 'rerank_evaluation.csv')
+        pd.DataFrame(report).to_csv(output_file, index=False)
+        print(f"\nRésultats sauvegardés: {output_file}")
+        
+        return report
+    
+    def check_parser(self, model_path=None, top_k=10):
+        """
+        Test de non-régression de l'analyseur de requêtes sur les requêtes étiquetées
+        Une requête échoue si ses contraintes excluent tous les films attendus du catalogue,
+        ou si le titre attendu, trouvé dans le top_k sans analyseur, ne l'est plus avec
+        
+        Args:
+            model_path: Modèle bi-encoder (défaut: modèle fine-tuné)
+            top_k: Profondeur de la liste évaluée
+        
+        Returns:
+            Liste des échecs (dictionnaires query, expected, reason), vide si tout passe
+        """
+        print("\n" + "="*70)
+        print("Non-régression de l'analyseur de requêtes")
+        print("="*70 + "\n")
+        
+        retriever, _ = self.build_retriever(model_path or config.FINE_TUNED_MODEL_PATH)
+        parser = retriever.query_parser or QueryParser()
+        titles = self.movies_df['title'].astype(str).str.lower()
+        columns = retriever.result_columns
+        
+        failures = []
+        for labelled in self.test_queries:
+            parsed = parser.parse(labelled['query'])
+            expected = labelled['expected'] or ",".join(map(str, sorted(labelled['movie_ids'])))
+            
+            if labelled['expected']:
+                rows = np.flatnonzero(titles.str.contains(labelled['expected'].lower(), regex=False).to_numpy())
+            else:
+                rows = np.flatnonzero(self.movies_df['id'].isin(labelled['movie_ids']).to_numpy())
+            if parsed.has_constraints() and len(rows) and not any(
+                    parsed.matches(columns['year'][i], columns['rating'][i], columns['genres'][i]) for i in rows):
+                failures.append({'query': labelled['query'], 'expected': expected,
+                                 'reason': f"filtré par {parsed.filters}"})
+                continue
+            
+            retriever.set_query_parser(None)
+            rank_without = self.rank_of(labelled, [r['title'] for r in retriever.search(labelled['query'], top_k=top_k)])
+            retriever.set_query_parser(parser)
+            rank_with = self.rank_of(labelled, [r['title'] for r in retriever.search(labelled['query'], top_k=top_k)])
+            if rank_without and not rank_with:
+                failures.append({'query': labelled['query'], 'expected': expected,
+                                 'reason': f"rang {rank_without} sans analyseur, absent avec (texte '{parsed.text}')"})
+        
+        for failure in failures:
+            print(f"ÉCHEC {failure['query']!r} ({failure['expected']}): {failure['reason']}")
+        print(f"{len(self.test_queries) - len(failures)}/{len(self.test_queries)} requêtes sans régression")
+        
+        return failures
 
 
 def main():
@@ -240,8 +730,63 @@ def main():
     print("# ÉVALUATION DES MODÈLES")
     print("#"*70 + "\n")
     
-    evaluator = ModelEvaluator()
-    evaluator.compare_models()
+    parser = argparse.ArgumentParser(description="Évaluation des modèles CineSphere")
+    parser.add_argument('--models', nargs='+', default=None, metavar='NOM=CHEMIN',
+                        help="Modèles à comparer (défaut: base et fine-tuné)")
+    parser.add_argument('--queries', default=None,
+                        help="Requêtes étiquetées (CSV/JSONL: query, expected et/ou movie_id)")
+    parser.add_argument('--val-queries', type=int, default=0,
+                        help="Ajoute N requêtes tirées du split de validation des paires")
+    parser.add_argument('--index-type', choices=INDEX_TYPES, default='flat', help="Type d'index FAISS")
+    parser.add_argument('--rerank-top-n', type=int, default=0,
+                        help="Candidats rescorés par le cross-encoder pendant la comparaison")
+    parser.add_argument('--no-adaptive', action='store_true', help="Désactive le filtre adaptatif")
+    parser.add_argument('--workers', type=int, default=None, help="Modèles évalués simultanément")
+    parser.add_argument('--dims', type=int, nargs='+', default=None,
+                        help="Courbe qualité/latence/mémoire pour ces dimensions d'index (ex. 64 128 256)")
+    parser.add_argument('--reduction', choices=REDUCTIONS, default='pca',
+                        help="Réduction de dimension: pca, ou truncate pour un modèle Matryoshka")
+    parser.add_argument('--storage', choices=STORAGE_MODES, nargs='+', default=None,
+                        help="Compare mémoire et qualité des modes de stockage (float, int8, binary)")
+    parser.add_argument('--rescore-factor', type=int, default=None,
+                        help="Candidats rescorés en float = facteur x k (défaut: RESCORE_FACTOR)")
+    parser.add_argument('--fields', nargs='+', default=None, metavar='POIDS',
+                        help="Compare le vecteur unique aux champs fusionnés (ex. title:0.3,keywords:0.3,plot:0.4)")
+    parser.add_argument('--rerank', action='store_true',
+                        help="Mesure le compromis latence/qualité du reranking cross-encoder")
+    parser.add_argument('--rerank-sizes', type=int, nargs='+', default=[0, 10, 20, 50],
+                        help="Valeurs de N (candidats rescorés) à comparer")
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help="Budget de latence par requête pour le reranking")
+    parser.add_argument('--check-parser', action='store_true',
+                        help="Vérifie que l'analyseur de requêtes ne fait perdre aucun titre attendu (code 1 sinon)")
+    args = parser.parse_args()
+    
+    models = dict(m.split('=', 1) for m in args.models) if args.models else None
+    
+    evaluator = ModelEvaluator(query_file=args.queries, val_queries=args.val_queries)
+    if args.check_parser:
+        model_path = next(iter(models.values())) if models else None
+        if evaluator.check_parser(model_path):
+            sys.exit(1)
+    elif args.dims:
+        model_path = next(iter(models.values())) if models else None
+        evaluator.evaluate_dimensions(model_path, dims=args.dims, index_type=args.index_type,
+                                     reduction=args.reduction, adaptive=not args.no_adaptive)
+    elif args.storage:
+        model_path = next(iter(models.values())) if models else None
+        evaluator.evaluate_storage(model_path, modes=args.storage, index_type=args.index_type,
+                                   rescore_factor=args.rescore_factor, adaptive=not args.no_adaptive)
+    elif args.fields:
+        model_path = next(iter(models.values())) if models else None
+        evaluator.evaluate_fields(model_path, weight_sets=args.fields, index_type=args.index_type,
+                                  adaptive=not args.no_adaptive)
+    elif args.rerank:
+        evaluator.evaluate_reranking(rerank_sizes=args.rerank_sizes, budget_ms=args.budget_ms,
+                                     index_type=args.index_type)
+    else:
+        evaluator.compare_models(models, index_type=args.index_type, rerank_top_n=args.rerank_top_n,
+                                 adaptive=not args.no_adaptive, max_workers=args.workers)
     
     print("\n" + "#"*70)
     print("# ÉVALUATION TERMINÉE")
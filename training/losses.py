@@ -0,0 +1,185 @@
+"""
+MultipleNegativesRankingLoss avec cache de gradients (GradCache)
+Permet des batches effectifs plus grands (plus de négatifs par pas) à mémoire fixe:
+les embeddings sont calculés par sous-batches sans graphe, la loss est calculée
+sur le batch complet, puis chaque sous-batch est recalculé avec graphe et
+rétropropagé avec le gradient mis en cache. Résultat identique à MNRL.
+
+Objectif Matryoshka optionnel: la loss est moyennée sur les préfixes des embeddings
+(par exemple 64, 128, 256 et la dimension complète), si bien que les premières
+composantes portent l'essentiel de l'information et qu'un index tronqué reste bon.
+
+Références: Gao et al., "Scaling Deep Contrastive Learning Batch Size under
+Memory Limited Setup" (2021); Kusupati et al., "Matryoshka Representation
+Learning" (2022)
+"""
+
+from functools import partial
+
+import torch
+from torch import nn
+from sentence_transformers import util
+
+
+def ranking_loss(reps, scale, cross_entropy_loss, dims=None):
+    """
+    MNRL sur des embeddings déjà calculés
+
+    Args:
+        reps: [requêtes, positifs, négatifs éventuels], tenseurs (batch, dim)
+        scale: Facteur appliqué aux similarités cosinus
+        cross_entropy_loss: Instance de nn.CrossEntropyLoss
+        dims: Préfixes Matryoshka (None: dimension complète seulement)
+
+    Returns:
+        Loss moyennée sur les dimensions
+    """
+    embeddings_a = reps[0]
+    embeddings_b = torch.cat(reps[1:])
+    labels = torch.arange(len(embeddings_a), dtype=torch.long, device=embeddings_a.device)
+
+    losses = []
+    for dim in dims or (None,):
+        scores = util.cos_sim(embeddings_a[:, :dim], embeddings_b[:, :dim]) * scale
+        losses.append(cross_entropy_loss(scores, labels))
+    return sum(losses) / len(losses)
+
+
+def matryoshka_dims(dims, dimension=None):
+    """Préfixes triés et dédupliqués, complétés par la dimension complète (None)"""
+    dims = sorted({d for d in dims if d and (dimension is None or d < dimension)})
+    return tuple(dims) + (None,) if dims else None
+
+
+class RandContext:
+    """Capture l'état des générateurs aléatoires pour rejouer le même dropout"""
+
+    def __init__(self):
+        self.cpu_state = torch.get_rng_state()
+        self.cuda_states = torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None
+
+    def __enter__(self):
+        self._fork = torch.random.fork_rng(devices=range(torch.cuda.device_count()))
+        self._fork.__enter__()
+        torch.set_rng_state(self.cpu_state)
+        if self.cuda_states is not None:
+            torch.cuda.set_rng_state_all(self.cuda_states)
+
+    def __exit__(self, *exc):
+        self._fork.__exit__(*exc)
+
+
+def _backward_hook(grad_output, sentence_features, loss_obj):
+    """Second passage: recalcule chaque sous-batch avec graphe et rétropropage le gradient caché"""
+    device_type, dtype, enabled = loss_obj.autocast
+    with torch.enable_grad(), torch.autocast(device_type=device_type, dtype=dtype, enabled=enabled):
+        for column, cached_grads, rand_states in zip(sentence_features, loss_obj.cache, loss_obj.rand_states):
+            for (begin, end), grad, rand_state in zip(loss_obj.chunks(column), cached_grads, rand_states):
+                with rand_state:
+                    reps = loss_obj.embed(column, begin, end)
+                surrogate = torch.dot(reps.flatten(), (grad * grad_output).to(reps.dtype).flatten())
+                surrogate.backward()
+
+    loss_obj.cache = None
+    loss_obj.rand_states = None
+
+
+class CachedMultipleNegativesRankingLoss(nn.Module):
+    """
+    MNRL (cosinus x scale, négatifs dans le batch et négatifs difficiles éventuels)
+    dont la mémoire d'activations est bornée par mini_batch_size et non par la taille du batch
+    """
+
+    def __init__(self, model, scale=20.0, mini_batch_size=32, dims=None):
+        """
+        Args:
+            model: SentenceTransformer
+            scale: Facteur appliqué aux similarités cosinus
+            mini_batch_size: Taille des sous-batches encodés avec graphe
+            dims: Préfixes de l'objectif Matryoshka (None: désactivé)
+        """
+        super().__init__()
+        self.model = model
+        self.scale = scale
+        self.mini_batch_size = mini_batch_size
+        self.dims = matryoshka_dims(dims or [], model.get_sentence_embedding_dimension())
+        self.cross_entropy_loss = nn.CrossEntropyLoss()
+        self.cache = None
+        self.rand_states = None
+        self.autocast = ('cpu', torch.bfloat16, False)
+
+    def chunks(self, features):
+        size = len(next(iter(features.values())))
+        return [(begin, min(begin + self.mini_batch_size, size)) for begin in range(0, size, self.mini_batch_size)]
+
+    def embed(self, features, begin, end):
+        chunk = {name: value[begin:end] for name, value in features.items()}
+        return self.model(chunk)['sentence_embedding']
+
+    def calculate_loss(self, reps):
+        return ranking_loss(reps, self.scale, self.cross_entropy_loss, self.dims)
+
+    def forward(self, sentence_features, labels):
+        sentence_features = list(sentence_features)
+
+        # Le second passage (pendant backward) doit rejouer la même précision
+        if torch.is_autocast_enabled():
+            self.autocast = ('cuda', torch.get_autocast_gpu_dtype(), True)
+        elif torch.is_autocast_cpu_enabled():
+            self.autocast = ('cpu', torch.get_autocast_cpu_dtype(), True)
+        else:
+            self.autocast = ('cpu', torch.bfloat16, False)
+
+        # Premier passage sans graphe: embeddings du batch complet, par sous-batches
+        reps = []
+        self.rand_states = []
+        with torch.no_grad():
+            for column in sentence_features:
+                column_reps, column_states = [], []
+                for begin, end in self.chunks(column):
+                    column_states.append(RandContext())
+                    column_reps.append(self.embed(column, begin, end).detach())
+                reps.append(column_reps)
+                self.rand_states.append(column_states)
+
+        reps = [[chunk.requires_grad_() for chunk in column] for column in reps]
+        loss = self.calculate_loss([torch.cat(column) for column in reps])
+
+        if not torch.is_grad_enabled():
+            self.rand_states = None
+            return loss
+
+        # Gradient de la loss par rapport aux embeddings, mis en cache pour le second passage
+        loss.backward()
+        self.cache = [[chunk.grad for chunk in column] for column in reps]
+
+        loss = loss.detach().requires_grad_()
+        loss.register_hook(partial(_backward_hook, sentence_features=sentence_features, loss_obj=self))
+        return loss
+
+    def get_config_dict(self):
+        return {'scale': self.scale, 'mini_batch_size': self.mini_batch_size, 'dims': self.dims}
+
+
+class MatryoshkaMultipleNegativesRankingLoss(nn.Module):
+    """MNRL sans cache de gradients, moyennée sur les préfixes Matryoshka"""
+
+    def __init__(self, model, dims, scale=20.0):
+        """
+        Args:
+            model: SentenceTransformer
+            dims: Préfixes des embeddings entraînés (ex. [64, 128, 256])
+            scale: Facteur appliqué aux similarités cosinus
+        """
+        super().__init__()
+        self.model = model
+        self.scale = scale
+        self.dims = matryoshka_dims(dims, model.get_sentence_embedding_dimension())
+        self.cross_entropy_loss = nn.CrossEntropyLoss()
+
+    def forward(self, sentence_features, labels):
+        reps = [self.model(features)['sentence_embedding'] for features in sentence_features]
+        return ranking_loss(reps, self.scale, self.cross_entropy_loss, self.dims)
+
+    def get_config_dict(self):
+        return {'scale': self.scale, 'dims': self.dims}
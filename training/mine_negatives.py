@@ -0,0 +1,301 @@
+"""
+Extraction de négatifs difficiles avec l'index FAISS courant
+Chaque requête d'entraînement est encodée avec le modèle courant et cherchée dans
+l'index du catalogue; un film bien classé qui n'est pas le positif devient le
+négatif du triplet (requête, positif, négatif) utilisé par la loss. Un modèle
+réentraîné ou un index reconstruit (version et empreintes du manifeste) invalide
+l'extraction précédente, qui est alors refaite entièrement.
+
+Le travail est découpé par shard de paires: un shard déjà traité n'est pas refait,
+si bien qu'une extraction interrompue reprend là où elle s'était arrêtée.
+
+Usage:
+    python -m training.mine_negatives
+    python -m training.mine_negatives --depth 50 --threads 8 --restart
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import time
+
+import faiss
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+import config
+from movie_retriever import MovieRetriever
+from artifacts import CHECKPOINTS_DIR, index_files, read_manifest as read_index_manifest
+
+from training.pair_store import (
+    MINING_FILE, TOKEN_CACHE_DIR, TRIPLET_SCHEMA, TRIPLETS_DIR, read_manifest, shard_paths
+)
+
+
+def model_mtime(model_path):
+    """Date de modification la plus récente des fichiers d'un modèle local (None pour un modèle du hub)"""
+    if model_path is None or not os.path.isdir(model_path):
+        return None
+    latest = None
+    for root, dirs, files in os.walk(model_path):
+        dirs[:] = [d for d in dirs if d != CHECKPOINTS_DIR]
+        for name in files:
+            latest = max(latest or 0.0, os.path.getmtime(os.path.join(root, name)))
+    return latest
+
+
+class HardNegativeMiner:
+    """Extrait un négatif difficile par paire d'entraînement"""
+
+    def __init__(self, retriever, depth=30, skip_top=0, candidates=10, max_similarity_ratio=0.95,
+                 batch_size=4096, seed=42, index_manifest=None):
+        """
+        Args:
+            retriever: MovieRetriever avec catalogue, index et embeddings chargés
+            depth: Nombre de voisins cherchés par requête
+            skip_top: Rangs de tête ignorés (souvent des faux négatifs)
+            candidates: Le négatif est tiré parmi les `candidates` premiers films éligibles
+            max_similarity_ratio: Un film plus similaire que ratio x similarité du positif
+                est considéré comme un faux négatif probable et écarté
+            batch_size: Requêtes encodées et cherchées par lot
+            seed: Graine du tirage
+            index_manifest: Manifeste de la version d'index chargée (src/artifacts.py), None pour
+                un index historique non versionné
+        """
+        self.retriever = retriever
+        self.depth = depth
+        self.skip_top = skip_top
+        self.candidates = candidates
+        self.max_similarity_ratio = max_similarity_ratio
+        self.batch_size = batch_size
+        self.seed = seed
+        self.index_manifest = index_manifest
+
+        self.catalog_ids = retriever.movies_df['id'].to_numpy(dtype=np.int64)
+        self.id_to_row = {movie_id: row for row, movie_id in enumerate(self.catalog_ids.tolist())}
+
+    def params(self):
+        """
+        Paramètres qui déterminent le résultat (une reprise exige les mêmes): réglages,
+        version et empreintes de l'index, chemin et date de modification du modèle
+        """
+        manifest = self.index_manifest
+        model_path = self.retriever.model_path
+        return {
+            'depth': self.depth,
+            'skip_top': self.skip_top,
+            'candidates': self.candidates,
+            'max_similarity_ratio': self.max_similarity_ratio,
+            'seed': self.seed,
+            'index_vectors': int(self.retriever.index.ntotal),
+            'index_version': manifest['version'] if manifest else None,
+            'index_catalog_hash': manifest['catalog_hash'] if manifest else None,
+            'index_model_fingerprint': manifest['model_fingerprint'] if manifest else None,
+            'model': str(model_path) if model_path else None,
+            'model_mtime': model_mtime(model_path)
+        }
+
+    def mine_batch(self, queries, positive_ids, rng):
+        """
+        Cherche les négatifs d'un lot de requêtes
+
+        Args:
+            queries: Liste de requêtes
+            positive_ids: Tableau des movie_id positifs
+            rng: Générateur aléatoire numpy
+
+        Returns:
+            Tableau des movie_id négatifs (-1 si aucun film éligible)
+        """
+        embeddings = self.retriever.model.encode(queries, batch_size=256, show_progress_bar=False)
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+
+        # Une seule recherche FAISS par lot: parallélisée sur les coeurs par OpenMP
+        distances, indices = self.retriever.search_vectors(embeddings, self.depth + 1)
+        similarities = 1 / (1 + distances)
+
+        # Similarité du positif mesurée dans l'espace de l'index (réduit ou non)
+        positive_rows = np.array([self.id_to_row.get(m, -1) for m in positive_ids.tolist()])
+        positive_similarity = np.full(len(queries), np.inf)
+        known = positive_rows >= 0
+        if known.any():
+            diff = (self.retriever.project(embeddings[known])
+                    - self.retriever.project(self.retriever.embeddings[positive_rows[known]]))
+            positive_similarity[known] = 1 / (1 + np.einsum('ij,ij->i', diff, diff))
+
+        candidate_ids = np.where(indices >= 0, self.catalog_ids[np.maximum(indices, 0)], -1)
+        eligible = (
+            (indices >= 0)
+            & (candidate_ids != positive_ids[:, None])
+            & (similarities < self.max_similarity_ratio * positive_similarity[:, None])
+        )
+        eligible[:, :self.skip_top] = False
+
+        negatives = np.full(len(queries), -1, dtype=np.int64)
+        for i in range(len(queries)):
+            choices = candidate_ids[i, eligible[i]][:self.candidates]
+            if len(choices):
+                negatives[i] = choices[rng.integers(len(choices))]
+        return negatives
+
+    def mine_shard(self, input_path, output_path, shard_index):
+        """Traite un shard de paires et écrit le shard de triplets (écriture atomique)"""
+        pairs = pq.read_table(input_path).to_pandas()
+        rng = np.random.default_rng([self.seed, shard_index])
+
+        queries = pairs['query'].astype(str).tolist()
+        positive_ids = pairs['movie_id'].to_numpy(dtype=np.int64)
+        negatives = np.empty(len(pairs), dtype=np.int64)
+
+        for start in range(0, len(pairs), self.batch_size):
+            stop = start + self.batch_size
+            negatives[start:stop] = self.mine_batch(queries[start:stop], positive_ids[start:stop], rng)
+
+        # Sans candidat éligible, un film tiré au hasard sert de négatif (facile):
+        # le jeu d'entraînement garde toutes ses paires
+        missing = np.flatnonzero(negatives < 0)
+        for i in missing:
+            negative = positive_ids[i]
+            while negative == positive_ids[i] and len(self.catalog_ids) > 1:
+                negative = self.catalog_ids[rng.integers(len(self.catalog_ids))]
+            negatives[i] = negative
+
+        table = pa.table({
+            'query': pa.array(queries, type=pa.string()),
+            'movie_id': pa.array(positive_ids, type=pa.int64()),
+            'negative_id': pa.array(negatives, type=pa.int64()),
+            'level': pa.array(pairs['level'].to_numpy(), type=pa.int8())
+        }, schema=TRIPLET_SCHEMA)
+
+        tmp_path = f"{output_path}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, output_path)
+
+        return len(pairs), len(pairs) - len(missing)
+
+    def mine(self, directory, restart=False):
+        """
+        Extrait les triplets de tous les shards d'entraînement
+
+        Args:
+            directory: Dossier des paires (voir training.pair_store)
+            restart: Ignore les shards déjà traités
+
+        Returns:
+            Résumé de l'extraction (aussi écrit dans mining.json)
+        """
+        input_shards = shard_paths(directory, 'train')
+        output_dir = os.path.join(directory, TRIPLETS_DIR)
+        mining_path = os.path.join(output_dir, MINING_FILE)
+
+        previous = None
+        if os.path.exists(mining_path):
+            with open(mining_path) as f:
+                previous = json.load(f)
+
+        if restart or (previous is not None and previous['params'] != self.params()):
+            if previous is not None and not restart:
+                print("Paramètres, index ou modèle différents de l'extraction précédente: on repart de zéro")
+            shutil.rmtree(output_dir, ignore_errors=True)
+            previous = None
+        os.makedirs(output_dir, exist_ok=True)
+
+        # Les triplets vont changer: les batches tokenisés en cache sont périmés
+        stale = glob.glob(os.path.join(directory, TOKEN_CACHE_DIR, '*', f"{TRIPLETS_DIR}-*.pt"))
+        for cached in stale if previous is None or not previous['complete'] else []:
+            os.remove(cached)
+
+        summary = {'params': self.params(), 'shards': {}, 'complete': False}
+        if previous is not None:
+            summary['shards'] = previous['shards']
+
+        start_time = time.time()
+        for shard_index, input_path in enumerate(input_shards):
+            name = os.path.basename(input_path)
+            output_path = os.path.join(output_dir, name)
+            if name in summary['shards'] and os.path.exists(output_path):
+                print(f"   {name}: déjà traité")
+                continue
+
+            shard_start = time.time()
+            pairs, hard = self.mine_shard(input_path, output_path, shard_index)
+            summary['shards'][name] = {'pairs': pairs, 'hard_negatives': hard}
+
+            # Sauvegarde après chaque shard: point de reprise
+            self._write_summary(mining_path, summary)
+            elapsed = time.time() - shard_start
+            print(f"   {name}: {hard}/{pairs} négatifs difficiles ({pairs / max(elapsed, 1e-9):.0f} requêtes/s)")
+
+        summary['complete'] = True
+        summary['pairs'] = sum(s['pairs'] for s in summary['shards'].values())
+        summary['hard_negatives'] = sum(s['hard_negatives'] for s in summary['shards'].values())
+        summary['elapsed_seconds'] = round(time.time() - start_time, 1)
+        self._write_summary(mining_path, summary)
+
+        return summary
+
+    @staticmethod
+    def _write_summary(path, summary):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def main(argv=None):
+    """Point d'entrée de l'extraction des négatifs difficiles"""
+    parser = argparse.ArgumentParser(description="Extraction de négatifs difficiles")
+    parser.add_argument('--depth', type=int, default=30, help="Voisins cherchés par requête")
+    parser.add_argument('--skip-top', type=int, default=0, help="Rangs de tête ignorés")
+    parser.add_argument('--candidates', type=int, default=10, help="Tirage parmi les N premiers éligibles")
+    parser.add_argument('--max-similarity-ratio', type=float, default=0.95)
+    parser.add_argument('--batch-size', type=int, default=4096, help="Requêtes par recherche FAISS")
+    parser.add_argument('--threads', type=int, default=None, help="Threads OpenMP de FAISS")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--restart', action='store_true', help="Ignore les shards déjà traités")
+    args = parser.parse_args(argv)
+
+    print("\n" + "="*70)
+    print("EXTRACTION DE NÉGATIFS DIFFICILES")
+    print("="*70 + "\n")
+
+    if read_manifest(config.TRAINING_DATA_DIR) is None:
+        print(f"Erreur: paires introuvables dans {config.TRAINING_DATA_DIR}")
+        print("Exécutez d'abord: python -m training.data_generator")
+        sys.exit(1)
+
+    index_path, embeddings_path = index_files(config.ARTIFACTS_DIR)
+    if not os.path.exists(index_path):
+        print(f"Erreur: index introuvable ({index_path})")
+        print("Exécutez d'abord: python -m src.index_builder")
+        sys.exit(1)
+
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+
+    retriever = MovieRetriever(use_trained=True)
+    retriever.load_movies(config.MOVIES_CSV)
+    retriever.load_index(index_path, embeddings_path)
+
+    miner = HardNegativeMiner(
+        retriever, depth=args.depth, skip_top=args.skip_top, candidates=args.candidates,
+        max_similarity_ratio=args.max_similarity_ratio, batch_size=args.batch_size, seed=args.seed,
+        index_manifest=read_index_manifest(config.ARTIFACTS_DIR)
+    )
+
+    print(f"\nExtraction sur {len(shard_paths(config.TRAINING_DATA_DIR, 'train'))} shards "
+          f"(threads FAISS: {faiss.omp_get_max_threads()})")
+    summary = miner.mine(config.TRAINING_DATA_DIR, restart=args.restart)
+
+    print(f"\n{summary['pairs']} triplets ({summary['hard_negatives']} négatifs difficiles) écrits dans "
+          f"{os.path.join(config.TRAINING_DATA_DIR, TRIPLETS_DIR)} en {summary['elapsed_seconds']} s")
+    print("Prochaine étape: python -m training.train")
+
+
+if __name__ == "__main__":
+    main()
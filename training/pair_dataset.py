@@ -0,0 +1,272 @@
+"""
+Chargement en flux des paires d'entraînement pour ModelTrainer
+Les shards Parquet sont lus et tokenisés dans les processus workers du DataLoader;
+les batches tokenisés peuvent être mis en cache sur disque et rejoués aux époques suivantes
+"""
+
+import json
+import os
+import re
+
+import numpy as np
+import pyarrow.parquet as pq
+import torch
+from torch.utils.data import DataLoader, IterableDataset, get_worker_info
+
+from training.pair_store import TOKEN_CACHE_DIR, read_movie_texts, shard_paths
+
+
+def unique_batches(queries, movie_ids, batch_size, negative_ids=None):
+    """
+    Découpe des lignes (déjà mélangées) en batches sans doublon de requête ni de film
+    Sous MNRL, deux paires du même film (ou de la même requête) dans un batch
+    font de l'une le faux négatif de l'autre. Une ligne en conflit est reportée
+    au passage suivant; l'ordre du mélange est conservé autant que possible.
+    Avec des négatifs difficiles, un film ne peut être à la fois positif d'une
+    ligne et négatif d'une autre dans le même batch.
+    
+    Args:
+        queries: Séquence des requêtes
+        movie_ids: Séquence des films positifs
+        batch_size: Taille maximale des batches
+        negative_ids: Séquence des films négatifs (optionnel)
+    
+    Returns:
+        Tuple (batches, dropped): listes d'indices de lignes (batches d'au moins 2 lignes)
+        et indices des lignes écartées. Quand un passage ne progresse plus (lignes toutes
+        en conflit entre elles), chaque ligne restante rejoint un batch incomplet sans
+        conflit; les autres sont écartées et doivent être signalées par l'appelant.
+    """
+    def row_movies(i):
+        return {movie_ids[i]} if negative_ids is None else {movie_ids[i], negative_ids[i]}
+    
+    batches, open_batches, dropped = [], [], []
+    remaining = range(len(queries))
+    
+    while len(remaining):
+        deferred = []
+        batch, seen_queries, seen_movies = [], set(), set()
+        for i in remaining:
+            movies = row_movies(i)
+            if queries[i] in seen_queries or not seen_movies.isdisjoint(movies):
+                deferred.append(i)
+                continue
+            
+            batch.append(i)
+            seen_queries.add(queries[i])
+            seen_movies |= movies
+            if len(batch) == batch_size:
+                batches.append(batch)
+                batch, seen_queries, seen_movies = [], set(), set()
+        
+        if len(batch) >= 2:
+            batches.append(batch)
+            open_batches.append((batch, seen_queries, seen_movies))
+        elif batch:
+            deferred.extend(batch)
+        
+        if len(deferred) < len(remaining):
+            remaining = deferred
+            continue
+        
+        # Aucun progrès: dernière chance dans les batches incomplets des passages précédents
+        for i in deferred:
+            movies = row_movies(i)
+            for batch, seen_queries, seen_movies in open_batches:
+                if len(batch) < batch_size and queries[i] not in seen_queries and seen_movies.isdisjoint(movies):
+                    batch.append(i)
+                    seen_queries.add(queries[i])
+                    seen_movies |= movies
+                    break
+            else:
+                dropped.append(i)
+        break
+    
+    return batches, dropped
+
+
+class PairStream(IterableDataset):
+    """
+    Flux de batches tokenisés (features, labels) au format attendu par les losses
+    de sentence-transformers: (requête, film) ou, pour les shards de triplets,
+    (requête, film, négatif difficile). Chaque worker traite un sous-ensemble des shards;
+    un shard est lu en entier, mélangé puis découpé en batches, si bien que la
+    mémoire est bornée par la taille d'un shard et non par celle du jeu de données.
+    Avec le cache des tokens, le mélange d'un shard (donc la composition de ses batches) est le même
+    à chaque époque, seul l'ordre des shards et des batches change: c'est le prix du rejeu du cache.
+    Sans cache, l'époque entre dans la graine du mélange et les batches changent à chaque époque.
+    """
+
+    def __init__(self, directory, split, tokenize, batch_size=32, seed=42, cache_dir=None):
+        """
+        Args:
+            directory: Dossier des paires (voir training.pair_store)
+            split: 'train', 'val' ou 'train_triplets'
+            tokenize: Fonction de tokenisation (ex: SentenceTransformer.tokenize)
+            batch_size: Nombre de paires par batch
+            seed: Graine du mélange
+            cache_dir: Dossier du cache des batches tokenisés (None: pas de cache)
+        """
+        self.directory = directory
+        self.split = split
+        self.tokenize = tokenize
+        self.batch_size = batch_size
+        self.seed = seed
+        self.cache_dir = cache_dir
+        self.epoch = 0
+
+        self.shards = shard_paths(directory, split)
+        self.shard_rows = [pq.ParquetFile(path).metadata.num_rows for path in self.shards]
+        self.rows = sum(self.shard_rows)
+        self.with_negatives = bool(self.shards) and 'negative_id' in pq.read_schema(self.shards[0]).names
+        
+        # Démarrage en O(nombre de shards): le découpage réel n'est connu qu'une fois un shard lu.
+        # Les shards déjà découpés (statistiques du cache) donnent leurs nombres exacts, les autres
+        # sont estimés; les reports de doublons peuvent ajouter quelques batches incomplets
+        self.n_batches, self.dropped_rows, self.planned_shards = 0, 0, 0
+        for shard_index, rows in enumerate(self.shard_rows):
+            stats = self._read_stats(shard_index)
+            if stats is None:
+                self.n_batches += -(-rows // batch_size)
+                continue
+            self.n_batches += stats['batches']
+            self.dropped_rows += stats['dropped']
+            self.planned_shards += 1
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def __len__(self):
+        return self.n_batches
+
+    def set_epoch(self, epoch):
+        """Fixe l'époque courante (ordre des shards et des batches)"""
+        self.epoch = epoch
+
+    def _cache_path(self, shard_index):
+        return os.path.join(self.cache_dir, f"{self.split}-{shard_index:05d}.pt")
+
+    def _stats_path(self, shard_index):
+        return os.path.join(self.cache_dir, f"{self.split}-{shard_index:05d}.json")
+
+    def _read_stats(self, shard_index):
+        """Batches et lignes écartées d'un shard déjà découpé (None sans cache ou si inconnus)"""
+        if not self.cache_dir or not os.path.exists(self._stats_path(shard_index)):
+            return None
+        with open(self._stats_path(shard_index)) as f:
+            return json.load(f)
+
+    def _read_batches(self, shard_index, movie_texts):
+        """Lit, mélange et tokenise un shard"""
+        columns = ['query', 'movie_id'] + (['negative_id'] if self.with_negatives else [])
+        pairs = pq.read_table(self.shards[shard_index], columns=columns).to_pandas()
+        # Le cache rejoue le mélange de la première époque; sans cache, il change à chaque époque
+        seed = [self.seed, shard_index] if self.cache_dir else [self.seed, self.epoch, shard_index]
+        rng = np.random.default_rng(seed)
+        pairs = pairs.iloc[rng.permutation(len(pairs))]
+
+        queries = pairs['query'].astype(str).tolist()
+        texts = [movie_texts.reindex(pairs[column]).fillna('').astype(str).tolist() for column in columns[1:]]
+
+        movie_ids = pairs['movie_id'].tolist()
+        negative_ids = pairs['negative_id'].tolist() if self.with_negatives else None
+        rows_batches, dropped = unique_batches(queries, movie_ids, self.batch_size, negative_ids)
+        if dropped:
+            print(f"   {os.path.basename(self.shards[shard_index])}: {len(dropped)} lignes écartées "
+                  f"sur {len(pairs)} (aucun batch sans doublon de requête ou de film)")
+        
+        batches = []
+        for rows in rows_batches:
+            features = [self.tokenize([queries[i] for i in rows])]
+            features += [self.tokenize([column[i] for i in rows]) for column in texts]
+            batches.append((features, torch.zeros(len(rows), dtype=torch.long)))
+        return batches
+
+    def _shard_batches(self, shard_index, movie_texts):
+        """Batches d'un shard, depuis le cache si disponible"""
+        if self.cache_dir:
+            path = self._cache_path(shard_index)
+            if os.path.exists(path):
+                return torch.load(path)
+
+        batches = self._read_batches(shard_index, movie_texts())
+
+        if self.cache_dir:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            torch.save(batches, tmp_path)
+            os.replace(tmp_path, path)
+
+            # Découpage connu dès le prochain démarrage (__len__ exact, lignes écartées)
+            stats = {'batches': len(batches),
+                     'dropped': self.shard_rows[shard_index] - sum(len(labels) for _, labels in batches)}
+            stats_path = self._stats_path(shard_index)
+            with open(f"{stats_path}.{os.getpid()}.tmp", 'w') as f:
+                json.dump(stats, f)
+            os.replace(f"{stats_path}.{os.getpid()}.tmp", stats_path)
+        return batches
+
+    def __iter__(self):
+        worker = get_worker_info()
+        worker_id, n_workers = (worker.id, worker.num_workers) if worker is not None else (0, 1)
+
+        rng = np.random.default_rng([self.seed, self.epoch])
+        order = rng.permutation(len(self.shards))[worker_id::n_workers]
+
+        texts = {}
+
+        def movie_texts():
+            # La table annexe n'est lue que si un shard doit être tokenisé
+            if 'movie_text' not in texts:
+                texts['movie_text'] = read_movie_texts(self.directory)['movie_text']
+            return texts['movie_text']
+
+        for shard_index in order:
+            batches = self._shard_batches(int(shard_index), movie_texts)
+            for batch_index in rng.permutation(len(batches)):
+                yield batches[batch_index]
+
+
+class StreamingLoader:
+    """
+    DataLoader sur un PairStream, utilisable par SentenceTransformer.fit
+    fit() remplace collate_fn par sa propre fonction: l'attribut est ignoré ici
+    car les batches sortent déjà tokenisés des workers.
+    """
+
+    def __init__(self, dataset, num_workers=2, prefetch_factor=2):
+        """
+        Args:
+            dataset: PairStream
+            num_workers: Nombre de processus de chargement (0: processus principal)
+            prefetch_factor: Batches préchargés par worker
+        """
+        self.dataset = dataset
+        self.num_workers = num_workers
+        self.prefetch_factor = prefetch_factor
+        self.collate_fn = None
+        self.epoch = 0
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __iter__(self):
+        self.dataset.set_epoch(self.epoch)
+        self.epoch += 1
+
+        # Les workers sont des processus: on évite la sur-souscription des tokenizers
+        os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+
+        loader = DataLoader(
+            self.dataset,
+            batch_size=None,
+            num_workers=self.num_workers,
+            prefetch_factor=self.prefetch_factor if self.num_workers > 0 else None,
+            pin_memory=torch.cuda.is_available()
+        )
+        return iter(loader)
+
+
+def token_cache_dir(directory, model_name, batch_size, seed):
+    """Dossier de cache propre à un modèle (tokenizer), une taille de batch et une graine"""
+    name = re.sub(r'[^A-Za-z0-9_.-]+', '_', str(model_name)).strip('_')
+    return os.path.join(directory, TOKEN_CACHE_DIR, f"{name}-bs{batch_size}-seed{seed}")
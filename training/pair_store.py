@@ -0,0 +1,257 @@
+"""
+Stockage des paires d'entraînement en fichiers Parquet shardés
+Le texte de chaque film est écrit une seule fois dans une table annexe (movies/)
+référencée par movie_id; les paires (requête, movie_id, niveau) sont réparties en shards
+train/val selon un hash déterministe de movie_id
+"""
+
+import glob
+import json
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+PAIR_SCHEMA = pa.schema([
+    ('query', pa.string()),
+    ('movie_id', pa.int64()),
+    ('level', pa.int8())
+])
+
+MOVIE_SCHEMA = pa.schema([
+    ('movie_id', pa.int64()),
+    ('movie_title', pa.string()),
+    ('movie_text', pa.string())
+])
+
+TRIPLET_SCHEMA = pa.schema([
+    ('query', pa.string()),
+    ('movie_id', pa.int64()),
+    ('negative_id', pa.int64()),
+    ('level', pa.int8())
+])
+
+MANIFEST_FILE = 'manifest.json'
+MOVIES_DIR = 'movies'
+TOKEN_CACHE_DIR = 'token_cache'
+TRIPLETS_DIR = 'train_triplets'
+MINING_FILE = 'mining.json'
+
+
+def split_for(movie_ids, val_fraction=0.2):
+    """
+    Affecte chaque film à 'train' ou 'val' par hash de son identifiant
+    Toutes les paires d'un même film tombent dans le même split, quelle que soit
+    la taille du catalogue ou l'ordre de génération
+
+    Args:
+        movie_ids: Tableau d'identifiants
+        val_fraction: Fraction des films en validation
+
+    Returns:
+        Tableau booléen, True pour la validation
+    """
+    buckets = np.fromiter(
+        (zlib.crc32(str(int(m)).encode()) % 10000 for m in movie_ids),
+        dtype=np.int64, count=len(movie_ids)
+    )
+    return buckets < int(val_fraction * 10000)
+
+
+class ShardWriter:
+    """Écrit des lignes en fichiers Parquet de taille bornée (part-00000.parquet, ...)"""
+
+    def __init__(self, directory, schema, shard_size=100000, shuffle_seed=None):
+        """
+        Args:
+            directory: Dossier des shards
+            schema: Schéma pyarrow des lignes
+            shard_size: Nombre de lignes par shard
+            shuffle_seed: Si défini, mélange chaque shard avant écriture
+        """
+        self.directory = directory
+        self.schema = schema
+        self.shard_size = shard_size
+        self.rng = np.random.default_rng(shuffle_seed) if shuffle_seed is not None else None
+        self.buffer = {name: [] for name in schema.names}
+        self.buffered = 0
+        self.shards = []
+        self.rows = 0
+        os.makedirs(directory, exist_ok=True)
+        for stale in glob.glob(os.path.join(directory, 'part-*.parquet')):
+            os.remove(stale)
+
+    def write(self, columns):
+        """Ajoute un bloc de colonnes {nom: séquence}, écrit les shards pleins"""
+        arrays = {}
+        for name in self.schema.names:
+            values = columns[name]
+            arrays[name] = values if isinstance(values, np.ndarray) else np.asarray(values, dtype=object)
+        n = len(arrays[self.schema.names[0]])
+        start = 0
+        while start < n:
+            take = min(n - start, self.shard_size - self.buffered)
+            for name, values in arrays.items():
+                self.buffer[name].append(values[start:start + take])
+            self.buffered += take
+            start += take
+            if self.buffered >= self.shard_size:
+                self.flush()
+
+    def flush(self):
+        """Écrit le buffer courant en un shard"""
+        if self.buffered == 0:
+            return
+
+        arrays = {name: np.concatenate(parts) for name, parts in self.buffer.items()}
+        if self.rng is not None:
+            order = self.rng.permutation(self.buffered)
+            arrays = {name: values[order] for name, values in arrays.items()}
+
+        table = pa.table(
+            [pa.array(arrays[field.name], type=field.type) for field in self.schema],
+            schema=self.schema
+        )
+        path = os.path.join(self.directory, f"part-{len(self.shards):05d}.parquet")
+        pq.write_table(table, path)
+
+        self.shards.append(os.path.basename(path))
+        self.rows += self.buffered
+        self.buffer = {name: [] for name in self.schema.names}
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        return {'shards': self.shards, 'rows': self.rows}
+
+
+class LevelReservoir:
+    """
+    Échantillonnage uniforme stratifié par niveau, en mémoire bornée
+    Chaque paire reçoit une clé aléatoire; on conserve par niveau les `capacity`
+    plus petites clés, ce qui équivaut à un reservoir sampling et se vectorise par bloc.
+    Sous `capacity` paires au total, tout est gardé; au-delà, chaque niveau reçoit une
+    part égale et la part inutilisée des petits niveaux revient aux autres (voir quotas)
+    """
+
+    def __init__(self, capacity, levels=(1, 2, 3, 4), seed=42):
+        """
+        Args:
+            capacity: Nombre maximum de paires, tous niveaux confondus
+            levels: Niveaux du curriculum
+            seed: Graine des clés aléatoires
+        """
+        self.capacity = capacity
+        self.rng = np.random.default_rng(seed)
+        self.seen = {level: 0 for level in levels}
+        self.keys = {level: np.empty(0) for level in levels}
+        self.queries = {level: np.empty(0, dtype=object) for level in levels}
+        self.movie_ids = {level: np.empty(0, dtype=np.int64) for level in levels}
+
+    def add(self, queries, movie_ids, levels):
+        """Ajoute un bloc de paires (colonnes alignées)"""
+        queries = np.asarray(queries, dtype=object)
+        keys = self.rng.random(len(queries))
+
+        for level in self.seen:
+            mask = levels == level
+            if not mask.any():
+                continue
+            self.seen[level] += int(mask.sum())
+
+            all_keys = np.concatenate([self.keys[level], keys[mask]])
+            all_queries = np.concatenate([self.queries[level], queries[mask]])
+            all_ids = np.concatenate([self.movie_ids[level], movie_ids[mask]])
+
+            if len(all_keys) > self.capacity:
+                keep = np.argpartition(all_keys, self.capacity - 1)[:self.capacity]
+                all_keys, all_queries, all_ids = all_keys[keep], all_queries[keep], all_ids[keep]
+
+            self.keys[level], self.queries[level], self.movie_ids[level] = all_keys, all_queries, all_ids
+
+    def quotas(self):
+        """
+        Paires gardées par niveau: tout si le total tient dans capacity, sinon une part égale
+        par niveau, la part inutilisée d'un niveau plus petit étant répartie sur les autres
+        """
+        quotas = {level: len(self.keys[level]) for level in self.seen}
+        if sum(quotas.values()) <= self.capacity:
+            return quotas
+
+        remaining = self.capacity
+        pending = sorted(self.seen, key=lambda level: quotas[level])
+        while pending:
+            level = pending.pop(0)
+            quotas[level] = min(quotas[level], remaining // (len(pending) + 1))
+            remaining -= quotas[level]
+        return quotas
+
+    def columns(self):
+        """Colonnes de l'échantillon final (ordre des niveaux)"""
+        quotas = self.quotas()
+        kept = {}
+        for level in self.seen:
+            # Les plus petites clés d'un niveau en sont un sous-échantillon uniforme
+            kept[level] = np.argsort(self.keys[level], kind='stable')[:quotas[level]]
+        levels = np.concatenate([np.full(len(kept[l]), l, dtype=np.int8) for l in self.seen])
+        return {
+            'query': np.concatenate([self.queries[l][kept[l]] for l in self.seen]),
+            'movie_id': np.concatenate([self.movie_ids[l][kept[l]] for l in self.seen]),
+            'level': levels
+        }
+
+
+def read_manifest(directory):
+    """Charge le manifeste d'un dossier de paires (None s'il n'existe pas)"""
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def triplets_ready(directory):
+    """True si une extraction complète de négatifs difficiles existe (voir training.mine_negatives)"""
+    path = os.path.join(directory, TRIPLETS_DIR, MINING_FILE)
+    if not os.path.exists(path):
+        return False
+    with open(path) as f:
+        return json.load(f).get('complete', False)
+
+
+def shard_paths(directory, split):
+    """Chemins des shards d'un split ('train', 'val', 'train_triplets' ou 'movies'), dans l'ordre"""
+    return sorted(glob.glob(os.path.join(directory, split, 'part-*.parquet')))
+
+
+def read_movie_texts(directory):
+    """Table annexe des films: DataFrame indexé par movie_id (movie_title, movie_text)"""
+    movies = pd.concat([pd.read_parquet(p) for p in shard_paths(directory, MOVIES_DIR)], ignore_index=True)
+    return movies.set_index('movie_id')
+
+
+def read_pairs(directory, split, with_text=True):
+    """
+    Charge toutes les paires d'un split en DataFrame
+
+    Args:
+        directory: Dossier des paires
+        split: 'train' ou 'val'
+        with_text: Joint movie_title et movie_text depuis la table annexe
+
+    Returns:
+        DataFrame (query, movie_id, level[, movie_title, movie_text])
+    """
+    paths = shard_paths(directory, split)
+    if not paths:
+        return pd.DataFrame(columns=PAIR_SCHEMA.names)
+
+    pairs = pd.concat([pd.read_parquet(p) for p in paths], ignore_index=True)
+    if with_text:
+        movies = read_movie_texts(directory)
+        pairs = pairs.join(movies, on='movie_id')
+    return pairs
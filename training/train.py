@@ -3,9 +3,18 @@ Module d'entraînement du modèle avec MultipleNegativesRankingLoss
 Inclut validation en temps réel et sauvegarde du meilleur modèle
 """
 
-from sentence_transformers import SentenceTransformer, InputExample, losses, evaluation
-from torch.utils.data import DataLoader
+from sentence_transformers import SentenceTransformer, InputExample, losses
+from sentence_transformers.datasets import NoDuplicatesDataLoader
+from sentence_transformers.util import batch_to_device
+from transformers import get_linear_schedule_with_warmup
+from contextlib import contextmanager
+from types import SimpleNamespace
 import pandas as pd
+import torch
+import argparse
+import math
+import random
+import resource
 import os
 import sys
 import time
@@ -14,6 +23,58 @@ import json
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
 import config
 
+from training.checkpoint import CHECKPOINTS_DIR, latest_checkpoint, load_checkpoint, save_checkpoint
+from training.losses import CachedMultipleNegativesRankingLoss, MatryoshkaMultipleNegativesRankingLoss
+from training.pair_dataset import PairStream, StreamingLoader, token_cache_dir
+from training.pair_store import TRIPLETS_DIR, read_manifest, read_pairs, triplets_ready
+from training.validation import RetrievalValidator
+
+
+class PhaseStats:
+    """Temps, exemples traités et pic mémoire par phase d'entraînement"""
+    
+    def __init__(self):
+        self.phases = {}
+    
+    @contextmanager
+    def phase(self, name):
+        """
+        Mesure un passage dans une phase; l'objet produit accepte un attribut
+        `examples` (nombre d'exemples traités pendant ce passage)
+        """
+        record = SimpleNamespace(examples=0)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            stats = self.phases.setdefault(name, {'seconds': 0.0, 'calls': 0, 'examples': 0})
+            stats['seconds'] += time.perf_counter() - start
+            stats['calls'] += 1
+            stats['examples'] += record.examples
+            stats['peak_memory_mb'] = peak_memory_mb()
+    
+    def summary(self):
+        summary = {}
+        for name, stats in self.phases.items():
+            summary[name] = {
+                'wall_seconds': round(stats['seconds'], 2),
+                'calls': stats['calls'],
+                'peak_memory_mb': stats['peak_memory_mb']
+            }
+            if stats['examples']:
+                summary[name]['examples'] = stats['examples']
+                summary[name]['examples_per_second'] = round(stats['examples'] / max(stats['seconds'], 1e-9), 1)
+        return summary
+
+
+def peak_memory_mb():
+    """Pic de mémoire du processus (RSS max, et mémoire GPU allouée si disponible)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    if torch.cuda.is_available():
+        peak = {'rss': round(peak, 1), 'cuda': round(torch.cuda.max_memory_allocated() / 2**20, 1)}
+        return peak
+    return round(peak, 1)
+
 
 class ModelTrainer:
     """Entraîne le modèle de recherche sémantique avec MNRL"""
@@ -29,7 +90,8 @@ class ModelTrainer:
         
     def load_data(self):
         """
-        Charge les ensembles d'entraînement et de validation
+        Charge les ensembles d'entraînement et de validation depuis les anciens CSV
+        (utilisé seulement si les shards Parquet de TRAINING_DATA_DIR n'existent pas)
         
         Returns:
             Tuple (train_df, val_df)
@@ -50,39 +112,81 @@ class ModelTrainer:
         
         return train_df, val_df
     
-    def create_evaluator(self, val_df):
+    def create_train_dataloader(self, model, batch_size, num_workers=None, prefetch_factor=None,
+                                cache_tokens=None, hard_negatives=True, seed=42):
+        """
+        Crée le chargeur des paires d'entraînement en flux depuis les shards Parquet
+        La tokenisation se fait dans les workers; les batches tokenisés sont mis en
+        cache sur disque à la première époque et rejoués ensuite.
+        
+        Args:
+            model: SentenceTransformer (fournit la tokenisation)
+            batch_size: Taille des batches
+            num_workers: Processus de chargement (défaut: config.TRAIN_NUM_WORKERS)
+            prefetch_factor: Batches préchargés par worker (défaut: config.TRAIN_PREFETCH_FACTOR)
+            cache_tokens: Active le cache des batches tokenisés (défaut: config.TRAIN_TOKEN_CACHE)
+            hard_negatives: Utilise les triplets de training.mine_negatives s'ils existent
+            seed: Graine du mélange
+        
+        Returns:
+            Tuple (dataloader, nombre de paires)
+        """
+        num_workers = config.TRAIN_NUM_WORKERS if num_workers is None else num_workers
+        prefetch_factor = config.TRAIN_PREFETCH_FACTOR if prefetch_factor is None else prefetch_factor
+        cache_tokens = config.TRAIN_TOKEN_CACHE if cache_tokens is None else cache_tokens
+        
+        cache_dir = None
+        if cache_tokens:
+            cache_dir = token_cache_dir(
+                config.TRAINING_DATA_DIR, f"{self.base_model}-{model.max_seq_length}", batch_size, seed
+            )
+        
+        split = 'train'
+        if hard_negatives and triplets_ready(config.TRAINING_DATA_DIR):
+            split = TRIPLETS_DIR
+        
+        dataset = PairStream(
+            config.TRAINING_DATA_DIR, split, model.tokenize,
+            batch_size=batch_size, seed=seed, cache_dir=cache_dir
+        )
+        loader = StreamingLoader(dataset, num_workers=num_workers, prefetch_factor=prefetch_factor)
+        
+        kind = "triplets avec négatifs difficiles" if dataset.with_negatives else "paires"
+        print(f"Données d'entraînement: {dataset.rows} {kind} en {len(dataset.shards)} shards (flux)")
+        exact = "" if dataset.planned_shards == len(dataset.shards) else " (estimation)"
+        print(f"   {len(dataset)} batches par époque{exact}")
+        if dataset.dropped_rows:
+            print(f"   Attention: {dataset.dropped_rows} lignes écartées dans {dataset.planned_shards} shards "
+                  f"déjà découpés: aucun batch sans doublon de requête ou de film")
+        print(f"   Workers: {num_workers}, préchargement: {prefetch_factor} batches/worker")
+        print(f"   Cache des tokens: {cache_dir or 'désactivé'}")
+        
+        return loader, dataset.rows
+    
+    def create_evaluator(self, val_df, subset_size=None):
         """
         Crée l'évaluateur pour le monitoring de validation
+        Corpus dédupliqué par film, sous-ensemble fixe de requêtes, intervalles de confiance
         
         Args:
             val_df: DataFrame de validation
+            subset_size: Nombre de requêtes évaluées (défaut: config.VAL_SUBSET_SIZE, 0: toutes)
         
         Returns:
-            InformationRetrievalEvaluator configuré
+            RetrievalValidator configuré
         """
-        queries = {}
-        corpus = {}
-        relevant_docs = {}
+        subset_size = config.VAL_SUBSET_SIZE if subset_size is None else subset_size
+        evaluator = RetrievalValidator(val_df, subset_size=subset_size, batch_size=config.VAL_BATCH_SIZE)
         
-        for idx, row in val_df.iterrows():
-            query_id = f"q{idx}"
-            doc_id = f"d{idx}"
-            
-            queries[query_id] = str(row['query'])
-            corpus[doc_id] = str(row['movie_text'])
-            relevant_docs[query_id] = {doc_id}
-        
-        evaluator = evaluation.InformationRetrievalEvaluator(
-            queries=queries,
-            corpus=corpus,
-            relevant_docs=relevant_docs,
-            name='movie-search-val',
-            show_progress_bar=True
-        )
+        print(f"   {len(evaluator.queries)} requêtes, corpus de {len(evaluator.corpus)} films "
+              f"(au lieu de {len(val_df)} documents)")
         
         return evaluator
     
-    def train(self, epochs=3, batch_size=32, learning_rate=2e-5, output_name='movie_finder_v1'):
+    def train(self, epochs=3, batch_size=32, learning_rate=2e-5, output_name='movie_finder_v1',
+              num_workers=None, prefetch_factor=None, cache_tokens=None, hard_negatives=True,
+              mini_batch_size=None, bf16=False, grad_accumulation=1, checkpoint_steps=None,
+              resume=False, matryoshka_dims=None, seed=42):
         """
         Lance l'entraînement complet avec validation
         
@@ -91,6 +195,19 @@ class ModelTrainer:
             batch_size: Taille des batches
             learning_rate: Taux d'apprentissage
             output_name: Nom du dossier de sortie pour le modèle
+            num_workers: Processus de chargement des données (défaut: config)
+            prefetch_factor: Batches préchargés par worker (défaut: config)
+            cache_tokens: Cache des batches tokenisés entre époques (défaut: config)
+            hard_negatives: Entraîne sur les triplets minés s'ils existent
+            mini_batch_size: Sous-batches du cache de gradients; un batch_size plus grand
+                donne plus de négatifs par pas à mémoire fixe (défaut: config)
+            bf16: Autocast bfloat16 (CPU ou GPU)
+            grad_accumulation: Nombre de batches accumulés par pas d'optimisation
+            checkpoint_steps: Pas d'optimisation entre deux checkpoints (défaut: config)
+            resume: Reprend depuis le dernier checkpoint du dossier de sortie
+            matryoshka_dims: Préfixes entraînés en Matryoshka, pour des index tronqués
+                à 64/128/256 dimensions (défaut: config; vide: désactivé)
+            seed: Graine des générateurs aléatoires
         
         Returns:
             Chemin du modèle sauvegardé
@@ -100,57 +217,94 @@ class ModelTrainer:
         print("DÉMARRAGE DE L'ENTRAÎNEMENT")
         print("="*70 + "\n")
         
-        print(f"Chargement du modèle de base: {self.base_model}")
-        model = SentenceTransformer(self.base_model)
-        
-        train_df, val_df = self.load_data()
-        
-        print("\nCréation des exemples d'entraînement...")
-        train_examples = []
-        for _, row in train_df.iterrows():
-            train_examples.append(
-                InputExample(texts=[str(row['query']), str(row['movie_text'])])
-            )
-        
-        train_dataloader = DataLoader(
-            train_examples, 
-            shuffle=True, 
-            batch_size=batch_size
-        )
-        
-        print("Configuration de la loss: MultipleNegativesRankingLoss")
-        train_loss = losses.MultipleNegativesRankingLoss(model)
-        
-        print("Création de l'évaluateur de validation...")
-        evaluator = self.create_evaluator(val_df)
-        
+        phases = PhaseStats()
         output_path = os.path.join(config.MODELS_DIR, 'fine_tuned', output_name)
+        checkpoint_dir = os.path.join(output_path, CHECKPOINTS_DIR)
         os.makedirs(output_path, exist_ok=True)
         
-        warmup_steps = int(len(train_dataloader) * 0.1)
+        checkpoint = latest_checkpoint(checkpoint_dir) if resume else None
+        if resume and checkpoint is None:
+            print(f"Aucun checkpoint dans {checkpoint_dir}: démarrage depuis le modèle de base")
+        
+        with phases.phase('setup'):
+            model_path = os.path.join(checkpoint, 'model') if checkpoint else self.base_model
+            print(f"Chargement du modèle: {model_path}")
+            model = SentenceTransformer(model_path)
+            
+            if read_manifest(config.TRAINING_DATA_DIR) is not None:
+                train_dataloader, train_samples = self.create_train_dataloader(
+                    model, batch_size, num_workers=num_workers,
+                    prefetch_factor=prefetch_factor, cache_tokens=cache_tokens,
+                    hard_negatives=hard_negatives, seed=seed
+                )
+                val_df = read_pairs(config.TRAINING_DATA_DIR, 'val')
+                print(f"Données de validation: {len(val_df)} échantillons")
+            else:
+                train_df, val_df = self.load_data()
+                
+                print("\nCréation des exemples d'entraînement...")
+                train_examples = []
+                for _, row in train_df.iterrows():
+                    train_examples.append(
+                        InputExample(texts=[str(row['query']), str(row['movie_text'])])
+                    )
+                
+                # Pas deux fois le même texte dans un batch (faux négatifs sous MNRL)
+                train_dataloader = NoDuplicatesDataLoader(
+                    train_examples, 
+                    batch_size=batch_size
+                )
+                train_dataloader.collate_fn = model.smart_batching_collate
+                train_samples = len(train_df)
+            
+            mini_batch_size = config.TRAIN_MINI_BATCH_SIZE if mini_batch_size is None else mini_batch_size
+            matryoshka_dims = config.TRAIN_MATRYOSHKA_DIMS if matryoshka_dims is None else matryoshka_dims
+            if mini_batch_size and mini_batch_size < batch_size:
+                loss_name = f"CachedMultipleNegativesRankingLoss (sous-batches de {mini_batch_size})"
+                train_loss = CachedMultipleNegativesRankingLoss(
+                    model, mini_batch_size=mini_batch_size, dims=matryoshka_dims
+                )
+            elif matryoshka_dims:
+                mini_batch_size = None
+                loss_name = "MatryoshkaMultipleNegativesRankingLoss"
+                train_loss = MatryoshkaMultipleNegativesRankingLoss(model, matryoshka_dims)
+            else:
+                mini_batch_size = None
+                loss_name = "MultipleNegativesRankingLoss"
+                train_loss = losses.MultipleNegativesRankingLoss(model)
+            if getattr(train_loss, 'dims', None):
+                loss_name += f", Matryoshka {[d for d in train_loss.dims if d]} + complète"
+            print(f"Configuration de la loss: {loss_name}")
+            
+            print("Création de l'évaluateur de validation...")
+            evaluator = self.create_evaluator(val_df)
+        
+        checkpoint_steps = config.TRAIN_CHECKPOINT_STEPS if checkpoint_steps is None else checkpoint_steps
+        steps_per_epoch = max(math.ceil(len(train_dataloader) / grad_accumulation), 1)
+        total_steps = steps_per_epoch * epochs
+        warmup_steps = int(total_steps * 0.1)
         
         print(f"\nConfiguration d'entraînement:")
         print(f"   Époques: {epochs}")
-        print(f"   Batch size: {batch_size}")
+        print(f"   Batch size: {batch_size} x {grad_accumulation} (accumulation)")
         print(f"   Learning rate: {learning_rate}")
         print(f"   Warmup steps: {warmup_steps}")
         print(f"   Batches d'entraînement: {len(train_dataloader)}")
-        print(f"   Loss: MultipleNegativesRankingLoss")
+        print(f"   Pas d'optimisation par époque: {steps_per_epoch}")
+        print(f"   Précision: {'bf16 (autocast)' if bf16 else 'fp32'}")
+        print(f"   Checkpoints: tous les {checkpoint_steps} pas dans {checkpoint_dir}")
+        print(f"   Loss: {loss_name}")
         print(f"   Sortie: {output_path}")
         print("\n" + "="*70 + "\n")
         
         start_time = time.time()
         
-        model.fit(
-            train_objectives=[(train_dataloader, train_loss)],
-            evaluator=evaluator,
-            epochs=epochs,
-            evaluation_steps=len(train_dataloader) // 2,
-            warmup_steps=warmup_steps,
-            output_path=output_path,
-            save_best_model=True,
-            show_progress_bar=True,
-            optimizer_params={'lr': learning_rate}
+        state = self.fit(
+            model, train_dataloader, train_loss, evaluator, output_path, phases,
+            epochs=epochs, learning_rate=learning_rate, warmup_steps=warmup_steps,
+            total_steps=total_steps, evaluation_steps=steps_per_epoch // 2, bf16=bf16,
+            grad_accumulation=grad_accumulation, checkpoint_steps=checkpoint_steps,
+            checkpoint=checkpoint, seed=seed
         )
         
         elapsed = time.time() - start_time
@@ -161,10 +315,18 @@ class ModelTrainer:
             'base_model': self.base_model,
             'epochs': epochs,
             'batch_size': batch_size,
+            'mini_batch_size': mini_batch_size,
+            'grad_accumulation': grad_accumulation,
+            'effective_batch_size': batch_size * grad_accumulation,
+            'bf16': bf16,
+            'matryoshka_dims': [d for d in getattr(train_loss, 'dims', None) or [] if d],
             'learning_rate': learning_rate,
-            'train_samples': len(train_df),
+            'train_samples': train_samples,
             'val_samples': len(val_df),
+            'best_score': state['best_score'],
+            'resumed_from': checkpoint,
             'training_time_minutes': round(elapsed/60, 2),
+            'phases': phases.summary(),
             'output_path': output_path
         }
         
@@ -174,10 +336,143 @@ class ModelTrainer:
         print(f"Configuration sauvegardée: {output_path}/training_config.json")
         
         return output_path
-
-
-def main():
+    
+    def fit(self, model, train_dataloader, train_loss, evaluator, output_path, phases, epochs,
+            learning_rate, warmup_steps, total_steps, evaluation_steps, bf16=False,
+            grad_accumulation=1, checkpoint_steps=500, checkpoint=None, seed=42):
+        """
+        Boucle d'entraînement (équivalent de SentenceTransformer.fit) avec autocast bf16,
+        accumulation de gradients et checkpoints complets (modèle, optimiseur, scheduler)
+        
+        Returns:
+            État final de l'entraînement (pas, époque, meilleur score)
+        """
+        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        model.to(device)
+        train_loss.to(device)
+        
+        no_decay = ['bias', 'LayerNorm.bias', 'LayerNorm.weight']
+        named_parameters = list(train_loss.named_parameters())
+        optimizer = torch.optim.AdamW([
+            {'params': [p for n, p in named_parameters if not any(nd in n for nd in no_decay)], 'weight_decay': 0.01},
+            {'params': [p for n, p in named_parameters if any(nd in n for nd in no_decay)], 'weight_decay': 0.0}
+        ], lr=learning_rate)
+        scheduler = get_linear_schedule_with_warmup(optimizer, warmup_steps, total_steps)
+        
+        state = {'global_step': 0, 'epoch': 0, 'batches_done': 0, 'best_score': None}
+        if checkpoint:
+            state = load_checkpoint(checkpoint, optimizer, scheduler)
+            print(f"Reprise: époque {state['epoch'] + 1}, {state['batches_done']} batches déjà vus, "
+                  f"pas {state['global_step']}")
+        else:
+            random.seed(seed)
+            torch.manual_seed(seed)
+        
+        eval_path = os.path.join(output_path, 'eval')
+        os.makedirs(eval_path, exist_ok=True)
+        checkpoint_dir = os.path.join(output_path, CHECKPOINTS_DIR)
+        
+        def evaluate(epoch, steps):
+            with phases.phase('evaluation'):
+                score = evaluator(model, output_path=eval_path, epoch=epoch, steps=steps)
+            print(f"   Validation (époque {epoch + 1}, pas {steps}): {score:.4f}")
+            if state['best_score'] is None or score > state['best_score']:
+                state['best_score'] = score
+                with phases.phase('save'):
+                    model.save(output_path)
+            train_loss.zero_grad()
+            train_loss.train()
+        
+        def save(epoch, batches_done):
+            state.update(epoch=epoch, batches_done=batches_done)
+            with phases.phase('checkpoint'):
+                save_checkpoint(checkpoint_dir, model, optimizer, scheduler, state)
+        
+        for epoch in range(state['epoch'], epochs):
+            skip = state['batches_done'] if epoch == state['epoch'] else 0
+            
+            if isinstance(train_dataloader, StreamingLoader):
+                train_dataloader.epoch = epoch
+            else:
+                random.seed(seed + epoch)
+            
+            train_loss.zero_grad()
+            train_loss.train()
+            
+            batches_done = 0
+            accumulated = 0
+            iterator = iter(train_dataloader)
+            while True:
+                with phases.phase('data') as data_phase:
+                    batch = next(iterator, None)
+                    data_phase.examples = len(batch[1]) if batch is not None else 0
+                if batch is None:
+                    break
+                if batches_done < skip:
+                    batches_done += 1
+                    continue
+                
+                features, labels = batch
+                with phases.phase('train') as train_phase:
+                    features = [batch_to_device(feature, device) for feature in features]
+                    labels = labels.to(device)
+                    
+                    with torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=bf16):
+                        loss_value = train_loss(features, labels) / grad_accumulation
+                    loss_value.backward()
+                    
+                    accumulated += 1
+                    if accumulated == grad_accumulation:
+                        torch.nn.utils.clip_grad_norm_(train_loss.parameters(), 1.0)
+                        optimizer.step()
+                        scheduler.step()
+                        optimizer.zero_grad()
+                        accumulated = 0
+                        state['global_step'] += 1
+                    
+                    train_phase.examples = len(labels)
+                batches_done += 1
+                
+                if accumulated == 0:
+                    step = state['global_step']
+                    if evaluation_steps > 0 and step % evaluation_steps == 0:
+                        evaluate(epoch, step)
+                    if checkpoint_steps and step % checkpoint_steps == 0:
+                        save(epoch, batches_done)
+            
+            if accumulated:
+                with phases.phase('train'):
+                    torch.nn.utils.clip_grad_norm_(train_loss.parameters(), 1.0)
+                    optimizer.step()
+                    scheduler.step()
+                    optimizer.zero_grad()
+                    state['global_step'] += 1
+            
+            evaluate(epoch, -1)
+            save(epoch + 1, 0)
+        
+        return state
+    
+def main(argv=None):
     """Point d'entrée pour l'entraînement du modèle"""
+    parser = argparse.ArgumentParser(description="Fine-tuning du modèle de recherche")
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--mini-batch-size', type=int, default=None,
+                        help="Sous-batches du cache de gradients (défaut: TRAIN_MINI_BATCH_SIZE)")
+    parser.add_argument('--lr', type=float, default=2e-5)
+    parser.add_argument('--grad-accumulation', type=int, default=1,
+                        help="Batches accumulés par pas d'optimisation")
+    parser.add_argument('--bf16', action='store_true', help="Autocast bfloat16 (CPU ou GPU)")
+    parser.add_argument('--checkpoint-steps', type=int, default=None,
+                        help="Pas entre deux checkpoints (défaut: TRAIN_CHECKPOINT_STEPS)")
+    parser.add_argument('--resume', action='store_true', help="Reprend depuis le dernier checkpoint")
+    parser.add_argument('--matryoshka-dims', type=int, nargs='*', default=None,
+                        help="Préfixes entraînés en Matryoshka, ex. 64 128 256 (défaut: TRAIN_MATRYOSHKA_DIMS)")
+    parser.add_argument('--num-workers', type=int, default=None)
+    parser.add_argument('--output-name', default='movie_finder_v1')
+    args = parser.parse_args(argv)
+    
     print("\n" + "#"*70)
     print("# FINE-TUNING AVEC MNRL - CINESPHERE")
     print("#"*70 + "\n")
@@ -185,10 +480,17 @@ def main():
     trainer = ModelTrainer()
     
     model_path = trainer.train(
-        epochs=3,
-        batch_size=32,
-        learning_rate=2e-5,
-        output_name='movie_finder_v1'
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        learning_rate=args.lr,
+        output_name=args.output_name,
+        num_workers=args.num_workers,
+        mini_batch_size=args.mini_batch_size,
+        bf16=args.bf16,
+        grad_accumulation=args.grad_accumulation,
+        checkpoint_steps=args.checkpoint_steps,
+        resume=args.resume,
+        matryoshka_dims=args.matryoshka_dims
     )
     
     print("\n" + "#"*70)
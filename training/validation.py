@@ -0,0 +1,150 @@
+"""
+Évaluateur de validation rapide pendant l'entraînement
+Remplace InformationRetrievalEvaluator: le corpus est dédupliqué par film (une entrée
+par movie_id au lieu d'une par ligne de validation), chaque requête est pertinente
+pour tous les films qui la partagent, l'évaluation porte sur un sous-ensemble fixe
+de requêtes et les métriques sont accompagnées d'intervalles de confiance (bootstrap).
+"""
+
+import csv
+import os
+
+import numpy as np
+import torch
+
+
+class RetrievalValidator:
+    """Appelable comme un SentenceEvaluator: validator(model, output_path, epoch, steps) -> score"""
+
+    def __init__(self, val_df, subset_size=2000, batch_size=256, ks=(1, 5, 10), n_bootstrap=1000,
+                 seed=42, name='movie-search-val'):
+        """
+        Args:
+            val_df: DataFrame de validation (query, movie_text et movie_id si disponible)
+            subset_size: Nombre de requêtes évaluées (tirage fixe; 0 ou None: toutes)
+            batch_size: Taille des batches d'encodage
+            ks: Rangs de coupure pour recall@k
+            n_bootstrap: Rééchantillonnages pour les intervalles de confiance
+            seed: Graine du tirage et du bootstrap
+            name: Nom utilisé pour le fichier de résultats
+        """
+        self.batch_size = batch_size
+        self.ks = tuple(ks)
+        self.n_bootstrap = n_bootstrap
+        self.seed = seed
+        self.name = name
+
+        key = 'movie_id' if 'movie_id' in val_df else 'movie_text'
+        docs = val_df.drop_duplicates(key)
+        self.corpus_keys = docs[key].tolist()
+        self.corpus = docs['movie_text'].astype(str).tolist()
+        doc_index = {k: i for i, k in enumerate(self.corpus_keys)}
+
+        relevant = {}
+        for query, doc_key in zip(val_df['query'].astype(str), val_df[key]):
+            relevant.setdefault(query, set()).add(doc_index[doc_key])
+
+        queries = list(relevant)
+        if subset_size and len(queries) > subset_size:
+            rng = np.random.default_rng(seed)
+            queries = [queries[i] for i in sorted(rng.choice(len(queries), subset_size, replace=False))]
+
+        self.queries = queries
+        self.relevant = [relevant[q] for q in queries]
+
+        self._corpus_fingerprint = None
+        self._corpus_embeddings = None
+
+    @staticmethod
+    def fingerprint(model):
+        """Empreinte bon marché des poids: détecte si le corpus doit être réencodé"""
+        with torch.no_grad():
+            return (id(model), tuple(float(p.detach().float().sum()) for p in list(model.parameters())[::8]))
+
+    def corpus_embeddings(self, model):
+        """Embeddings normalisés du corpus, réutilisés tant que les poids ne changent pas"""
+        fingerprint = self.fingerprint(model)
+        if fingerprint != self._corpus_fingerprint:
+            self._corpus_embeddings = model.encode(
+                self.corpus, batch_size=self.batch_size, convert_to_tensor=True,
+                normalize_embeddings=True, show_progress_bar=False
+            )
+            self._corpus_fingerprint = fingerprint
+        return self._corpus_embeddings
+
+    def per_query_metrics(self, model):
+        """
+        Métriques par requête
+
+        Returns:
+            Dictionnaire {métrique: tableau (n_queries,)}
+        """
+        corpus = self.corpus_embeddings(model)
+        query_embeddings = model.encode(
+            self.queries, batch_size=self.batch_size, convert_to_tensor=True,
+            normalize_embeddings=True, show_progress_bar=False
+        ).to(corpus.device)
+
+        depth = min(max(self.ks + (10,)), len(self.corpus))
+        top = []
+        for start in range(0, len(self.queries), self.batch_size):
+            scores = query_embeddings[start:start + self.batch_size] @ corpus.T
+            top.append(torch.topk(scores, depth, dim=1).indices.cpu().numpy())
+        top = np.concatenate(top)
+
+        hits = np.array([[doc in relevant for doc in row] for row, relevant in zip(top, self.relevant)])
+        first_hit = np.where(hits.any(axis=1), hits.argmax(axis=1), -1)
+
+        metrics = {f"recall@{k}": hits[:, :k].any(axis=1).astype(float) for k in self.ks}
+        metrics['mrr@10'] = np.where((first_hit >= 0) & (first_hit < 10), 1.0 / (first_hit + 1), 0.0)
+
+        discounts = 1.0 / np.log2(np.arange(2, depth + 2))
+        dcg = (hits[:, :10] * discounts[:10]).sum(axis=1)
+        ideal = np.array([discounts[:min(len(r), 10)].sum() for r in self.relevant])
+        metrics['ndcg@10'] = dcg / ideal
+
+        return metrics
+
+    def confidence_interval(self, values, level=0.95):
+        """Intervalle de confiance bootstrap (percentile) de la moyenne"""
+        rng = np.random.default_rng(self.seed)
+        samples = rng.integers(0, len(values), size=(self.n_bootstrap, len(values)))
+        means = values[samples].mean(axis=1)
+        alpha = (1 - level) / 2
+        return float(np.quantile(means, alpha)), float(np.quantile(means, 1 - alpha))
+
+    def compute(self, model):
+        """
+        Returns:
+            Dictionnaire {métrique: {'mean', 'ci_low', 'ci_high'}}
+        """
+        results = {}
+        for metric, values in self.per_query_metrics(model).items():
+            low, high = self.confidence_interval(values)
+            results[metric] = {'mean': float(values.mean()), 'ci_low': low, 'ci_high': high}
+        return results
+
+    def __call__(self, model, output_path=None, epoch=-1, steps=-1):
+        results = self.compute(model)
+
+        summary = ", ".join(
+            f"{metric} {r['mean']:.3f} [{r['ci_low']:.3f}-{r['ci_high']:.3f}]" for metric, r in results.items()
+        )
+        print(f"   {self.name} ({len(self.queries)} requêtes, {len(self.corpus)} films): {summary}")
+
+        if output_path is not None:
+            self._write_csv(output_path, epoch, steps, results)
+
+        return results['mrr@10']['mean']
+
+    def _write_csv(self, output_path, epoch, steps, results):
+        path = os.path.join(output_path, f"{self.name}_results.csv")
+        header = ['epoch', 'steps'] + [f"{m}_{s}" for m in results for s in ('mean', 'ci_low', 'ci_high')]
+        row = [epoch, steps] + [round(results[m][s], 6) for m in results for s in ('mean', 'ci_low', 'ci_high')]
+
+        new_file = not os.path.exists(path)
+        with open(path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(header)
+            writer.writerow(row)